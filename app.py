@@ -1,12 +1,21 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import (Flask, Response, render_template, request, redirect, url_for, flash, jsonify, session,
+                   stream_with_context)
+from werkzeug.security import generate_password_hash
 from datetime import datetime, timedelta
 import sqlite3
 import os
+import csv
+import io
 import math
+import json
+import base64
+import threading
+import time
 from routes.funcao_routes import funcao_bp
 from routes.servidor_routes import servidor_bp
 from urllib.parse import urlparse
+from models.chamado_view import PRIORIDADE_CLASSES, STATUS_CLASSES, ChamadoView
+from timeutils import format_datetime, iso_utc, parse_datetime, utcnow
 
 app = Flask(__name__)
 
@@ -23,149 +32,120 @@ app.register_blueprint(servidor_bp)
 
 class Pagination:
     """Simple pagination class to mimic Flask-SQLAlchemy pagination"""
-    def __init__(self, items, page, per_page, total):
+    mode = 'page'
+
+    def __init__(self, items, page, per_page, total, has_more=None, total_aproximado=False):
         self.items = items
         self.page = page
         self.per_page = per_page
         self.total = total
+        self.total_aproximado = total_aproximado
         self.pages = math.ceil(total / per_page) if per_page > 0 else 0
+        if has_more is not None:
+            # Total aproximado: a próxima página existe se a consulta trouxe uma linha a mais
+            self.pages = max(self.pages, page + 1 if has_more else page)
+            self.next_num = page + 1 if has_more else None
+        else:
+            self.next_num = page + 1 if page < self.pages else None
         self.prev_num = page - 1 if page > 1 else None
-        self.next_num = page + 1 if page < self.pages else None
         self.has_prev = self.prev_num is not None
         self.has_next = self.next_num is not None
 
-class MockUser:
-    """Mock user object to match template expectations"""
-    def __init__(self, username):
-        self.username = username
+    def iter_pages(self, left_edge=2, left_current=2, right_current=3, right_edge=2):
+        """Números de página para a navegação; None marca um intervalo omitido (...)"""
+        last = 0
+        for num in range(1, self.pages + 1):
+            if (num <= left_edge
+                    or self.page - left_current <= num <= self.page + right_current
+                    or num > self.pages - right_edge):
+                if last + 1 != num:
+                    yield None
+                yield num
+                last = num
+
+
+class KeysetPage:
+    """Página da listagem por cursor: (data_criacao, id) do último item em vez de OFFSET"""
+    mode = 'cursor'
+
+    def __init__(self, items, per_page, total, next_cursor=None, prev_cursor=None, total_aproximado=False):
+        self.items = items
+        self.per_page = per_page
+        self.total = total
+        self.total_aproximado = total_aproximado
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.has_next = next_cursor is not None
+        self.has_prev = prev_cursor is not None
+
+
+def encode_cursor(row):
+    """Token opaco com a posição (data_criacao, id) de um chamado"""
+    raw = json.dumps([str(row['data_criacao']), row['id']], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """(data_criacao, id) do token, ou None se for inválido"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        data_criacao, chamado_id = json.loads(raw)
+        return str(data_criacao), int(chamado_id)
+    except (ValueError, TypeError):
+        return None
 
 def convert_chamado_row(row):
-    """Convert SQLite Row to object with expected attributes"""
-    class MockChamado:
-        def __init__(self, row):
-            # Copy all original fields
-            for key in row.keys():
-                setattr(self, key, row[key])
-            
-            # Add expected object attributes
-            self.criador = MockUser(row['criador_nome'] if 'criador_nome' in row.keys() else '')
-            self.tecnico = MockUser(row['tecnico_nome']) if 'tecnico_nome' in row.keys() and row['tecnico_nome'] else None
-        
-        @property
-        def prioridade_class(self):
-            classes = {
-                'baixa': 'success',
-                'media': 'warning', 
-                'alta': 'danger',
-                'critica': 'dark'
-            }
-            return classes.get(self.prioridade, 'secondary')
-        
-        @property
-        def status_class(self):
-            classes = {
-                'aberto': 'primary',
-                'em_andamento': 'warning',
-                'resolvido': 'success',
-                'fechado': 'secondary'
-            }
-            return classes.get(self.status, 'secondary')
-
-        @property
-        def tempo_aberto(self):
-            """Compute a timedelta for how long the chamado has been open.
-
-            Handles datetime objects or common string formats coming from sqlite rows.
-            """
-            from datetime import datetime
-
-            def _to_dt(value):
-                if value is None:
-                    return None
-                if isinstance(value, datetime):
-                    return value
-                if isinstance(value, str):
-                    # Try common formats
-                    for fmt in ("%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
-                        try:
-                            return datetime.strptime(value, fmt)
-                        except ValueError:
-                            continue
-                    try:
-                        return datetime.fromisoformat(value)
-                    except Exception:
-                        return None
-                return None
-
-            start = _to_dt(getattr(self, 'data_criacao', None))
-            end = _to_dt(getattr(self, 'data_resolucao', None))
-
-            if start is None:
-                from datetime import timedelta
-                return timedelta(0)
-            if end:
-                return end - start
-            from datetime import datetime as _dt
-            return _dt.utcnow() - start
-    
-    return MockChamado(row)
+    """Linha de chamados -> objeto com os atributos que os templates usam"""
+    return ChamadoView(row)
 
 # Custom Jinja2 filter for safe date formatting
 @app.template_filter('format_date')
 def format_date_filter(value, format='%d/%m/%Y'):
     """Safely format dates, handling None, strings, and datetime objects"""
-    if value is None:
-        return 'N/A'
-    
-    # If it's already a datetime object
-    if isinstance(value, datetime):
-        return value.strftime(format)
-    
-    # If it's a string, try to parse it
-    if isinstance(value, str):
-        try:
-            # Try parsing as datetime
-            dt = datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
-            return dt.strftime(format)
-        except ValueError:
-            try:
-                # Try parsing as date only
-                dt = datetime.strptime(value, '%Y-%m-%d')
-                return dt.strftime(format)
-            except ValueError:
-                # If parsing fails, return the original string
-                return value
-    
-    # For any other type, return as string
-    return str(value)
+    return format_datetime(value, format)
 
 # Custom Jinja2 filter to convert string to datetime
 @app.template_filter('to_datetime')
 def to_datetime_filter(value):
     """Convert string to datetime object, handling various formats"""
-    if value is None:
-        return None
-    
-    # If it's already a datetime object
-    if isinstance(value, datetime):
-        return value
-    
-    # If it's a string, try to parse it
-    if isinstance(value, str):
-        for fmt in ("%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
-            try:
-                return datetime.strptime(value, fmt)
-            except ValueError:
-                continue
-        try:
-            return datetime.fromisoformat(value)
-        except Exception:
-            return None
-    
-    return None
+    return parse_datetime(value)
 
 # Importar configuração de banco de dados
-from database import get_db_connection, init_db, USE_POSTGRES, convert_query
+from database import (
+    close_db, get_db, init_db, init_app, pool_stats, read_only, routing_stats, statement_stats,
+    write_queue_stats, USE_POSTGRES,
+)
+from services.busca import search_clause
+from services.contadores import (
+    dashboard_snapshot, dashboard_stats, get_counters, reconcile_counters, record_change, start_reconciler,
+)
+from services.eventos import reaberturas, record_events, tempo_em_status, timeline
+from services.permissoes import (
+    GRANULAR_PERMISSIONS, current_user_can, get_permissions, invalidate_permissions,
+    rebuild_permission_masks, refresh_permission_mask,
+)
+from services.roles import invalidate_role_labels, role_label, role_labels, set_role_label
+from services.senhas import (
+    HashingBusyError, client_ip, hash_password, hashing_stats, login_limiter, needs_rehash, verify_password,
+)
+from services.sessao import bump_auth_version, issue_claims, validate_session
+from services.sla import agendador_sla, alteracoes_sla, calcular_prazos, iniciar_agendador
+
+# Uma conexão por requisição, devolvida ao pool no teardown
+init_app(app)
+# Confere as claims da sessão (role, função, permissões) antes de cada requisição
+app.before_request(validate_session)
+# Reconciliação periódica dos contadores de chamados (uma thread por worker)
+app.before_request(start_reconciler)
+# Agendador dos prazos de SLA (heap dos próximos vencimentos, uma thread por worker)
+app.before_request(iniciar_agendador)
+
+
+@app.cli.command('reconciliar-contadores')
+def reconciliar_contadores_command():
+    """Recalcula os contadores de chamados e corrige divergências"""
+    corrigidos = reconcile_counters()
+    print(f"✅ Contadores conferidos: {corrigidos} correção(ões)")
 
 # Manter compatibilidade (não usado mais, mas para não quebrar código antigo)
 DATABASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chamados_ti.db')
@@ -262,7 +242,7 @@ def init_db_old():
     conn.commit()
     conn.close()
 
-# get_db_connection agora vem de database.py
+# get_db agora vem de database.py (conexão compartilhada por requisição)
 
 def login_required(f):
     """Decorator para rotas que requerem login"""
@@ -280,47 +260,46 @@ def get_user_role():
         return None
     return session.get('role')
 
+# As verificações abaixo são testes de bit na máscara do usuário (services/permissoes.py),
+# que já combina os padrões da role, o nível da função e as permissões granulares
+
 def is_admin():
     """Verifica se usuário atual é admin"""
-    return get_user_role() == 'admin'
+    return current_user_can('perfil_admin')
 
 def is_tech():
     """
     Verifica se usuário tem acesso técnico completo
     Diretor, Supervisor e Técnico veem TUDO
     """
-    role = get_user_role()
-    return role in ['admin', 'diretor', 'supervisor', 'tech']
+    return current_user_can('perfil_tech')
 
 def is_administrativo():
     """
     Verifica se usuário é administrativo
     Administrativo vê apenas Chamados e Chat
     """
-    return get_user_role() == 'administrativo'
+    return current_user_can('perfil_administrativo')
 
 def can_access_chamados():
     """Verifica se pode acessar chamados"""
-    role = get_user_role()
-    return role in ['admin', 'diretor', 'supervisor', 'tech', 'administrativo', 'user']
+    return current_user_can('area_chamados')
 
 def can_access_storage():
     """Verifica se pode acessar armazenamento de servidores"""
-    role = get_user_role()
-    return role in ['admin', 'diretor', 'supervisor', 'tech']
+    return current_user_can('area_storage')
 
 def can_access_funcoes():
     """Verifica se pode acessar funções"""
-    return get_user_role() == 'admin'
+    return current_user_can('area_funcoes')
 
 def can_access_configuracoes():
     """Verifica se pode acessar configurações"""
-    return get_user_role() == 'admin'
+    return current_user_can('area_configuracoes')
 
 def can_access_chat():
     """Verifica se pode acessar chat"""
-    role = get_user_role()
-    return role in ['admin', 'diretor', 'supervisor', 'tech', 'administrativo']
+    return current_user_can('area_chat')
 
 def has_permission(permission_key):
     """
@@ -329,59 +308,22 @@ def has_permission(permission_key):
     if 'user_id' not in session:
         return False
     
-    user_id = session.get('user_id')
-    
     # Admin sempre tem todas as permissões
-    if session.get('role') == 'admin':
+    if is_admin():
         return True
     
-    conn = get_db_connection()
-    perm = conn.execute(
-        'SELECT enabled FROM user_permissions WHERE user_id = ? AND permission_key = ?',
-        (user_id, permission_key)
-    ).fetchone()
-    conn.close()
-    
-    return perm is not None and perm['enabled'] == 1
+    return current_user_can(permission_key) if permission_key in GRANULAR_PERMISSIONS else False
 
 def get_user_permissions(user_id):
     """
     Retorna lista de permissões do usuário
     """
-    conn = get_db_connection()
-    perms = conn.execute(
-        'SELECT permission_key FROM user_permissions WHERE user_id = ? AND enabled = 1',
-        (user_id,)
-    ).fetchall()
-    conn.close()
-    
-    return [p['permission_key'] for p in perms]
+    return sorted(get_permissions(user_id))
 
 # Função para traduzir roles (labels customizáveis) e injetar permissões
 @app.context_processor
 def inject_permissions():
     """Injeta funções de permissão e role_label nos templates"""
-    def role_label(role_key):
-        """Retorna o label do role da tabela role_names ou valor padrão"""
-        try:
-            conn = get_db_connection()
-            result = conn.execute('SELECT label FROM role_names WHERE role_key = ?', (role_key,)).fetchone()
-            conn.close()
-            if result and 'label' in result.keys():
-                return result['label']
-        except Exception:
-            pass
-        # Valores padrão caso não exista na tabela
-        defaults = {
-            'admin': 'Administrador',
-            'diretor': 'Diretor',
-            'supervisor': 'Supervisor',
-            'tech': 'Técnico',
-            'administrativo': 'Administrativo',
-            'user': 'Usuário'
-        }
-        return defaults.get(role_key, role_key)
-    
     return dict(
         role_label=role_label,
         can_access_chamados=can_access_chamados,
@@ -401,28 +343,50 @@ def index():
         return redirect(url_for('dashboard'))
     return redirect(url_for('login'))
 
+@app.errorhandler(HashingBusyError)
+def hashing_ocupado(e):
+    """Fila de hashing de senhas cheia: recusa sem derrubar as outras rotas"""
+    flash('Servidor ocupado no momento. Tente novamente em alguns segundos.', 'warning')
+    return redirect(request.referrer or url_for('login')), 303
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
+        ip = client_ip(request)
         
-        conn = get_db_connection()
+        # Limite de tentativas com falha (antes de gastar CPU com o hash)
+        espera = login_limiter.retry_after(ip, username)
+        if espera:
+            flash(f'Muitas tentativas de login. Tente novamente em {espera} segundos.', 'danger')
+            return render_template('login.html'), 429, {'Retry-After': str(espera)}
+        
+        conn = get_db()
         user = conn.execute(
             'SELECT * FROM users WHERE username = ? AND is_active = 1', 
-            (username,)
+            (username,),
+            prepared=True
         ).fetchone()
-        conn.close()
+        # Devolve a conexão ao pool enquanto espera o hash: numa rajada de logins
+        # as requisições na fila de hashing não podem esgotar o pool
+        close_db()
         
-        if user and check_password_hash(user['password_hash'], password):
+        if user and verify_password(user['password_hash'], password):
+            login_limiter.success(ip, username)
+            # Hash gerado com parâmetros antigos: regrava com os atuais
+            if needs_rehash(user['password_hash']):
+                novo_hash = hash_password(password)
+                conn = get_db()
+                conn.execute('UPDATE users SET password_hash = ? WHERE id = ?', (novo_hash, user['id']))
+                conn.commit()
             session.clear()  # Limpar sessão anterior
             session.permanent = True  # Tornar sessão permanente (usa PERMANENT_SESSION_LIFETIME)
-            session['user_id'] = user['id']
-            session['username'] = user['username']
-            session['role'] = user['role']
+            issue_claims(user)
             flash('Login realizado com sucesso!', 'success')
             return redirect(url_for('dashboard'))
         else:
+            login_limiter.failure(ip, username)
             flash('Usuário ou senha inválidos!', 'danger')
     
     return render_template('login.html')
@@ -443,7 +407,7 @@ def register():
             flash('As senhas não coincidem!', 'danger')
             return render_template('login.html', show_register=True)
         
-        conn = get_db_connection()
+        conn = get_db()
         
         # Verificar se usuário já existe
         if conn.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone():
@@ -457,11 +421,13 @@ def register():
             return render_template('login.html', show_register=True)
         
         # Criar usuário
-        password_hash = generate_password_hash(password)
+        password_hash = hash_password(password)
         conn.execute('''
             INSERT INTO users (username, email, password_hash, role)
             VALUES (?, ?, ?, ?)
         ''', (username, email, password_hash, 'user'))
+        novo = conn.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()
+        refresh_permission_mask(conn, novo['id'])
         conn.commit()
         conn.close()
         
@@ -475,7 +441,7 @@ def register():
 def novo_usuario():
     """Rota para admins criarem novos usuários"""
     # Verificar se é admin
-    if session.get('role') != 'admin':
+    if not is_admin():
         flash('Acesso negado! Apenas administradores podem criar usuários.', 'danger')
         return redirect(url_for('dashboard'))
     
@@ -492,7 +458,7 @@ def novo_usuario():
             flash('As senhas não coincidem!', 'danger')
             return redirect(url_for('novo_usuario'))
         
-        conn = get_db_connection()
+        conn = get_db()
         
         # Verificar se usuário já existe
         if conn.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone():
@@ -506,11 +472,13 @@ def novo_usuario():
             return redirect(url_for('novo_usuario'))
         
         # Criar usuário
-        password_hash = generate_password_hash(password)
+        password_hash = hash_password(password)
         conn.execute('''
             INSERT INTO users (username, email, password_hash, role, funcao_id)
             VALUES (?, ?, ?, ?, ?)
         ''', (username, email, password_hash, role, funcao_id))
+        novo = conn.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()
+        refresh_permission_mask(conn, novo['id'])
         conn.commit()
         conn.close()
         
@@ -518,7 +486,7 @@ def novo_usuario():
         return redirect(url_for('gerenciar_usuarios'))
     
     # GET - Mostrar formulário
-    conn = get_db_connection()
+    conn = get_db()
     funcoes = conn.execute('SELECT * FROM funcoes ORDER BY nome').fetchall()
     conn.close()
     
@@ -533,29 +501,10 @@ def logout():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    conn = get_db_connection()
-    
-    # Estatísticas básicas
-    total_chamados = conn.execute('SELECT COUNT(*) FROM chamados').fetchone()[0]
-    chamados_abertos = conn.execute("SELECT COUNT(*) FROM chamados WHERE status = 'aberto'").fetchone()[0]
-    chamados_em_andamento = conn.execute("SELECT COUNT(*) FROM chamados WHERE status = 'em_andamento'").fetchone()[0]
-    chamados_resolvidos = conn.execute("SELECT COUNT(*) FROM chamados WHERE status = 'resolvido'").fetchone()[0]
-    
-    # Chamados por prioridade
-    chamados_por_prioridade = conn.execute('''
-        SELECT prioridade, COUNT(*) as total
-        FROM chamados
-        GROUP BY prioridade
-    ''').fetchall()
-    chamados_por_prioridade = [{'prioridade': row[0], 'count': row[1]} for row in chamados_por_prioridade]
+    conn = get_db()
     
-    # Chamados por categoria
-    chamados_por_categoria = conn.execute('''
-        SELECT categoria, COUNT(*) as total
-        FROM chamados
-        GROUP BY categoria
-    ''').fetchall()
-    chamados_por_categoria = [{'categoria': row[0], 'count': row[1]} for row in chamados_por_categoria]
+    # Estatísticas (tabela de contadores: algumas linhas, qualquer que seja o volume)
+    stats = dashboard_stats(get_counters(conn))
     
     # Chamados recentes
     if is_tech():
@@ -586,83 +535,257 @@ def dashboard():
     conn.close()
     
     return render_template('dashboard.html',
-                         total_chamados=total_chamados,
-                         chamados_abertos=chamados_abertos,
-                         chamados_em_andamento=chamados_em_andamento,
-                         chamados_resolvidos=chamados_resolvidos,
-                         chamados_por_prioridade=chamados_por_prioridade,
-                         chamados_por_categoria=chamados_por_categoria,
                          chamados_recentes=chamados_recentes,
                          meus_chamados=meus_chamados,
-                         chamados_atribuidos=chamados_atribuidos)
+                         chamados_atribuidos=chamados_atribuidos,
+                         **stats)
 
-@app.route('/chamados')
-@login_required
-def chamados():
-    conn = get_db_connection()
-    
-    # Paginação
-    page = request.args.get('page', 1, type=int)
-    per_page = 10
-    
-    # Filtros
-    status_filter = request.args.get('status', '')
-    prioridade_filter = request.args.get('prioridade', '')
-    categoria_filter = request.args.get('categoria', '')
+@app.route('/dashboard/api/stats', methods=['GET'])
+def dashboard_api_stats():
+    """Números do dashboard em JSON para o auto-refresh (304 se não mudaram)"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Não autenticado'}), 401
     
-    # Query base
+    body, etag = dashboard_snapshot()
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    # O navegador guarda a resposta mas revalida a cada polling (If-None-Match -> 304)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+@app.route('/api/metrics', methods=['GET'])
+def api_metrics():
+    """Métricas internas deste worker (pool, réplicas, cache de SQL, fila de escrita, hashing), só para administradores"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Não autenticado'}), 401
+    if not is_admin():
+        return jsonify({'error': 'Acesso negado'}), 403
+    return jsonify({
+        'pid': os.getpid(),
+        'pool': pool_stats(),
+        'replicas': routing_stats(),  # None sem DATABASE_REPLICA_URL
+        'statements': statement_stats(),
+        'write_queue': write_queue_stats(),  # None sem SQLITE_WRITE_QUEUE
+        'hashing': hashing_stats(),
+    })
+
+# Acima disso a contagem da listagem para de contar e mostra "N+" (ou a estimativa do PostgreSQL)
+CHAMADOS_COUNT_LIMIT = int(os.environ.get('CHAMADOS_COUNT_LIMIT', '10000'))
+# Por quanto tempo as páginas seguintes (por cursor) reaproveitam o total da primeira
+CHAMADOS_COUNT_TTL = float(os.environ.get('CHAMADOS_COUNT_TTL', '30'))
+
+_contagens = {}  # (joins + where, params) -> (expira_em, total, aproximado), por worker
+_contagens_lock = threading.Lock()
+
+
+def contar_chamados(conn, where_clause, params, joins='', reusar=False):
+    """Total da listagem, exato até CHAMADOS_COUNT_LIMIT; retorna (total, aproximado).
+
+    A primeira página sempre conta e guarda o total por CHAMADOS_COUNT_TTL segundos; com
+    reusar=True (páginas por cursor) ele é devolvido sem nova contagem. A chave é a
+    consulta com os parâmetros, que já incluem a regra de visibilidade do usuário.
+    """
+    chave = (joins + where_clause, tuple(params))
+    now = time.monotonic()
+    if reusar:
+        cached = _contagens.get(chave)
+        if cached and cached[0] > now:
+            return cached[1], cached[2]
+    total, aproximado = _contar_chamados(conn, where_clause, params, joins)
+    if CHAMADOS_COUNT_TTL > 0:
+        with _contagens_lock:
+            if len(_contagens) > 1000:
+                for key, (expira, _, _) in list(_contagens.items()):
+                    if expira <= now:
+                        del _contagens[key]
+            _contagens[chave] = (now + CHAMADOS_COUNT_TTL, total, aproximado)
+    return total, aproximado
+
+
+def _contar_chamados(conn, where_clause, params, joins):
+    total = conn.execute(
+        'SELECT COUNT(*) FROM (SELECT 1 FROM chamados c JOIN users u ON c.criado_por = u.id'
+        + joins + where_clause + ' LIMIT ?) t',
+        params + [CHAMADOS_COUNT_LIMIT + 1], prepared=True
+    ).fetchone()[0]
+    if total <= CHAMADOS_COUNT_LIMIT:
+        return total, False
+    if USE_POSTGRES and not where_clause:
+        # Estimativa das estatísticas da tabela (atualizada pelo autovacuum/ANALYZE)
+        estimate = conn.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = 'chamados'::regclass"
+        ).fetchone()[0]
+        return max(int(estimate or 0), CHAMADOS_COUNT_LIMIT), True
+    return CHAMADOS_COUNT_LIMIT, True
+
+
+def filtros_chamados(args):
+    """Condições (e parâmetros) dos filtros de args e da regra de visibilidade"""
+    params = []
+    conditions = []
+
+    if not is_tech():
+        conditions.append('c.criado_por = ?')
+        params.append(session['user_id'])
+
+    for campo in ('status', 'prioridade', 'categoria', 'sla_estado'):
+        valor = args.get(campo, '')
+        if valor:
+            conditions.append('c.%s = ?' % campo)
+            params.append(valor)
+    return conditions, params
+
+
+def listar_chamados(conn, args, per_page):
+    """Página da listagem de chamados com os filtros de args.
+
+    Sem ?page= a paginação é por cursor (?after= / ?before=), que segue o índice
+    (data_criacao, id) e custa o mesmo em qualquer profundidade; com ?page= usa OFFSET.
+    Com ?q= (busca textual) os resultados vêm por relevância, paginados por número.
+    """
     base_query = '''
         SELECT c.*, u.username as criador_nome, u2.username as tecnico_nome
         FROM chamados c
         JOIN users u ON c.criado_por = u.id
         LEFT JOIN users u2 ON c.atribuido_para = u2.id
     '''
+    busca = search_clause(args.get('q', ''))
+    joins = busca[0] if busca else ''
+    base_query += joins
+
+    conditions, params = filtros_chamados(args)
+
+    order, order_params = 'c.data_criacao DESC, c.id DESC', []
+    if busca:
+        conditions.append(busca[1])
+        params.extend(busca[2])
+        order, order_params = busca[3], busca[4]
+
+    where_clause = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+    numerada = 'page' in args or busca
+    paginando = not numerada and ('after' in args or 'before' in args)
+    total, aproximado = contar_chamados(conn, where_clause, params, joins, reusar=paginando)
+
+    if numerada:
+        page = max(args.get('page', 1, type=int) or 1, 1)
+        query = base_query + where_clause + ' ORDER BY ' + order + ' LIMIT ? OFFSET ?'
+        rows = conn.execute(
+            query, params + order_params + [per_page + 1, (page - 1) * per_page], prepared=True
+        ).fetchall()
+        items = [convert_chamado_row(row) for row in rows[:per_page]]
+        return Pagination(items, page, per_page, total,
+                          has_more=len(rows) > per_page if aproximado else None,
+                          total_aproximado=aproximado)
+
+    after = decode_cursor(args.get('after', ''))
+    before = decode_cursor(args.get('before', '')) if after is None else None
+    if before is not None:
+        # Página anterior: percorre o índice no sentido contrário e inverte
+        conditions.append('(c.data_criacao, c.id) > (?, ?)')
+        params.extend(before)
+        order = ' ORDER BY c.data_criacao ASC, c.id ASC LIMIT ?'
+    else:
+        if after is not None:
+            conditions.append('(c.data_criacao, c.id) < (?, ?)')
+            params.extend(after)
+        order = ' ORDER BY c.data_criacao DESC, c.id DESC LIMIT ?'
+    query = base_query + ' WHERE ' + ' AND '.join(conditions) if conditions else base_query
+    rows = conn.execute(query + order, params + [per_page + 1], prepared=True).fetchall()
+
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if before is not None:
+        rows.reverse()
+    next_cursor = prev_cursor = None
+    if rows:
+        if more or before is not None:
+            next_cursor = encode_cursor(rows[-1])
+        if (more and before is not None) or after is not None:
+            prev_cursor = encode_cursor(rows[0])
+    items = [convert_chamado_row(row) for row in rows]
+    return KeysetPage(items, per_page, total, next_cursor, prev_cursor, aproximado)
+
+
+# Campos que o autor pode alterar e os que só a equipe técnica altera
+CAMPOS_CHAMADO = ('titulo', 'descricao', 'prioridade', 'categoria')
+CAMPOS_TECNICO = ('status', 'atribuido_para', 'solucao')
+
+
+def atualizar_chamado(conn, chamado, campos, versao):
+    """Grava as alterações num único UPDATE, condicionado à versão que o cliente leu.
+
+    Retorna a nova versão, ou None se o chamado foi alterado desde `versao` (conflito).
+    """
+    if versao != chamado['versao']:
+        return None
+    # Prazos e estado do SLA mudam no mesmo UPDATE (prioridade, categoria, status, técnico)
+    mudancas_sla, proximo = alteracoes_sla(chamado, campos)
+    campos = dict(campos, **mudancas_sla)
+    sets = [f'{campo} = ?' for campo in campos]
+    params = list(campos.values())
+    if campos.get('status') == 'resolvido':
+        sets.append('data_resolucao = COALESCE(data_resolucao, CURRENT_TIMESTAMP)')
+    sets += ['data_atualizacao = CURRENT_TIMESTAMP', 'versao = versao + 1']
+    cursor = conn.execute(
+        f'UPDATE chamados SET {", ".join(sets)} WHERE id = ? AND versao = ?',
+        params + [chamado['id'], versao], prepared=True
+    )
+    if cursor.rowcount != 1:
+        return None
+    # A condição na versão garante que `chamado` era o estado anterior ao UPDATE
+    after = {campo: campos.get(campo, chamado[campo])
+             for campo in ('criado_por', 'status', 'prioridade', 'categoria', 'atribuido_para', 'sla_estado')}
+    record_change(conn, before=chamado, after=after)
+    record_events(conn, session['user_id'], before=chamado, after=after)
+    agendador_sla.agendar(chamado['id'], proximo)
+    return versao + 1
+
+
+def chamado_json(c):
+    """Chamado (ChamadoView) como aparece nas respostas da API"""
+    return {
+        'id': c.id,
+        'titulo': c.titulo,
+        'status': c.status,
+        'prioridade': c.prioridade,
+        'categoria': c.categoria,
+        'criado_por': c.criado_por,
+        'criador': c.criador_nome,
+        'atribuido_para': c.atribuido_para,
+        'tecnico': c.tecnico_nome,
+        'versao': c.versao,
+        'sla_estado': c.sla_estado,
+        'sla_resposta_em': iso_utc(c.sla_resposta_em),
+        'sla_resolucao_em': iso_utc(c.sla_resolucao_em),
+        'data_criacao': iso_utc(c.data_criacao),
+        'data_atualizacao': iso_utc(c.data_atualizacao),
+    }
+
+
+@app.route('/chamados')
+@login_required
+def chamados():
+    conn = get_db()
     
-    # Query para contar total
-    count_query = 'SELECT COUNT(*) FROM chamados c JOIN users u ON c.criado_por = u.id'
-    
-    params = []
-    conditions = []
-    
-    if not is_tech():
-        conditions.append('c.criado_por = ?')
-        params.append(session['user_id'])
-    
-    if status_filter:
-        conditions.append('c.status = ?')
-        params.append(status_filter)
-    
-    if prioridade_filter:
-        conditions.append('c.prioridade = ?')
-        params.append(prioridade_filter)
-    
-    if categoria_filter:
-        conditions.append('c.categoria = ?')
-        params.append(categoria_filter)
-    
-    if conditions:
-        where_clause = ' WHERE ' + ' AND '.join(conditions)
-        base_query += where_clause
-        count_query += where_clause
-    
-    # Contar total de registros
-    total = conn.execute(count_query, params).fetchone()[0]
-    
-    # Query com paginação
-    query = base_query + ' ORDER BY c.data_criacao DESC LIMIT ? OFFSET ?'
-    offset = (page - 1) * per_page
-    paginated_params = params + [per_page, offset]
-    
-    chamados_list = conn.execute(query, paginated_params).fetchall()
-    
-    # Converter Rows para objetos com atributos esperados
-    chamados_objects = [convert_chamado_row(row) for row in chamados_list]
-    
-    # Criar objeto de paginação
-    chamados = Pagination(chamados_objects, page, per_page, total)
-    
-    # Listas para filtros
-    categorias = conn.execute('SELECT DISTINCT categoria FROM chamados').fetchall()
+    # Filtros
+    status_filter = request.args.get('status', '')
+    prioridade_filter = request.args.get('prioridade', '')
+    categoria_filter = request.args.get('categoria', '')
+    sla_filter = request.args.get('sla_estado', '')
+    busca = request.args.get('q', '').strip()
+    
+    chamados = listar_chamados(conn, request.args, per_page=10)
+    
+    # Listas para filtros (salta de categoria em categoria no índice em vez de ler a tabela)
+    categorias = conn.execute('''
+        WITH RECURSIVE cat(nome) AS (
+            SELECT MIN(categoria) FROM chamados
+            UNION ALL
+            SELECT (SELECT MIN(categoria) FROM chamados WHERE categoria > cat.nome)
+            FROM cat WHERE cat.nome IS NOT NULL
+        )
+        SELECT nome FROM cat WHERE nome IS NOT NULL
+    ''', prepared=True).fetchall()
     categorias = [cat[0] for cat in categorias]
     
     conn.close()
@@ -671,7 +794,199 @@ def chamados():
                          categorias=categorias,
                          status_filter=status_filter,
                          prioridade_filter=prioridade_filter,
-                         categoria_filter=categoria_filter)
+                         categoria_filter=categoria_filter,
+                         sla_filter=sla_filter,
+                         busca=busca)
+
+@app.route('/api/chamados', methods=['GET'])
+def api_chamados():
+    """Listagem de chamados em JSON (mesmos filtros e cursores de /chamados)"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Não autenticado'}), 401
+    conn = get_db()
+    per_page = min(max(request.args.get('per_page', 20, type=int) or 20, 1), 100)
+    pagina = listar_chamados(conn, request.args, per_page)
+    conn.close()
+    
+    resultado = {
+        'chamados': [chamado_json(c) for c in pagina.items],
+        'total': pagina.total,
+        'total_aproximado': pagina.total_aproximado,
+    }
+    if pagina.mode == 'cursor':
+        resultado['next_cursor'] = pagina.next_cursor
+        resultado['prev_cursor'] = pagina.prev_cursor
+    else:
+        resultado['page'] = pagina.page
+        resultado['pages'] = pagina.pages
+    return jsonify(resultado)
+
+# Exportação: as colunas de chamado_json, sem descricao/solucao (texto longo)
+EXPORTAR_QUERY = '''
+    SELECT c.id, c.titulo, c.status, c.prioridade, c.categoria, c.criado_por, c.atribuido_para,
+           c.versao, c.sla_estado, c.sla_resposta_em, c.sla_resolucao_em,
+           c.data_criacao, c.data_atualizacao,
+           u.username as criador_nome, u2.username as tecnico_nome
+    FROM chamados c
+    JOIN users u ON c.criado_por = u.id
+    LEFT JOIN users u2 ON c.atribuido_para = u2.id
+'''
+EXPORTAR_CAMPOS = ('id', 'titulo', 'status', 'prioridade', 'categoria', 'criado_por', 'criador',
+                   'atribuido_para', 'tecnico', 'versao', 'sla_estado', 'sla_resposta_em',
+                   'sla_resolucao_em', 'data_criacao', 'data_atualizacao')
+EXPORTAR_FORMATOS = {'csv': 'text/csv; charset=utf-8', 'jsonl': 'application/x-ndjson; charset=utf-8'}
+EXPORTAR_BLOCO = 64 * 1024  # caracteres acumulados antes de enviar um pedaço
+
+
+@app.route('/chamados/exportar')
+@login_required
+def exportar_chamados():
+    """Chamados dos filtros atuais (?formato=csv ou jsonl) enviados em streaming.
+
+    As linhas vêm de conn.stream() (cursor server-side no PostgreSQL) e saem em pedaços de
+    EXPORTAR_BLOCO: a memória não cresce com o número de chamados e o download começa
+    antes de a consulta terminar.
+    """
+    formato = request.args.get('formato', 'csv')
+    if formato not in EXPORTAR_FORMATOS:
+        flash('Formato de exportação inválido!', 'danger')
+        return redirect(url_for('chamados'))
+
+    query = EXPORTAR_QUERY
+    conditions, params = filtros_chamados(request.args)
+    busca = search_clause(request.args.get('q', ''))
+    if busca:
+        query += busca[0]
+        conditions.append(busca[1])
+        params.extend(busca[2])
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += ' ORDER BY c.data_criacao DESC, c.id DESC'
+
+    def gerar():
+        buffer = io.StringIO()
+        if formato == 'csv':
+            writer = csv.DictWriter(buffer, EXPORTAR_CAMPOS)
+            buffer.write('\ufeff')  # BOM: o Excel abre o arquivo como UTF-8
+            writer.writeheader()
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        with read_only():  # só leitura: numa réplica quando houver
+            for row in get_db().stream(query, params):
+                registro = chamado_json(ChamadoView(row))
+                if formato == 'csv':
+                    writer.writerow(registro)
+                else:
+                    buffer.write(json.dumps(registro, ensure_ascii=False))
+                    buffer.write('\n')
+                if buffer.tell() >= EXPORTAR_BLOCO:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+        yield buffer.getvalue()
+
+    nome = f'chamados-{utcnow():%Y%m%d-%H%M}.{formato}'
+    return Response(stream_with_context(gerar()), content_type=EXPORTAR_FORMATOS[formato], headers={
+        'Content-Disposition': f'attachment; filename="{nome}"',
+        'X-Accel-Buffering': 'no',  # proxy (nginx) repassa os pedaços sem acumular
+    })
+
+@app.route('/api/chamados/relatorio', methods=['GET'])
+@read_only()  # relatório: só leituras, numa réplica quando houver
+def api_relatorio_chamados():
+    """Tempo em um status e reaberturas no período, a partir do histórico de eventos.
+
+    Parâmetros: inicio e fim (data ou data/hora UTC; uma data em fim inclui o dia todo),
+    padrão os últimos 30 dias até hoje, e status (padrão em_andamento).
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Não autenticado'}), 401
+    if not is_tech():
+        return jsonify({'error': 'Acesso negado'}), 403
+    fim_arg = request.args.get('fim', '').strip()
+    fim = parse_datetime(fim_arg) or utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    if len(fim_arg) <= 10:
+        fim += timedelta(days=1)
+    inicio = parse_datetime(request.args.get('inicio', '')) or fim - timedelta(days=30)
+    status = request.args.get('status', 'em_andamento')
+    if status not in STATUS_CLASSES:
+        return jsonify({'error': 'Status inválido'}), 400
+    
+    conn = get_db()
+    resultado = {
+        'inicio': iso_utc(inicio),
+        'fim': iso_utc(fim),
+        'tempo_em_status': tempo_em_status(conn, status, inicio, fim),
+        'reaberturas': reaberturas(conn, inicio, fim),
+    }
+    conn.close()
+    return jsonify(resultado)
+
+@app.route('/api/chamados/<int:id>', methods=['PATCH'])
+def api_atualizar_chamado(id):
+    """Alteração de um chamado em JSON (mesmo UPDATE condicional do formulário de edição).
+
+    O corpo traz só os campos alterados e a versão lida ("versao" ou cabeçalho If-Match);
+    se o chamado mudou desde então a resposta é 409 com a versão atual.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Não autenticado'}), 401
+    dados = request.get_json(silent=True)
+    if not isinstance(dados, dict):
+        return jsonify({'error': 'Corpo JSON inválido'}), 400
+    
+    versao = dados.get('versao')
+    if versao is None and request.if_match:
+        etag = next(iter(request.if_match.as_set()), '')
+        versao = int(etag) if etag.isdigit() else None
+    if not isinstance(versao, int) or isinstance(versao, bool):
+        return jsonify({'error': 'Informe a versão lida do chamado ("versao" ou If-Match)'}), 428
+    
+    campos = {campo: dados[campo] for campo in CAMPOS_CHAMADO + CAMPOS_TECNICO if campo in dados}
+    if not campos:
+        return jsonify({'error': 'Nenhum campo para alterar'}), 400
+    if not is_tech() and any(campo in campos for campo in CAMPOS_TECNICO):
+        return jsonify({'error': 'Só a equipe técnica altera status, técnico e solução'}), 403
+    for campo in ('titulo', 'descricao'):
+        if campo in campos and not (isinstance(campos[campo], str) and campos[campo].strip()):
+            return jsonify({'error': f'Campo inválido: {campo}'}), 400
+    if 'prioridade' in campos and campos['prioridade'] not in PRIORIDADE_CLASSES:
+        return jsonify({'error': 'Prioridade inválida'}), 400
+    if 'status' in campos and campos['status'] not in STATUS_CLASSES:
+        return jsonify({'error': 'Status inválido'}), 400
+    if 'atribuido_para' in campos and not (
+            campos['atribuido_para'] is None or type(campos['atribuido_para']) is int):
+        return jsonify({'error': 'Campo inválido: atribuido_para'}), 400
+    
+    conn = get_db()
+    chamado = conn.execute('SELECT * FROM chamados WHERE id = ?', (id,)).fetchone()
+    if not chamado:
+        conn.close()
+        return jsonify({'error': 'Chamado não encontrado'}), 404
+    if not is_tech() and chamado['criado_por'] != session['user_id']:
+        conn.close()
+        return jsonify({'error': 'Acesso negado'}), 403
+    
+    if atualizar_chamado(conn, chamado, campos, versao) is None:
+        conn.rollback()
+        atual = conn.execute('SELECT versao FROM chamados WHERE id = ?', (id,)).fetchone()
+        conn.close()
+        return jsonify({'error': 'O chamado foi alterado desde a versão informada',
+                        'versao': atual['versao'] if atual else None}), 409
+    conn.commit()
+    
+    chamado = conn.execute('''
+        SELECT c.*, u.username as criador_nome, u2.username as tecnico_nome
+        FROM chamados c
+        JOIN users u ON c.criado_por = u.id
+        LEFT JOIN users u2 ON c.atribuido_para = u2.id
+        WHERE c.id = ?
+    ''', (id,)).fetchone()
+    conn.close()
+    response = jsonify(chamado_json(convert_chamado_row(chamado)))
+    response.set_etag(str(chamado['versao']))
+    return response
 
 @app.route('/chamados/novo', methods=['GET', 'POST'])
 @login_required
@@ -682,11 +997,19 @@ def novo_chamado():
         prioridade = request.form['prioridade']
         categoria = request.form['categoria']
         
-        conn = get_db_connection()
+        # O agendador de SLA encontra o chamado novo na próxima busca (id > último visto)
+        prazos = calcular_prazos(prioridade, categoria, utcnow())
+        conn = get_db()
         conn.execute('''
-            INSERT INTO chamados (titulo, descricao, prioridade, categoria, criado_por)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (titulo, descricao, prioridade, categoria, session['user_id']))
+            INSERT INTO chamados (titulo, descricao, prioridade, categoria, criado_por,
+                                  sla_resposta_em, sla_resolucao_em)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (titulo, descricao, prioridade, categoria, session['user_id'],
+              prazos['sla_resposta_em'], prazos['sla_resolucao_em']))
+        novo = {'criado_por': session['user_id'], 'status': 'aberto',
+                'prioridade': prioridade, 'categoria': categoria, 'sla_estado': 'no_prazo'}
+        record_events(conn, session['user_id'], after=novo)  # logo após o INSERT (id do chamado)
+        record_change(conn, after=novo)
         conn.commit()
         conn.close()
         
@@ -698,7 +1021,7 @@ def novo_chamado():
 @app.route('/chamados/<int:id>')
 @login_required
 def visualizar_chamado(id):
-    conn = get_db_connection()
+    conn = get_db()
     chamado = conn.execute('''
         SELECT c.*, u.username as criador_nome, u2.username as tecnico_nome
         FROM chamados c
@@ -718,14 +1041,15 @@ def visualizar_chamado(id):
     
     # Converter Row para objeto com atributos esperados
     chamado_obj = convert_chamado_row(chamado)
+    eventos = timeline(conn, id)
     
     conn.close()
-    return render_template('chamado_detalhes.html', chamado=chamado_obj)
+    return render_template('chamado_detalhes.html', chamado=chamado_obj, eventos=eventos)
 
 @app.route('/chamados/<int:id>/editar', methods=['GET', 'POST'])
 @login_required
 def editar_chamado(id):
-    conn = get_db_connection()
+    conn = get_db()
     chamado = conn.execute('SELECT * FROM chamados WHERE id = ?', (id,)).fetchone()
     
     if not chamado:
@@ -738,40 +1062,32 @@ def editar_chamado(id):
         return redirect(url_for('chamados'))
     
     if request.method == 'POST':
-        titulo = request.form['titulo']
-        descricao = request.form['descricao']
-        prioridade = request.form['prioridade']
-        categoria = request.form['categoria']
-        
-        conn.execute('''
-            UPDATE chamados 
-            SET titulo = ?, descricao = ?, prioridade = ?, categoria = ?, data_atualizacao = CURRENT_TIMESTAMP
-            WHERE id = ?
-        ''', (titulo, descricao, prioridade, categoria, id))
-        
+        campos = {campo: request.form[campo] for campo in CAMPOS_CHAMADO}
         if is_tech():
-            status = request.form['status']
-            atribuido_para = request.form.get('atribuido_para') or None
-            solucao = request.form.get('solucao', '')
-            
-            conn.execute('''
-                UPDATE chamados 
-                SET status = ?, atribuido_para = ?, solucao = ?
-                WHERE id = ?
-            ''', (status, atribuido_para, solucao, id))
-            
-            if status == 'resolvido' and not chamado['data_resolucao']:
-                conn.execute('''
-                    UPDATE chamados 
-                    SET data_resolucao = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                ''', (id,))
+            campos['status'] = request.form['status']
+            campos['atribuido_para'] = request.form.get('atribuido_para') or None
+            campos['solucao'] = request.form.get('solucao', '')
         
-        conn.commit()
-        conn.close()
+        # Formulário sem versão (aberto antes da atualização): vale a que acabou de ser lida
+        versao = request.form.get('versao', chamado['versao'], type=int)
+        if atualizar_chamado(conn, chamado, campos, versao) is not None:
+            conn.commit()
+            conn.close()
+            flash('Chamado atualizado com sucesso!', 'success')
+            return redirect(url_for('visualizar_chamado', id=id))
         
-        flash('Chamado atualizado com sucesso!', 'success')
-        return redirect(url_for('visualizar_chamado', id=id))
+        # Conflito: outra pessoa salvou antes; reabre o formulário com os dados atuais
+        conn.rollback()
+        chamado = conn.execute('SELECT * FROM chamados WHERE id = ?', (id,)).fetchone()
+        if not chamado:
+            conn.close()
+            flash('Chamado não encontrado!', 'danger')
+            return redirect(url_for('chamados'))
+        flash('Este chamado foi alterado por outra pessoa enquanto você editava. '
+              'Confira os dados atuais e salve novamente.', 'warning')
+        status_code = 409
+    else:
+        status_code = 200
     
     # Lista de técnicos
     tecnicos = conn.execute("SELECT * FROM users WHERE role IN ('admin', 'tech', 'diretor', 'supervisor')").fetchall()
@@ -780,12 +1096,12 @@ def editar_chamado(id):
     return render_template('chamado_form.html',
                          chamado=chamado,
                          tecnicos=tecnicos,
-                         action='editar')
+                         action='editar'), status_code
 
 @app.route('/chamados/<int:id>/deletar', methods=['POST'])
 @login_required
 def deletar_chamado(id):
-    conn = get_db_connection()
+    conn = get_db()
     chamado = conn.execute('SELECT * FROM chamados WHERE id = ?', (id,)).fetchone()
     
     if not chamado:
@@ -813,6 +1129,8 @@ def deletar_chamado(id):
     titulo = chamado['titulo']
     
     conn.execute('DELETE FROM chamados WHERE id = ?', (id,))
+    record_change(conn, before=chamado)
+    record_events(conn, session['user_id'], before=chamado)
     conn.commit()
     conn.close()
     
@@ -864,7 +1182,7 @@ def perfil():
         flash('Sessão inválida. Faça login novamente.', 'warning')
         return redirect(url_for('logout'))
     
-    conn = get_db_connection()
+    conn = get_db()
     user_row = conn.execute('SELECT * FROM users WHERE id = ?', (session['user_id'],)).fetchone()
     
     if not user_row:
@@ -874,28 +1192,13 @@ def perfil():
     
     # normalize to dict and add formatted date
     user = dict(user_row)
-    if user:
-        ca = user.get('created_at')
-        from datetime import datetime
-        if isinstance(ca, str) and ca:
-            parsed = None
-            try:
-                parsed = datetime.fromisoformat(ca)
-            except Exception:
-                for fmt in ("%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
-                    try:
-                        parsed = datetime.strptime(ca, fmt)
-                        break
-                    except Exception:
-                        parsed = None
-            user['created_at_fmt'] = parsed.strftime('%d/%m/%Y') if parsed else ca
-        else:
-            user['created_at_fmt'] = ca
+    user['created_at_fmt'] = format_datetime(user.get('created_at'), default='')
     
     # Estatísticas do usuário
-    total_chamados = conn.execute('SELECT COUNT(*) FROM chamados WHERE criado_por = ?', (session['user_id'],)).fetchone()[0]
-    chamados_abertos = conn.execute("SELECT COUNT(*) FROM chamados WHERE criado_por = ? AND status = 'aberto'", (session['user_id'],)).fetchone()[0]
-    chamados_resolvidos = conn.execute("SELECT COUNT(*) FROM chamados WHERE criado_por = ? AND status = 'resolvido'", (session['user_id'],)).fetchone()[0]
+    contadores = get_counters(conn, session['user_id'])
+    total_chamados = contadores['total']
+    chamados_abertos = contadores['status'].get('aberto', 0)
+    chamados_resolvidos = contadores['status'].get('resolvido', 0)
     
     conn.close()
     
@@ -914,7 +1217,7 @@ def editar_perfil():
         flash('Sessão inválida. Faça login novamente.', 'warning')
         return redirect(url_for('logout'))
     
-    conn = get_db_connection()
+    conn = get_db()
     user_row = conn.execute('SELECT * FROM users WHERE id = ?', (session['user_id'],)).fetchone()
     
     if not user_row:
@@ -925,23 +1228,7 @@ def editar_perfil():
     user = dict(user_row)
 
     # add created_at_fmt for the template
-    if user:
-        ca = user.get('created_at')
-        from datetime import datetime
-        if isinstance(ca, str) and ca:
-            parsed = None
-            try:
-                parsed = datetime.fromisoformat(ca)
-            except Exception:
-                for fmt in ("%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
-                    try:
-                        parsed = datetime.strptime(ca, fmt)
-                        break
-                    except Exception:
-                        parsed = None
-            user['created_at_fmt'] = parsed.strftime('%d/%m/%Y') if parsed else ca
-        else:
-            user['created_at_fmt'] = ca
+    user['created_at_fmt'] = format_datetime(user.get('created_at'), default='')
     
     if request.method == 'POST':
         username = request.form['username']
@@ -973,7 +1260,7 @@ def editar_perfil():
         
         # Atualizar senha se fornecida
         if nova_senha:
-            if not senha_atual or not check_password_hash(user['password_hash'], senha_atual):
+            if not senha_atual or not verify_password(user['password_hash'], senha_atual):
                 flash('Senha atual incorreta!', 'danger')
                 conn.close()
                 return render_template('editar_perfil.html', user=user)
@@ -983,7 +1270,7 @@ def editar_perfil():
                 conn.close()
                 return render_template('editar_perfil.html', user=user)
             
-            password_hash = generate_password_hash(nova_senha)
+            password_hash = hash_password(nova_senha)
             conn.execute('''
                 UPDATE users 
                 SET password_hash = ?
@@ -1006,11 +1293,11 @@ def editar_perfil():
 @login_required
 def configuracoes():
     """Página de configurações do sistema"""
-    if session['role'] != 'admin':
+    if not is_admin():
         flash('Acesso negado! Apenas administradores podem acessar as configurações.', 'danger')
         return redirect(url_for('dashboard'))
     
-    conn = get_db_connection()
+    conn = get_db()
     
     # Estatísticas do sistema
     total_usuarios = conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
@@ -1034,71 +1321,76 @@ def configuracoes():
                          total_chamados=total_chamados,
                          total_servidores=total_servidores,
                          usuarios_por_role=usuarios_por_role,
+                         rotulos=role_labels(),
                          last_update=last_update)
 
+@app.route('/configuracoes/roles/<role_key>/rotulo', methods=['POST'])
+@login_required
+def editar_rotulo_role(role_key):
+    """Altera o rótulo de exibição de uma role"""
+    if not is_admin():
+        flash('Acesso negado!', 'danger')
+        return redirect(url_for('dashboard'))
+
+    if role_key not in role_labels():
+        flash('Role inválida!', 'danger')
+        return redirect(url_for('configuracoes'))
+
+    label = request.form.get('label', '').strip()
+    if not label or len(label) > 50:
+        flash('Informe um rótulo com até 50 caracteres!', 'danger')
+        return redirect(url_for('configuracoes'))
+
+    conn = get_db()
+    set_role_label(conn, role_key, label)
+    conn.commit()
+    conn.close()
+    invalidate_role_labels()  # só após o commit, para a recarga já ler o rótulo novo
+
+    flash(f'Rótulo da role {role_key} atualizado para "{label}"!', 'success')
+    return redirect(url_for('configuracoes'))
+
 @app.route('/configuracoes/usuarios')
 @login_required
 def gerenciar_usuarios():
     """Gerenciar usuários do sistema"""
-    if session['role'] != 'admin':
+    if not is_admin():
         flash('Acesso negado! Apenas administradores podem gerenciar usuários.', 'danger')
         return redirect(url_for('dashboard'))
     
-    conn = get_db_connection()
-    usuarios_raw = conn.execute('''
+    conn = get_db()
+
+    # Totais calculados no banco para que a lista possa ser lida em streaming
+    resumo = conn.execute('''
+        SELECT COUNT(*) as total,
+               COALESCE(SUM(CASE WHEN is_active = 1 THEN 1 ELSE 0 END), 0) as ativos,
+               COALESCE(SUM(CASE WHEN role = 'tech' THEN 1 ELSE 0 END), 0) as tecnicos,
+               COALESCE(SUM(CASE WHEN role = 'admin' THEN 1 ELSE 0 END), 0) as admins
+        FROM users
+    ''').fetchone()
+
+    # Iterador em lotes: a página não materializa a lista inteira de usuários
+    usuarios_raw = conn.stream('''
         SELECT u.id, u.username, u.email, u.role, u.created_at, u.is_active, u.funcao_id, f.nome as funcao_nome
         FROM users u
         LEFT JOIN funcoes f ON u.funcao_id = f.id
         ORDER BY u.created_at DESC
-    ''').fetchall()
+    ''')
     
     # Buscar todas as funções disponíveis
     funcoes = conn.execute('SELECT * FROM funcoes ORDER BY nivel_acesso DESC').fetchall()
-    conn.close()
     
-    return render_template('gerenciar_usuarios.html', usuarios=usuarios_raw, funcoes=funcoes)
-
-    # Converter created_at (string) para datetime quando possível, para que o template possa usar .strftime
-    from datetime import datetime
-    usuarios = []
-    for u in usuarios_raw:
-        # sqlite3.Row -> dict
-        row = dict(u)
-        ca = row.get('created_at')
-        if isinstance(ca, str) and ca:
-            parsed = None
-            # tentar formatos comuns
-            try:
-                parsed = datetime.fromisoformat(ca)
-            except Exception:
-                for fmt in ("%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
-                    try:
-                        parsed = datetime.strptime(ca, fmt)
-                        break
-                    except Exception:
-                        parsed = None
-            if parsed:
-                row['created_at'] = parsed
-                # criar também uma string formatada segura para usar no template
-                row['created_at_fmt'] = parsed.strftime('%d/%m/%Y %H:%M')
-            else:
-                # mantemos como string se não foi possível parsear
-                row['created_at'] = ca
-                row['created_at_fmt'] = ca
-
-        usuarios.append(row)
-
-    return render_template('gerenciar_usuarios.html', usuarios=usuarios)
+    return render_template('gerenciar_usuarios.html', usuarios=usuarios_raw, resumo=resumo, funcoes=funcoes)
 
 @app.route('/configuracoes/usuarios/<int:id>/toggle', methods=['POST'])
 @login_required
 def toggle_usuario(id):
     """Ativar/desativar usuário"""
-    if session['role'] != 'admin':
+    if not is_admin():
         flash('Acesso negado!', 'danger')
         return redirect(url_for('dashboard'))
     
-    conn = get_db_connection()
+    conn = get_db()
     usuario = conn.execute('SELECT * FROM users WHERE id = ?', (id,)).fetchone()
     
     if not usuario:
@@ -1115,6 +1407,7 @@ def toggle_usuario(id):
     # Toggle do status
     novo_status = 0 if usuario['is_active'] else 1
     conn.execute('UPDATE users SET is_active = ? WHERE id = ?', (novo_status, id))
+    bump_auth_version(conn, id)
     conn.commit()
     conn.close()
     
@@ -1127,11 +1420,11 @@ def toggle_usuario(id):
 @login_required
 def editar_usuario(id):
     """Editar usuário (apenas admin)"""
-    if session['role'] != 'admin':
+    if not is_admin():
         flash('Acesso negado! Apenas administradores podem editar usuários.', 'danger')
         return redirect(url_for('dashboard'))
 
-    conn = get_db_connection()
+    conn = get_db()
     usuario = conn.execute('SELECT * FROM users WHERE id = ?', (id,)).fetchone()
 
     if not usuario:
@@ -1171,15 +1464,11 @@ def editar_usuario(id):
 
         # Atualiza senha se enviada
         if password:
-            from werkzeug.security import generate_password_hash
-            password_hash = generate_password_hash(password)
+            password_hash = hash_password(password)
             conn.execute('UPDATE users SET password_hash = ? WHERE id = ?', (password_hash, id))
 
         # Salvar permissões granulares
-        permissions = [
-            'view_chamados', 'create_chamados', 'edit_chamados', 'delete_chamados',
-            'assign_chamados', 'manage_infrastructure', 'manage_users', 'access_chat'
-        ]
+        permissions = GRANULAR_PERMISSIONS
         
         # Remover permissões antigas do usuário
         conn.execute('DELETE FROM user_permissions WHERE user_id = ?', (id,))
@@ -1196,8 +1485,12 @@ def editar_usuario(id):
                     (id, perm, enabled)
                 )
 
+        # Máscara materializada acompanha role, função e permissões
+        refresh_permission_mask(conn, id)
+        bump_auth_version(conn, id)
         conn.commit()
         conn.close()
+        invalidate_permissions(id)
         flash('Usuário e permissões atualizados com sucesso!', 'success')
         return redirect(url_for('gerenciar_usuarios'))
 
@@ -1230,12 +1523,13 @@ def chat():
     return render_template('chat.html')
 
 @app.route('/api/chat/mensagens', methods=['GET'])
+@read_only()  # polling: sempre numa réplica, quando houver
 def get_mensagens():
     """Obter mensagens do chat"""
     # Verificar se está logado
     if 'user_id' not in session:
         return jsonify({'error': 'Não autenticado'}), 401
-    conn = get_db_connection()
+    conn = get_db()
     
     # Pegar últimas 100 mensagens
     mensagens = conn.execute('''
@@ -1243,7 +1537,7 @@ def get_mensagens():
         FROM chat_mensagens
         ORDER BY data_envio DESC
         LIMIT 100
-    ''').fetchall()
+    ''', prepared=True).fetchall()
     
     conn.close()
     
@@ -1255,7 +1549,7 @@ def get_mensagens():
             'user_id': msg['user_id'],
             'username': msg['username'],
             'mensagem': msg['mensagem'],
-            'data_envio': msg['data_envio'],
+            'data_envio': iso_utc(msg['data_envio']),
             'lida': msg['lida'],
             'is_me': msg['user_id'] == session.get('user_id')
         })
@@ -1287,7 +1581,7 @@ def enviar_mensagem():
             print("❌ Mensagem vazia")
             return jsonify({'error': 'Mensagem vazia'}), 400
         
-        conn = get_db_connection()
+        conn = get_db()
         
         # Inserir mensagem
         cursor = conn.execute('''
@@ -1295,11 +1589,12 @@ def enviar_mensagem():
             VALUES (?, ?, ?)
         ''', (session['user_id'], session['username'], mensagem))
         
+        # lastrowid só depois do commit: lido antes, abriria uma transação própria na
+        # fila de escrita (SQLITE_WRITE_QUEUE) em vez de entrar no group commit
+        conn.commit()
         mensagem_id = cursor.lastrowid
         print(f"✅ Mensagem inserida com ID: {mensagem_id}")
         
-        conn.commit()
-        
         # Buscar a mensagem inserida
         mensagem_inserida = conn.execute('''
             SELECT id, user_id, username, mensagem, data_envio, lida
@@ -1319,7 +1614,7 @@ def enviar_mensagem():
             'user_id': mensagem_inserida['user_id'],
             'username': mensagem_inserida['username'],
             'mensagem': mensagem_inserida['mensagem'],
-            'data_envio': mensagem_inserida['data_envio'],
+            'data_envio': iso_utc(mensagem_inserida['data_envio']),
             'lida': mensagem_inserida['lida'],
             'is_me': mensagem_inserida['user_id'] == session['user_id']
         }
@@ -1341,7 +1636,7 @@ def marcar_lidas():
     # Verificar se está logado
     if 'user_id' not in session:
         return jsonify({'error': 'Não autenticado'}), 401
-    conn = get_db_connection()
+    conn = get_db()
     
     # Marcar todas as mensagens como lidas (exceto as do próprio usuário)
     conn.execute('''
@@ -1364,7 +1659,7 @@ def nova_conversa():
         return jsonify({'error': 'Não autenticado'}), 401
     
     try:
-        conn = get_db_connection()
+        conn = get_db()
         
         # Contar mensagens antes de apagar
         count_before = conn.execute('SELECT COUNT(*) as count FROM chat_mensagens').fetchone()['count']
@@ -1396,7 +1691,7 @@ def apagar_todas_mensagens():
         return jsonify({'error': 'Não autenticado'}), 401
     
     try:
-        conn = get_db_connection()
+        conn = get_db()
         
         # Contar mensagens antes de apagar
         count_before = conn.execute('SELECT COUNT(*) as count FROM chat_mensagens').fetchone()['count']
@@ -1421,6 +1716,9 @@ def apagar_todas_mensagens():
 
 if __name__ == '__main__':
     init_db()
+    # Usuários ainda sem users.permission_mask (ex.: logo após a migração)
+    with app.app_context():
+        rebuild_permission_masks(get_db(), only_missing=True)
     print("🚀 Sistema de Chamados TI iniciado!")
     print("📱 Acesse: http://127.0.0.1:5000")
     print("🔑 Login: Exponencial / 1234")
@@ -2,64 +2,860 @@
 Módulo de configuração de banco de dados
 Suporta SQLite (desenvolvimento) e PostgreSQL (produção)
 """
+import contextlib
+import hashlib
+import heapq
+import itertools
 import os
+import queue
 import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
 from urllib.parse import urlparse
 
+from flask import g, has_app_context, has_request_context, session
+
+import timeutils
+
 # Detectar ambiente
 DATABASE_URL = os.environ.get('DATABASE_URL')
 USE_POSTGRES = DATABASE_URL is not None
 
+# Configuração do pool de conexões (por worker)
+POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '10'))
+POOL_MIN_IDLE = int(os.environ.get('DB_POOL_MIN_IDLE', '1'))
+POOL_MAX_LIFETIME = float(os.environ.get('DB_POOL_MAX_LIFETIME', '1800'))  # segundos
+POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '30'))  # espera máxima por uma conexão livre
+POOL_HEALTH_CHECK_IDLE = float(os.environ.get('DB_POOL_HEALTH_CHECK_IDLE', '10'))  # ping se ociosa há mais tempo
+
+# Cache de tradução de SQL e prepared statements (desligar atrás de PgBouncer em modo transaction)
+STATEMENT_CACHE_SIZE = int(os.environ.get('DB_STATEMENT_CACHE_SIZE', '512'))
+PREPARED_STATEMENTS = os.environ.get('DB_PREPARED_STATEMENTS', '1') != '0'
+
+# Linhas buscadas por ida ao banco na leitura em streaming
+STREAM_BATCH_SIZE = int(os.environ.get('DB_STREAM_BATCH_SIZE', '500'))
+
+# Fila única de escrita com group commit (apenas SQLite)
+SQLITE_WRITE_QUEUE = os.environ.get('SQLITE_WRITE_QUEUE', '0') == '1'
+GROUP_COMMIT_WINDOW = float(os.environ.get('SQLITE_GROUP_COMMIT_WINDOW_MS', '0')) / 1000
+GROUP_COMMIT_MAX = int(os.environ.get('SQLITE_GROUP_COMMIT_MAX', '64'))
+# Transação própria na thread escritora (leitura após escrita) desfeita se ficar ociosa por mais tempo
+WRITE_QUEUE_IDLE_TIMEOUT = float(os.environ.get('SQLITE_WRITE_QUEUE_IDLE_TIMEOUT', '30'))
+
+# Réplicas de leitura (apenas PostgreSQL): uma URL ou várias separadas por vírgula
+REPLICA_URLS = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URL', '').split(',') if url.strip()]
+REPLICA_COOLDOWN = float(os.environ.get('DB_REPLICA_COOLDOWN', '30'))  # segundos fora após uma falha
+REPLICA_TIMEOUT = float(os.environ.get('DB_REPLICA_TIMEOUT', '2'))  # conexão/espera no pool da réplica
+# Após uma escrita, as leituras da mesma sessão vão para a primária por N segundos (lag da réplica)
+REPLICA_STICKY_SECONDS = float(os.environ.get('DB_REPLICA_STICKY_SECONDS', '5'))
+
+# Instrumentação por requisição
+SLOW_QUERY_MS = float(os.environ.get('DB_SLOW_QUERY_MS', '200'))  # log de queries lentas; 0 desliga
+NPLUSONE_THRESHOLD = int(os.environ.get('DB_NPLUSONE_THRESHOLD', '5'))  # mesma query N vezes = N+1
+SLOWEST_KEPT = 5
+
+# Inicialização: 'fast' pula as migrações quando schema_version já está na versão atual
+STARTUP_MODE = os.environ.get('DB_STARTUP_MODE', 'fast')
+_STARTED_AT = time.perf_counter()
+
+WRITE_KEYWORDS = frozenset(('INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'CREATE', 'DROP', 'ALTER'))
+# Únicos comandos que podem ir para uma réplica (o resto fica na primária)
+READ_KEYWORDS = frozenset(('SELECT', 'WITH', 'VALUES', 'SHOW', 'EXPLAIN'))
+PRIMARY_ONLY_MARKERS = (' FOR UPDATE', ' FOR SHARE', 'NEXTVAL(', 'SETVAL(', 'PG_ADVISORY')
+
+
+class PoolTimeoutError(Exception):
+    """Nenhuma conexão ficou disponível dentro de DB_POOL_TIMEOUT"""
+
+
+class ReadOnlyError(Exception):
+    """Escrita dentro de um escopo marcado com read_only"""
+
+
+class TransactionTimeoutError(Exception):
+    """Transação na thread escritora desfeita por ficar ociosa além de SQLITE_WRITE_QUEUE_IDLE_TIMEOUT"""
+
+
+class PooledConnection:
+    """Conexão física mantida pelo pool com seus metadados"""
+    __slots__ = ('raw', 'created_at', 'last_used', 'prepared')
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.prepared = set()  # nomes de prepared statements já criados nesta sessão
+
+
+def _translate_placeholders(query, postgres):
+    """
+    Troca os placeholders `?` fora de literais/identificadores entre aspas.
+
+    Retorna (sql para o driver, sql com $1..$n para PREPARE, número de parâmetros).
+    """
+    driver_parts = []
+    prepare_parts = []
+    count = 0
+    quote = None
+    for char in query:
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in ("'", '"'):
+            quote = char
+        elif char == '?':
+            count += 1
+            driver_parts.append('%s' if postgres else '?')
+            prepare_parts.append(f'${count}')
+            continue
+        driver_parts.append(char)
+        prepare_parts.append(char)
+    return ''.join(driver_parts), ''.join(prepare_parts), count
+
+
+class Statement:
+    """SQL já traduzido para o dialeto ativo"""
+    __slots__ = ('sql', 'text', 'prepare_text', 'param_count', 'is_write', 'replica_safe', '_name')
+
+    def __init__(self, sql, postgres):
+        self.sql = sql
+        self.text, self.prepare_text, self.param_count = _translate_placeholders(sql, postgres)
+        words = sql.split(None, 1)
+        keyword = words[0].upper() if words else ''
+        self.is_write = keyword in WRITE_KEYWORDS
+        upper = sql.upper()
+        self.replica_safe = (
+            keyword in READ_KEYWORDS
+            and not any(marker in upper for marker in PRIMARY_ONLY_MARKERS)
+            and not (keyword == 'WITH' and any(word in upper for word in WRITE_KEYWORDS))
+        )
+        self._name = None
+
+    @property
+    def name(self):
+        """Nome estável do prepared statement (derivado do texto)"""
+        if self._name is None:
+            self._name = 'stmt_' + hashlib.md5(self.sql.encode('utf-8')).hexdigest()[:16]
+        return self._name
+
+    @property
+    def execute_text(self):
+        if not self.param_count:
+            return f'EXECUTE {self.name}'
+        return f'EXECUTE {self.name} (' + ', '.join(['%s'] * self.param_count) + ')'
+
+
+class StatementRegistry:
+    """
+    Traduz cada SQL distinto uma única vez por processo e guarda o resultado.
+
+    Os contadores (hits/misses/prepares/prepared_executions) mostram o efeito do cache.
+    """
+
+    def __init__(self, postgres, max_size=STATEMENT_CACHE_SIZE):
+        self._postgres = postgres
+        self._max_size = max_size
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'prepares': 0, 'prepared_executions': 0}
+
+    def get(self, sql):
+        stmt = self._cache.get(sql)
+        if stmt is not None:
+            self._stats['hits'] += 1
+            return stmt
+        stmt = Statement(sql, self._postgres)
+        with self._lock:
+            self._stats['misses'] += 1
+            # SQL montado dinamicamente não pode crescer o cache sem limite
+            if len(self._cache) < self._max_size:
+                self._cache[sql] = stmt
+        return stmt
+
+    def count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, cached=len(self._cache))
+
+
+class ConnectionPool:
+    """
+    Pool de conexões limitado, usado pelos dois dialetos.
+
+    - max_size: limite de conexões abertas por worker (bloqueia até `timeout` quando esgotado)
+    - min_idle: conexões mantidas abertas mesmo sem uso
+    - health check: conexões ociosas há mais de `health_check_idle` segundos recebem um
+      `SELECT 1` antes de serem entregues; as que falharem são descartadas
+    - max_lifetime: conexões mais antigas que isso são recicladas na devolução
+    - on_release: callback opcional chamado com a conexão física ao ser devolvida
+    """
+
+    def __init__(self, connect, max_size=POOL_MAX_SIZE, min_idle=POOL_MIN_IDLE,
+                 max_lifetime=POOL_MAX_LIFETIME, timeout=POOL_TIMEOUT,
+                 health_check_idle=POOL_HEALTH_CHECK_IDLE, on_release=None):
+        self._connect = connect
+        self._on_release = on_release
+        self.max_size = max(1, max_size)
+        self.min_idle = max(0, min(min_idle, self.max_size))
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.health_check_idle = health_check_idle
+        self._cond = threading.Condition()
+        self._reset_state()
+
+    def _reset_state(self):
+        self._pid = os.getpid()
+        self._idle = []
+        self._in_use = 0
+        self._stats = {
+            'created': 0,
+            'reused': 0,
+            'closed': 0,
+            'health_check_failures': 0,
+            'expired': 0,
+            'waits': 0,
+            'timeouts': 0,
+        }
+
+    def _check_fork(self):
+        # Após o fork do gunicorn cada worker precisa do seu próprio pool;
+        # conexões herdadas do processo pai não podem ser usadas nem fechadas aqui.
+        if self._pid != os.getpid():
+            self._reset_state()
+
+    def _open(self):
+        entry = PooledConnection(self._connect())
+        with self._cond:
+            self._stats['created'] += 1
+        return entry
+
+    def _discard(self, entry):
+        self._stats['closed'] += 1
+        try:
+            entry.raw.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, entry):
+        if time.monotonic() - entry.last_used < self.health_check_idle:
+            return True
+        try:
+            cursor = entry.raw.cursor()
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+            cursor.close()
+            if USE_POSTGRES:
+                entry.raw.rollback()
+            return True
+        except Exception:
+            return False
+
+    def acquire(self):
+        """Retira uma conexão do pool (criando uma nova se houver espaço)"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            entry = None
+            with self._cond:
+                self._check_fork()
+                while True:
+                    if self._idle:
+                        entry = self._idle.pop()
+                        self._in_use += 1
+                        break
+                    if self._in_use < self.max_size:
+                        # Reserva a vaga antes de conectar para não ultrapassar max_size
+                        self._in_use += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeoutError(
+                            f'Pool de conexões esgotado ({self.max_size} em uso) após {self.timeout}s'
+                        )
+                    self._stats['waits'] += 1
+                    self._cond.wait(remaining)
+
+            if entry is None:
+                try:
+                    return self._open()
+                except Exception:
+                    self._give_back_slot()
+                    raise
+
+            # Health check fora do lock para não segurar as outras threads
+            expired = time.monotonic() - entry.created_at > self.max_lifetime
+            if not expired and self._is_healthy(entry):
+                with self._cond:
+                    self._stats['reused'] += 1
+                return entry
+
+            with self._cond:
+                if expired:
+                    self._stats['expired'] += 1
+                else:
+                    self._stats['health_check_failures'] += 1
+                self._discard(entry)
+            self._give_back_slot()
+
+    def _give_back_slot(self):
+        with self._cond:
+            self._in_use -= 1
+            self._cond.notify()
+
+    def release(self, entry):
+        """Devolve a conexão ao pool, descartando transações pendentes"""
+        try:
+            entry.raw.rollback()
+            if self._on_release is not None:
+                self._on_release(entry.raw)
+            healthy = True
+        except Exception:
+            healthy = False
+
+        with self._cond:
+            if self._pid != os.getpid():
+                return
+            self._in_use -= 1
+            now = time.monotonic()
+            if not healthy:
+                self._discard(entry)
+            elif now - entry.created_at > self.max_lifetime:
+                self._stats['expired'] += 1
+                self._discard(entry)
+            else:
+                entry.last_used = now
+                self._idle.append(entry)
+            self._cond.notify()
+            refill = len(self._idle) < self.min_idle
+        if refill:
+            self.fill()
+
+    def fill(self):
+        """Abre conexões até atingir min_idle"""
+        while True:
+            with self._cond:
+                self._check_fork()
+                if len(self._idle) >= self.min_idle or len(self._idle) + self._in_use >= self.max_size:
+                    return
+                self._in_use += 1
+            try:
+                entry = self._open()
+            except Exception:
+                self._give_back_slot()
+                return
+            with self._cond:
+                self._in_use -= 1
+                self._idle.append(entry)
+                self._cond.notify()
+
+    def close_all(self):
+        """Fecha todas as conexões ociosas"""
+        with self._cond:
+            while self._idle:
+                self._discard(self._idle.pop())
+
+    def stats(self):
+        """Estatísticas do pool deste worker"""
+        with self._cond:
+            self._check_fork()
+            return dict(self._stats, pid=self._pid, in_use=self._in_use,
+                        idle=len(self._idle), max_size=self.max_size)
+
+
+class QueryStats:
+    """Consultas executadas numa requisição: contagem, tempo total, as mais lentas e repetições"""
+    __slots__ = ('count', 'total', 'slowest', 'shapes')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.slowest = []  # heap mínimo (duração, sql) com as SLOWEST_KEPT mais lentas
+        self.shapes = {}   # sql com placeholders -> [execuções, tempo total]
+
+    def record(self, sql, elapsed):
+        self.count += 1
+        self.total += elapsed
+        shape = self.shapes.get(sql)
+        if shape is None:
+            self.shapes[sql] = [1, elapsed]
+        else:
+            shape[0] += 1
+            shape[1] += elapsed
+        if len(self.slowest) < SLOWEST_KEPT:
+            heapq.heappush(self.slowest, (elapsed, sql))
+        elif elapsed > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (elapsed, sql))
+
+    def repeated(self, threshold=NPLUSONE_THRESHOLD):
+        """[(sql, execuções, tempo total)] das queries repetidas >= threshold vezes"""
+        return sorted(
+            ((sql, count, total) for sql, (count, total) in self.shapes.items() if count >= threshold),
+            key=lambda item: -item[1],
+        )
+
+
+def _short_sql(sql, limit=120):
+    return ' '.join(sql.split())[:limit]
+
+
+def _record_query(sql, started):
+    """Registra a duração de uma query na requisição atual e no log de lentas"""
+    elapsed = time.perf_counter() - started
+    if has_app_context():
+        stats = g.get('_db_stats')
+        if stats is None:
+            stats = g._db_stats = QueryStats()
+        stats.record(sql, elapsed)
+    if SLOW_QUERY_MS > 0 and elapsed * 1000 >= SLOW_QUERY_MS:
+        print(f"🐢 Query lenta ({elapsed * 1000:.0f} ms): {_short_sql(sql, 300)}")
+
+
+class ReplicaSet:
+    """
+    Réplicas de leitura, cada uma com o seu pool.
+
+    As réplicas são escolhidas em round-robin; uma réplica que falha fica fora por
+    `cooldown` segundos e, enquanto isso, as leituras caem na primária.
+    """
+
+    def __init__(self, pools, cooldown=REPLICA_COOLDOWN):
+        self._pools = pools  # lista de (nome, ConnectionPool)
+        self.cooldown = cooldown
+        self._down_until = [0.0] * len(pools)
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+        self._stats = {'primary': {'reads': 0, 'writes': 0, 'fallbacks': 0}}
+        for name, _ in pools:
+            self._stats[name] = {'reads': 0, 'errors': 0}
+
+    def acquire(self):
+        """Retorna (índice, entry) de uma réplica disponível, ou None se nenhuma estiver"""
+        start = next(self._next)
+        now = time.monotonic()
+        for offset in range(len(self._pools)):
+            index = (start + offset) % len(self._pools)
+            if self._down_until[index] > now:
+                continue
+            try:
+                return index, self._pools[index][1].acquire()
+            except PoolTimeoutError:
+                continue  # réplica ocupada, mas no ar: tenta a próxima sem cooldown
+            except Exception as exc:
+                self.mark_down(index, exc)
+        return None
+
+    def release(self, index, entry):
+        self._pools[index][1].release(entry)
+
+    def mark_down(self, index, exc):
+        name = self._pools[index][0]
+        self._down_until[index] = time.monotonic() + self.cooldown
+        self.count(name, 'errors')
+        print(f"⚠️ Réplica {name} indisponível por {self.cooldown:.0f}s: {exc}")
+
+    def name(self, index):
+        return self._pools[index][0]
+
+    def count(self, target, key):
+        with self._lock:
+            self._stats[target][key] += 1
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            stats = {target: dict(counters) for target, counters in self._stats.items()}
+        for index, (name, pool) in enumerate(self._pools):
+            stats[name]['available'] = self._down_until[index] <= now
+            stats[name]['pool'] = pool.stats()
+        return stats
+
+
+def _is_connection_error(exc):
+    """Falha de conexão/servidor (que justifica cair para a primária)"""
+    import psycopg2
+    return isinstance(exc, (psycopg2.OperationalError, psycopg2.InterfaceError))
+
+
+class read_only(contextlib.ContextDecorator):
+    """
+    Marca um trecho (ou uma rota, como decorator) como somente leitura.
+
+    Dentro do escopo as leituras da conexão da requisição vão sempre para uma réplica,
+    mesmo logo após uma escrita da sessão, e qualquer escrita levanta ReadOnlyError.
+    """
+
+    def __enter__(self):
+        g._db_read_only = g.get('_db_read_only', 0) + 1
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        g._db_read_only -= 1
+        return False
+
+
+class WriteUnit:
+    """Escritas de uma conexão entre dois commits, gravadas juntas pela WriteQueue"""
+    __slots__ = ('statements', 'results', 'future', 'commands')
+
+    def __init__(self):
+        self.statements = []
+        self.results = None  # [(lastrowid, rowcount), ...] depois de gravada
+        self.future = None
+        self.commands = None  # fila de comandos quando aberta como transação própria
+
+
+class WriteQueue:
+    """
+    Thread escritora única para SQLite com group commit.
+
+    As unidades de escrita enviadas pelas requisições vão para uma fila; a thread pega
+    tudo o que estiver esperando (até GROUP_COMMIT_MAX, aguardando no máximo
+    GROUP_COMMIT_WINDOW pela próxima) e grava em uma única transação, com um SAVEPOINT
+    por unidade para que a falha de uma não desfaça as outras.
+
+    Uma unidade aberta com open() (a requisição precisa ler antes do commit) roda sozinha
+    numa transação que fica aberta na thread: os comandos seguintes da requisição chegam
+    por send() e só o COMMIT ou o ROLLBACK dela a encerram. Enquanto isso as outras
+    unidades esperam, como esperariam pelo lock de escrita do SQLite.
+    """
+
+    def __init__(self, connect, window=GROUP_COMMIT_WINDOW, max_batch=GROUP_COMMIT_MAX):
+        self._connect = connect
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._stats = {'batches': 0, 'units': 0, 'statements': 0, 'failed_units': 0,
+                       'failed_batches': 0, 'largest_batch': 0, 'transactions': 0,
+                       'expired_transactions': 0}
+
+    def _ensure_started(self):
+        # Threads não sobrevivem ao fork: cada worker sobe a sua
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+            thread.start()
+            self._pid = os.getpid()
+
+    def submit(self, unit):
+        """Enfileira a unidade e espera a gravação; devolve os resultados por statement"""
+        self._ensure_started()
+        unit.future = Future()
+        self._queue.put(unit)
+        unit.results = unit.future.result()
+        return unit.results
+
+    def open(self, unit):
+        """Grava a unidade numa transação própria que continua aberta (ver send())"""
+        unit.commands = queue.Queue()
+        return self.submit(unit)
+
+    def send(self, unit, command, sql=None, params=None):
+        """Comando na transação aberta: 'execute' (devolve o resultado), 'COMMIT' ou 'ROLLBACK'"""
+        future = Future()
+        with self._lock:
+            if unit.commands is None:
+                raise TransactionTimeoutError('Transação desfeita por inatividade na fila de escrita')
+            unit.commands.put((command, sql, params, future))
+        return future.result()
+
+    def _run(self):
+        conn = self._connect()
+        conn.isolation_level = None  # transações controladas explicitamente
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                try:
+                    remaining = deadline - time.monotonic()
+                    if remaining > 0:
+                        batch.append(self._queue.get(timeout=remaining))
+                    else:
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write_batch(conn, batch)
+
+    def _write_batch(self, conn, batch):
+        """Grava o lote em ordem: as unidades abertas com open() rodam sozinhas"""
+        group = []
+        for unit in batch:
+            if unit.commands is None:
+                group.append(unit)
+                continue
+            if group:
+                self._write_group(conn, group)
+                group = []
+            self._run_transaction(conn, unit)
+        if group:
+            self._write_group(conn, group)
+
+    def _write_group(self, conn, batch):
+        outcomes = []
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for unit in batch:
+                conn.execute('SAVEPOINT unidade')
+                try:
+                    results = []
+                    for sql, params in unit.statements:
+                        cursor = conn.execute(sql, params or ())
+                        results.append((cursor.lastrowid, cursor.rowcount))
+                    conn.execute('RELEASE unidade')
+                    outcomes.append((unit, results, None))
+                except Exception as exc:
+                    conn.execute('ROLLBACK TO unidade')
+                    conn.execute('RELEASE unidade')
+                    outcomes.append((unit, None, exc))
+            conn.execute('COMMIT')
+        except Exception as exc:
+            try:
+                conn.execute('ROLLBACK')
+            except Exception:
+                pass
+            with self._lock:
+                self._stats['failed_batches'] += 1
+            for unit in batch:
+                unit.future.set_exception(exc)
+            return
+
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['units'] += len(batch)
+            self._stats['statements'] += sum(len(unit.statements) for unit in batch)
+            self._stats['largest_batch'] = max(self._stats['largest_batch'], len(batch))
+            self._stats['failed_units'] += sum(1 for _, _, exc in outcomes if exc is not None)
+        for unit, results, exc in outcomes:
+            if exc is not None:
+                unit.future.set_exception(exc)
+            else:
+                unit.future.set_result(results)
+
+    def _run_transaction(self, conn, unit):
+        """Transação de uma unidade, aberta até a requisição mandar COMMIT ou ROLLBACK"""
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            results = []
+            for sql, params in unit.statements:
+                cursor = conn.execute(sql, params or ())
+                results.append((cursor.lastrowid, cursor.rowcount))
+        except Exception as exc:
+            _rollback_quietly(conn)
+            unit.commands = None
+            with self._lock:
+                self._stats['failed_units'] += 1
+            unit.future.set_exception(exc)
+            return
+        with self._lock:
+            self._stats['transactions'] += 1
+            self._stats['statements'] += len(unit.statements)
+        unit.future.set_result(results)
+
+        while True:
+            try:
+                command, sql, params, future = unit.commands.get(timeout=WRITE_QUEUE_IDLE_TIMEOUT)
+            except queue.Empty:
+                with self._lock:
+                    if unit.commands.empty():
+                        # A requisição sumiu sem commit/rollback: não segura as outras escritas
+                        unit.commands = None
+                        self._stats['expired_transactions'] += 1
+                if unit.commands is None:
+                    _rollback_quietly(conn)
+                    print(f"⚠️ Fila de escrita: transação ociosa por {WRITE_QUEUE_IDLE_TIMEOUT:.0f}s desfeita")
+                    return
+                continue
+            if command == 'execute':
+                try:
+                    cursor = conn.execute(sql, params or ())
+                    future.set_result((cursor.description, cursor.fetchall(), cursor.lastrowid, cursor.rowcount))
+                    with self._lock:
+                        self._stats['statements'] += 1
+                except Exception as exc:
+                    future.set_exception(exc)  # a transação continua, como fora da fila
+                continue
+            unit.commands = None
+            try:
+                conn.execute(command)
+                future.set_result(None)
+            except Exception as exc:
+                _rollback_quietly(conn)
+                future.set_exception(exc)
+            return
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, pending=self._queue.qsize() if self._queue else 0)
+
+
+def _rollback_quietly(conn):
+    try:
+        conn.execute('ROLLBACK')
+    except Exception:
+        pass
+
+
+class QueuedCursor:
+    """Cursor de uma escrita enfileirada; rowcount/lastrowid abrem a transação na thread escritora"""
+
+    def __init__(self, conn, unit, index):
+        self._conn = conn
+        self._unit = unit
+        self._index = index
+
+    def _result(self, position):
+        if self._unit.results is None and self._conn._pending is self._unit:
+            self._conn._open_transaction()
+        if self._unit.results is None:
+            return -1 if position else None  # unidade descartada por rollback
+        return self._unit.results[self._index][position]
+
+    @property
+    def rowcount(self):
+        return self._result(1)
+
+    @property
+    def lastrowid(self):
+        return self._result(0)
+
+    def fetchone(self):
+        return None
+
+    def fetchall(self):
+        return []
+
+
+class QueuedResult:
+    """Resultado de um comando executado na transação aberta na thread escritora"""
+
+    def __init__(self, description, rows, lastrowid, rowcount):
+        self.description = description
+        self.lastrowid = lastrowid
+        self.rowcount = rowcount
+        self._columns = _column_map(description)
+        self._rows = iter(rows)
+
+    def fetchone(self):
+        row = next(self._rows, None)
+        return Row(self._columns, row) if row is not None else None
+
+    def fetchall(self):
+        return [Row(self._columns, row) for row in self._rows]
+
+    def fetchmany(self, size=None):
+        return [Row(self._columns, row) for row in itertools.islice(self._rows, size or STREAM_BATCH_SIZE)]
+
+    def __iter__(self):
+        return (Row(self._columns, row) for row in self._rows)
+
+    def close(self):
+        self._rows = iter(())
+
+
+class Row:
+    """
+    Linha de resultado compartilhada pelos dois dialetos.
+
+    Aceita acesso por índice (row[0]) e por nome (row['id']), keys(), `in` e dict(row),
+    como sqlite3.Row. O mapa nome -> posição é criado uma vez por result set e
+    compartilhado por todas as linhas; cada linha guarda só a tupla de valores.
+    """
+    __slots__ = ('_columns', '_values')
+
+    def __init__(self, columns, values):
+        self._columns = columns
+        self._values = values
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, slice)):
+            return self._values[key]
+        return self._values[self._columns[key]]
+
+    def keys(self):
+        return list(self._columns)
+
+    def __contains__(self, key):
+        return key in self._columns
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __eq__(self, other):
+        if isinstance(other, Row):
+            return self._columns.keys() == other._columns.keys() and self._values == other._values
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((tuple(self._columns), self._values))
+
+    def __repr__(self):
+        return f'<Row {dict(zip(self._columns, self._values))!r}>'
+
+
+def _column_map(description):
+    """Mapa nome da coluna -> posição (a primeira ocorrência vence, como no sqlite3.Row)"""
+    columns = {}
+    for index, column in enumerate(description or ()):
+        columns.setdefault(column[0], index)
+    return columns
+
+
 class CursorWrapper:
-    """Wrapper para cursor que converte resultados PostgreSQL para formato SQLite Row"""
+    """Wrapper para cursor que entrega as linhas dos dois dialetos como Row"""
     def __init__(self, cursor, is_postgres=False):
         self._cursor = cursor
         self._is_postgres = is_postgres
+        self._columns = None
+
+    def _column_map(self):
+        if self._columns is None:
+            self._columns = _column_map(self._cursor.description)
+        return self._columns
     
     def fetchone(self):
         result = self._cursor.fetchone()
         if result is None:
             return None
-        if self._is_postgres:
-            # PostgreSQL RealDictCursor já retorna dict-like
-            # Criar uma classe que se comporta como sqlite3.Row
-            class PostgresRow:
-                def __init__(self, data):
-                    self._data = data
-                
-                def __getitem__(self, key):
-                    return self._data[key]
-                
-                def keys(self):
-                    return self._data.keys()
-                
-                def __contains__(self, key):
-                    return key in self._data
-            
-            return PostgresRow(result)
-        return result
+        return Row(self._column_map(), result)
     
     def fetchall(self):
-        results = self._cursor.fetchall()
-        if self._is_postgres:
-            class PostgresRow:
-                def __init__(self, data):
-                    self._data = data
-                
-                def __getitem__(self, key):
-                    return self._data[key]
-                
-                def keys(self):
-                    return self._data.keys()
-                
-                def __contains__(self, key):
-                    return key in self._data
-            
-            return [PostgresRow(row) for row in results]
-        return results
+        columns = self._column_map()
+        return [Row(columns, row) for row in self._cursor.fetchall()]
+
+    def fetchmany(self, size=None):
+        results = self._cursor.fetchmany(size or self._cursor.arraysize)
+        if not results:
+            return []
+        columns = self._column_map()
+        return [Row(columns, row) for row in results]
+
+    def __iter__(self):
+        """Itera em lotes de fetchmany, sem materializar o result set inteiro"""
+        while True:
+            rows = self.fetchmany(STREAM_BATCH_SIZE)
+            if not rows:
+                return
+            yield from rows
     
     def execute(self, *args, **kwargs):
+        self._columns = None
         return self._cursor.execute(*args, **kwargs)
+
+    def close(self):
+        return self._cursor.close()
     
     @property
     def rowcount(self):
@@ -70,36 +866,265 @@ class CursorWrapper:
         return self._cursor.lastrowid if hasattr(self._cursor, 'lastrowid') else None
 
 class DatabaseConnection:
-    """Wrapper para conexões de banco que converte queries automaticamente"""
-    def __init__(self, conn):
-        self._conn = conn
-        self.row_factory = getattr(conn, 'row_factory', None)
+    """
+    Wrapper para conexões de banco que converte queries automaticamente.
+
+    Com réplicas configuradas, a conexão primária só é retirada do pool quando
+    necessária: leituras vão para uma réplica até a primeira escrita; a partir
+    dela (e na sessão, por DB_REPLICA_STICKY_SECONDS) tudo vai para a primária.
+    """
+    def __init__(self, entry, pool=None, request_scoped=False):
+        self._entry = entry  # primária; None = retirada do pool no primeiro uso
+        self._pool = pool
+        self._request_scoped = request_scoped
+        self._pending = None  # WriteUnit ainda não gravada (modo fila de escrita)
+        self._transaction = None  # WriteUnit aberta como transação na thread escritora
+        self._replica = None  # (índice, entry) da réplica em uso
+        self._wrote = False
+
+    def _primary(self):
+        if self._entry is None:
+            self._entry = self._pool.acquire()
+        return self._entry
+
+    @property
+    def _conn(self):
+        return self._primary().raw
+
+    def _in_read_only_scope(self):
+        return self._request_scoped and has_app_context() and g.get('_db_read_only', 0) > 0
+
+    def _read_entry(self, stmt):
+        """Conexão que atende uma leitura: réplica quando seguro, senão a primária"""
+        if _replicas is None or not stmt.replica_safe:
+            return self._primary()
+        if not self._in_read_only_scope() and (self._wrote or _session_wrote_recently()):
+            return self._primary()
+        if self._replica is None:
+            self._replica = _replicas.acquire()
+            if self._replica is None:
+                _replicas.count('primary', 'fallbacks')
+                return self._primary()
+        return self._replica[1]
+
+    def _drop_replica(self, exc):
+        index, entry = self._replica
+        self._replica = None
+        _replicas.mark_down(index, exc)
+        _replicas.release(index, entry)
+        _replicas.count('primary', 'fallbacks')
+
+    def _release_replica(self):
+        replica, self._replica = self._replica, None
+        if replica is not None:
+            _replicas.release(*replica)
+
+    def _on_read(self, stmt, run):
+        """Executa run(entry) numa leitura, caindo para a primária se a réplica falhar"""
+        entry = self._read_entry(stmt)
+        if _replicas is None:
+            return run(entry)
+        try:
+            result = run(entry)
+        except Exception as exc:
+            if entry is self._entry or not _is_connection_error(exc):
+                raise
+            self._drop_replica(exc)
+            entry = self._primary()
+            result = run(entry)
+        _replicas.count('primary' if entry is self._entry else _replicas.name(self._replica[0]), 'reads')
+        return result
     
     def cursor(self):
         """Retorna cursor do banco"""
         cursor = self._conn.cursor()
         return CursorWrapper(cursor, USE_POSTGRES)
     
-    def execute(self, query, params=None):
-        """Executa query convertendo placeholders se necessário"""
-        if USE_POSTGRES:
-            query = query.replace('?', '%s')
-        
-        cursor = self._conn.cursor()
-        if params:
-            cursor.execute(query, params)
+    def execute(self, query, params=None, prepared=False):
+        """
+        Executa query convertendo placeholders se necessário.
+
+        prepared=True marca consultas quentes: no PostgreSQL elas viram prepared
+        statements no servidor (PREPARE uma vez por conexão, depois só EXECUTE).
+        """
+        stmt = _statements.get(query)
+        if stmt.is_write:
+            self._before_write()
+        if _write_queue is not None:
+            if self._transaction is not None:
+                return self._run_queued(stmt, params)
+            if stmt.is_write:
+                if self._pending is None:
+                    self._pending = WriteUnit()
+                self._pending.statements.append((stmt.text, params))
+                return QueuedCursor(self, self._pending, len(self._pending.statements) - 1)
+            if self._pending is not None:
+                # Leitura depois de escrever: a unidade vira uma transação aberta na thread
+                # escritora e a leitura roda nela (vê as próprias escritas, ainda sem commit)
+                self._open_transaction()
+                return self._run_queued(stmt, params)
+        if stmt.is_write or not stmt.replica_safe:
+            return self._run(self._primary(), stmt, params, prepared)
+        return self._on_read(stmt, lambda entry: self._run(entry, stmt, params, prepared))
+
+    def _before_write(self):
+        if self._in_read_only_scope():
+            raise ReadOnlyError('Escrita dentro de um escopo read_only')
+        if _replicas is not None:
+            if not self._wrote:
+                # Leituras seguintes precisam ver esta escrita: a réplica não serve mais
+                self._wrote = True
+                self._release_replica()
+            _replicas.count('primary', 'writes')
+
+    def _run(self, entry, stmt, params, prepared):
+        started = time.perf_counter()
+        try:
+            return self._run_statement(entry, stmt, params, prepared)
+        finally:
+            _record_query(stmt.sql, started)
+
+    def _run_statement(self, entry, stmt, params, prepared):
+        cursor = entry.raw.cursor()
+        if prepared and USE_POSTGRES and PREPARED_STATEMENTS:
+            if stmt.name not in entry.prepared:
+                cursor.execute(f'PREPARE {stmt.name} AS {stmt.prepare_text}')
+                entry.prepared.add(stmt.name)
+                _statements.count('prepares')
+            _statements.count('prepared_executions')
+            cursor.execute(stmt.execute_text, params or None)
+        elif params:
+            cursor.execute(stmt.text, params)
         else:
-            cursor.execute(query)
+            cursor.execute(stmt.text)
         return CursorWrapper(cursor, USE_POSTGRES)
     
+    def stream(self, query, params=None, batch_size=STREAM_BATCH_SIZE):
+        """
+        Itera o resultado em memória constante, `batch_size` linhas por vez.
+
+        No PostgreSQL usa um cursor nomeado (server-side); no SQLite o próprio cursor
+        já avança linha a linha. Consuma o iterador até o fim (ou feche-o) antes de
+        devolver a conexão.
+        """
+        stmt = _statements.get(query)
+        if self._pending is not None or self._transaction is not None:
+            # Depois de uma escrita a leitura roda na transação da thread escritora
+            yield from self.execute(query, params).fetchall()
+            return
+
+        def run(entry):
+            started = time.perf_counter()
+            if USE_POSTGRES:
+                cursor = entry.raw.cursor(name=f'stream_{next(_stream_ids)}')
+                cursor.itersize = batch_size
+            else:
+                cursor = entry.raw.cursor()
+            try:
+                if params:
+                    cursor.execute(stmt.text, params)
+                else:
+                    cursor.execute(stmt.text)
+            except Exception:
+                cursor.close()
+                raise
+            finally:
+                _record_query(stmt.sql, started)
+            return cursor
+
+        cursor = self._on_read(stmt, run)
+        try:
+            columns = None
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                if columns is None:
+                    # Cursores nomeados só preenchem description após o primeiro fetch
+                    columns = _column_map(cursor.description)
+                for row in rows:
+                    yield Row(columns, row)
+        finally:
+            cursor.close()
+
+    def _flush_writes(self):
+        """Envia as escritas pendentes à thread escritora e espera o group commit"""
+        unit, self._pending = self._pending, None
+        if unit is not None:
+            started = time.perf_counter()
+            _write_queue.submit(unit)
+            for sql, _ in unit.statements:
+                _record_query(sql, started)
+
+    def _open_transaction(self):
+        """Grava as escritas pendentes numa transação que fica aberta até commit()/rollback()"""
+        unit, self._pending = self._pending, None
+        started = time.perf_counter()
+        _write_queue.open(unit)
+        self._transaction = unit
+        for sql, _ in unit.statements:
+            _record_query(sql, started)
+
+    def _run_queued(self, stmt, params):
+        started = time.perf_counter()
+        try:
+            result = _write_queue.send(self._transaction, 'execute', stmt.text, params)
+        except TransactionTimeoutError:
+            self._transaction = None
+            raise
+        finally:
+            _record_query(stmt.sql, started)
+        return QueuedResult(*result)
+
+    def _end_transaction(self, command):
+        unit, self._transaction = self._transaction, None
+        if unit is not None:
+            _write_queue.send(unit, command)
+
     def commit(self):
-        return self._conn.commit()
+        if self._transaction is not None:
+            self._end_transaction('COMMIT')
+        elif self._pending is not None:
+            self._flush_writes()
+        if self._wrote and REPLICA_STICKY_SECONDS > 0 and has_request_context():
+            session['_db_escrita'] = time.time()
+        if self._entry is None:
+            return None  # nada foi feito na primária
+        return self._entry.raw.commit()
     
     def close(self):
-        return self._conn.close()
+        """Devolve a conexão ao pool (ou fecha, se não vier de um pool)"""
+        if self._request_scoped:
+            # A conexão da requisição só é devolvida no teardown_appcontext
+            return None
+        return self.release()
+
+    def release(self):
+        """Devolve a conexão (e a réplica em uso) ao pool incondicionalmente"""
+        self._pending = None  # escritas sem commit são descartadas, como no rollback
+        try:
+            self._end_transaction('ROLLBACK')
+        except TransactionTimeoutError:
+            pass
+        self._release_replica()
+        entry, self._entry = self._entry, None
+        if entry is None:
+            return None
+        if self._pool is not None:
+            return self._pool.release(entry)
+        return entry.raw.close()
     
     def rollback(self):
-        return self._conn.rollback()
+        self._pending = None
+        try:
+            self._end_transaction('ROLLBACK')
+        except TransactionTimeoutError:
+            pass  # já foi desfeita pela thread escritora
+        if self._replica is not None:
+            self._replica[1].raw.rollback()
+        if self._entry is None:
+            return None
+        return self._entry.raw.rollback()
     
     def __enter__(self):
         return self
@@ -109,291 +1134,269 @@ class DatabaseConnection:
             self.rollback()
         self.close()
 
+    def __del__(self):
+        # Rotas que retornam antes de chamar close() não podem vazar vagas do pool
+        if (getattr(self, '_entry', None) is not None or getattr(self, '_replica', None) is not None
+                or getattr(self, '_transaction', None) is not None):
+            try:
+                self.release()
+            except Exception:
+                pass
+
 if USE_POSTGRES:
     # PostgreSQL
-    import psycopg2
-    from psycopg2.extras import RealDictCursor
-    
     # Corrigir URL se necessário (Render usa postgres:// mas psycopg2 precisa postgresql://)
     if DATABASE_URL.startswith('postgres://'):
         DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
     
-    print("🐘 Usando PostgreSQL em produção")
+    def backend_description():
+        return "🐘 Usando PostgreSQL em produção"
     
-    def get_db_connection():
-        """Conexão PostgreSQL com wrapper"""
-        conn = psycopg2.connect(DATABASE_URL)
-        return DatabaseConnection(conn)
+    def _connect(url=None, **kwargs):
+        """Abre uma conexão física PostgreSQL (o driver só é importado na primeira conexão)"""
+        import psycopg2
+        # Datas gravadas e lidas em UTC (CURRENT_TIMESTAMP inclusive), como no SQLite
+        kwargs.setdefault('options', '-c timezone=UTC')
+        return psycopg2.connect(url or DATABASE_URL, **kwargs)
     
     def convert_query(query):
         """Converte placeholders SQLite (?) para PostgreSQL (%s)"""
-        return query.replace('?', '%s')
+        return _statements.get(query).text
+
+    _on_release = None
     
 else:
     # SQLite (desenvolvimento)
     DATABASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chamados_ti.db')
-    print(f"📁 Usando SQLite: {DATABASE}")
+
+    # Perfis de ajuste aplicados a cada conexão (SQLITE_PROFILE=default|production)
+    SQLITE_PROFILES = {
+        'default': {},
+        'production': {
+            'journal_mode': 'WAL',     # leitores não esperam pelo escritor
+            'synchronous': 'NORMAL',   # seguro com WAL; fsync só nos checkpoints
+            'busy_timeout': 5000,      # ms aguardando o lock antes de "database is locked"
+            'mmap_size': 268435456,    # 256 MB de leitura via mmap
+            'cache_size': -20000,      # ~20 MB de page cache por conexão
+            'foreign_keys': 'ON',
+            'temp_store': 'MEMORY',
+        },
+    }
+    SQLITE_PROFILE = os.environ.get(
+        'SQLITE_PROFILE', 'production' if os.environ.get('FLASK_ENV') == 'production' else 'default'
+    )
+    if SQLITE_PROFILE not in SQLITE_PROFILES:
+        print(f"⚠️ SQLITE_PROFILE desconhecido: {SQLITE_PROFILE!r}, usando 'default'")
+        SQLITE_PROFILE = 'default'
+    SQLITE_PRAGMAS = SQLITE_PROFILES[SQLITE_PROFILE]
+    # Checkpoint passivo do WAL a cada N segundos (por worker); 0 desliga
+    SQLITE_CHECKPOINT_INTERVAL = float(os.environ.get('SQLITE_CHECKPOINT_INTERVAL', '300'))
+    _last_checkpoint = time.monotonic()
+
+    def backend_description():
+        return f"📁 Usando SQLite: {DATABASE} (perfil {SQLITE_PROFILE})"
     
-    def get_db_connection():
-        """Conexão SQLite com wrapper"""
-        conn = sqlite3.connect(DATABASE)
-        conn.row_factory = sqlite3.Row
-        return DatabaseConnection(conn)
+    # Colunas TIMESTAMP voltam como datetime (texto canônico em UTC, ver timeutils.py)
+    # e datetimes passados como parâmetro são gravados nesse mesmo formato
+    sqlite3.register_converter('TIMESTAMP', timeutils.sqlite_timestamp)
+    sqlite3.register_adapter(datetime, timeutils.to_db_text)
+
+    def _connect():
+        """Abre uma conexão física SQLite com os PRAGMAs do perfil ativo"""
+        # check_same_thread=False: a conexão muda de thread ao voltar para o pool,
+        # mas nunca é usada por duas threads ao mesmo tempo
+        busy_timeout = SQLITE_PRAGMAS.get('busy_timeout', 5000)
+        conn = sqlite3.connect(DATABASE, check_same_thread=False,
+                               timeout=busy_timeout / 1000,
+                               cached_statements=STATEMENT_CACHE_SIZE,
+                               detect_types=sqlite3.PARSE_DECLTYPES)
+        for pragma, value in SQLITE_PRAGMAS.items():
+            conn.execute(f'PRAGMA {pragma} = {value}')
+        return conn
+
+    def _on_release(conn):
+        """Faz um checkpoint passivo do WAL de tempos em tempos"""
+        global _last_checkpoint
+        if SQLITE_PRAGMAS.get('journal_mode') != 'WAL' or SQLITE_CHECKPOINT_INTERVAL <= 0:
+            return
+        now = time.monotonic()
+        if now - _last_checkpoint < SQLITE_CHECKPOINT_INTERVAL:
+            return
+        _last_checkpoint = now
+        try:
+            conn.execute('PRAGMA wal_checkpoint(PASSIVE)')
+        except sqlite3.Error:
+            pass
     
     def convert_query(query):
         """Em SQLite, mantém os placeholders (?)"""
         return query
 
 
-def init_db():
-    """Inicializa o banco de dados com as tabelas necessárias"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+_pool = ConnectionPool(_connect, on_release=_on_release)
+
+_replicas = None
+if REPLICA_URLS:
     if USE_POSTGRES:
-        # PostgreSQL - Sintaxe específica
-        print("🔧 Criando tabelas no PostgreSQL...")
-        
-        # Tabela de usuários
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                username VARCHAR(100) UNIQUE NOT NULL,
-                email VARCHAR(150) UNIQUE NOT NULL,
-                password_hash VARCHAR(255) NOT NULL,
-                role VARCHAR(20) DEFAULT 'user',
-                funcao_id INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Tabela de funções
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS funcoes (
-                id SERIAL PRIMARY KEY,
-                nome VARCHAR(100) UNIQUE NOT NULL,
-                descricao TEXT,
-                permissoes TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Tabela de chamados
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS chamados (
-                id SERIAL PRIMARY KEY,
-                titulo VARCHAR(200) NOT NULL,
-                descricao TEXT,
-                status VARCHAR(20) DEFAULT 'aberto',
-                prioridade VARCHAR(20) DEFAULT 'media',
-                usuario_id INTEGER REFERENCES users(id),
-                atribuido_id INTEGER REFERENCES users(id),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Tabela de mensagens do chat
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS chat_mensagens (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER REFERENCES users(id),
-                username VARCHAR(100),
-                mensagem TEXT NOT NULL,
-                data_envio TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                lida BOOLEAN DEFAULT FALSE
-            )
-        ''')
-        
-        # Tabela de permissões de usuário
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_permissions (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                permission_key VARCHAR(100) NOT NULL,
-                enabled BOOLEAN DEFAULT TRUE,
-                UNIQUE(user_id, permission_key)
-            )
-        ''')
-        
-        # Tabela de servidores
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS servidores (
-                id SERIAL PRIMARY KEY,
-                nome VARCHAR(100) UNIQUE NOT NULL,
-                tipo VARCHAR(50),
-                ip_address VARCHAR(45),
-                status VARCHAR(20) DEFAULT 'ativo',
-                descricao TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Tabela de armazenamentos
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS armazenamentos (
-                id SERIAL PRIMARY KEY,
-                nome VARCHAR(100) UNIQUE NOT NULL,
-                tipo VARCHAR(50),
-                capacidade_total BIGINT,
-                capacidade_usada BIGINT,
-                status VARCHAR(20) DEFAULT 'ativo',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Tabela de backup de storage de servidores
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS servidores_storage_backup (
-                id SERIAL PRIMARY KEY,
-                servidor_id INTEGER REFERENCES servidores(id),
-                nome_storage VARCHAR(255),
-                caminho_storage VARCHAR(500),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Tabela de nomes de roles
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS role_names (
-                id SERIAL PRIMARY KEY,
-                role_key VARCHAR(50) UNIQUE NOT NULL,
-                display_name VARCHAR(100) NOT NULL
-            )
-        ''')
-        
+        _replicas = ReplicaSet([
+            (f'replica-{index}', ConnectionPool(
+                lambda url=url.replace('postgres://', 'postgresql://', 1): _connect(
+                    url, connect_timeout=max(1, int(REPLICA_TIMEOUT))),
+                timeout=REPLICA_TIMEOUT))
+            for index, url in enumerate(REPLICA_URLS)
+        ])
     else:
-        # SQLite - Sintaxe específica
-        print("🔧 Criando tabelas no SQLite...")
-        
-        # Tabela de usuários
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                role TEXT DEFAULT 'user',
-                funcao_id INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Tabela de funções
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS funcoes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nome TEXT UNIQUE NOT NULL,
-                descricao TEXT,
-                permissoes TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Tabela de chamados
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS chamados (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                titulo TEXT NOT NULL,
-                descricao TEXT,
-                status TEXT DEFAULT 'aberto',
-                prioridade TEXT DEFAULT 'media',
-                usuario_id INTEGER,
-                atribuido_id INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (usuario_id) REFERENCES users (id),
-                FOREIGN KEY (atribuido_id) REFERENCES users (id)
-            )
-        ''')
-        
-        # Tabela de mensagens do chat
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS chat_mensagens (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                username TEXT,
-                mensagem TEXT NOT NULL,
-                data_envio TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                lida BOOLEAN DEFAULT 0,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-        
-        # Tabela de permissões de usuário
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_permissions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                permission_key TEXT NOT NULL,
-                enabled BOOLEAN DEFAULT 1,
-                UNIQUE(user_id, permission_key),
-                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
-            )
-        ''')
-        
-        # Tabela de servidores
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS servidores (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nome TEXT UNIQUE NOT NULL,
-                tipo TEXT,
-                ip_address TEXT,
-                status TEXT DEFAULT 'ativo',
-                descricao TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Tabela de armazenamentos
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS armazenamentos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nome TEXT UNIQUE NOT NULL,
-                tipo TEXT,
-                capacidade_total INTEGER,
-                capacidade_usada INTEGER,
-                status TEXT DEFAULT 'ativo',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Tabela de backup de storage de servidores
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS servidores_storage_backup (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                servidor_id INTEGER,
-                nome_storage TEXT,
-                caminho_storage TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (servidor_id) REFERENCES servidores (id)
-            )
-        ''')
-        
-        # Tabela de nomes de roles
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS role_names (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                role_key TEXT UNIQUE NOT NULL,
-                display_name TEXT NOT NULL
-            )
-        ''')
-    
-    # Inserir dados padrão (funciona em ambos)
-    cursor.execute("SELECT COUNT(*) as count FROM role_names")
-    if USE_POSTGRES:
-        count = cursor.fetchone()['count']
+        print("⚠️ DATABASE_REPLICA_URL ignorado: réplicas só são suportadas com PostgreSQL")
+_statements = StatementRegistry(USE_POSTGRES)
+_stream_ids = itertools.count(1)
+
+_write_queue = None
+if SQLITE_WRITE_QUEUE and not USE_POSTGRES:
+    if SQLITE_PRAGMAS.get('journal_mode') != 'WAL':
+        print("⚠️ SQLITE_WRITE_QUEUE sem WAL: leitores podem bloquear a thread escritora")
+    _write_queue = WriteQueue(_connect)
+
+
+def get_db_connection():
+    """Retorna uma conexão do pool com wrapper; close() a devolve ao pool"""
+    # Com réplicas a primária só é retirada do pool se for usada
+    return DatabaseConnection(None if _replicas is not None else _pool.acquire(), _pool)
+
+
+def _session_wrote_recently():
+    """A sessão escreveu há menos de DB_REPLICA_STICKY_SECONDS (ler a primária)"""
+    if REPLICA_STICKY_SECONDS <= 0 or not has_request_context():
+        return False
+    return time.time() - session.get('_db_escrita', 0) < REPLICA_STICKY_SECONDS
+
+
+def get_db():
+    """
+    Conexão da requisição atual, guardada em flask.g.
+
+    É aberta no primeiro uso e devolvida ao pool em teardown_appcontext, de modo que
+    a rota, has_permission() e os helpers dos templates compartilham uma única conexão.
+    Fora de um contexto de aplicação retorna uma conexão avulsa do pool.
+    """
+    if not has_app_context():
+        return get_db_connection()
+    conn = g.get('_db_conn')
+    if conn is None:
+        conn = DatabaseConnection(None if _replicas is not None else _pool.acquire(), _pool,
+                                  request_scoped=True)
+        g._db_conn = conn
+    return conn
+
+
+def close_db(exc=None):
+    """Devolve ao pool a conexão da requisição (descartando o que não foi commitado)"""
+    conn = g.pop('_db_conn', None)
+    if conn is not None:
+        conn.release()
+
+
+def request_query_stats():
+    """QueryStats da requisição atual (None se nenhuma query foi executada)"""
+    return g.get('_db_stats') if has_app_context() else None
+
+
+def _report_queries(response):
+    """Server-Timing (em debug) e alerta de N+1 ao fim de cada requisição"""
+    from flask import current_app, request
+
+    stats = request_query_stats()
+    if stats is None:
+        return response
+    repeated = stats.repeated()
+    for sql, count, total in repeated:
+        print(f"⚠️ Possível N+1 em {request.method} {request.path}: "
+              f"{count}x ({total * 1000:.1f} ms) {_short_sql(sql)}")
+    if current_app.debug:
+        metrics = [f'db;dur={stats.total * 1000:.1f};desc="{stats.count} queries"']
+        for index, (elapsed, sql) in enumerate(sorted(stats.slowest, reverse=True), 1):
+            desc = _short_sql(sql, 60).replace('"', "'").replace('\\', '/')
+            desc = desc.encode('ascii', 'replace').decode('ascii')
+            metrics.append(f'db-slow{index};dur={elapsed * 1000:.1f};desc="{desc}"')
+        if repeated:
+            metrics.append(f'db-nplusone;desc="{len(repeated)} queries repetidas"')
+        response.headers.add('Server-Timing', ', '.join(metrics))
+    return response
+
+
+def init_app(app):
+    """Registra o fechamento da conexão da requisição, a instrumentação e o relatório de cold start"""
+    app.teardown_appcontext(close_db)
+    app.after_request(_report_queries)
+
+    primeira = [True]
+
+    @app.before_request
+    def _report_first_request():
+        if primeira[0]:
+            primeira[0] = False
+            elapsed = (time.perf_counter() - _STARTED_AT) * 1000
+            print(f"⚡ Worker {os.getpid()}: primeira requisição {elapsed:.0f} ms após carregar database.py")
+
+
+def pool_stats():
+    """Estatísticas do pool de conexões deste worker"""
+    return _pool.stats()
+
+
+def routing_stats():
+    """Leituras/escritas/falhas por destino (None sem réplicas configuradas)"""
+    return _replicas.stats() if _replicas is not None else None
+
+
+def statement_stats():
+    """Contadores do cache de tradução de SQL e dos prepared statements"""
+    return _statements.stats()
+
+
+def write_queue_stats():
+    """Contadores da fila de escrita (None quando desligada)"""
+    return _write_queue.stats() if _write_queue is not None else None
+
+
+def _current_schema_version(conn):
+    """Lê a versão do esquema numa única consulta; None se schema_version não existir"""
+    cursor = conn.cursor()  # sempre na primária, nunca numa réplica atrasada
+    try:
+        cursor.execute('SELECT MAX(version) FROM schema_version')
+        row = cursor.fetchone()
+    except Exception:
+        conn.rollback()
+        return None
+    return row[0] if row else None
+
+
+def init_db(mode=None):
+    """
+    Inicializa o banco de dados aplicando as migrações pendentes (ver migrations.py).
+
+    No modo 'fast' (padrão, DB_STARTUP_MODE) basta uma leitura de schema_version para
+    pular todo o DDL quando o esquema já está atualizado; 'full' sempre passa pelo runner.
+    """
+    from migrations import CURRENT_VERSION, run_migrations, schema_version
+
+    mode = mode or STARTUP_MODE
+    print(backend_description())
+    inicio = time.perf_counter()
+    conn = get_db_connection()
+    try:
+        versao = _current_schema_version(conn) if mode == 'fast' else None
+        if versao is not None and versao >= CURRENT_VERSION:
+            aplicadas = []
+        else:
+            aplicadas = run_migrations(conn)
+            versao = schema_version(conn)
+    finally:
+        conn.close()
+    elapsed = (time.perf_counter() - inicio) * 1000
+    if aplicadas:
+        print(f"✅ Banco de dados inicializado com sucesso! (esquema v{versao}, {elapsed:.0f} ms)")
     else:
-        count = cursor.fetchone()[0]
-    
-    if count == 0:
-        cursor.execute("INSERT INTO role_names (role_key, display_name) VALUES ('admin', 'Administrador')")
-        cursor.execute("INSERT INTO role_names (role_key, display_name) VALUES ('user', 'Usuário')")
-        cursor.execute("INSERT INTO role_names (role_key, display_name) VALUES ('suporte', 'Suporte TI')")
-    
-    conn.commit()
-    conn.close()
-    print("✅ Banco de dados inicializado com sucesso!")
+        print(f"✅ Banco de dados já está atualizado (esquema v{versao}, {elapsed:.0f} ms)")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,776 @@
+"""
+Migrações versionadas do esquema do banco de dados
+Cada migração tem um script por dialeto (SQLite e PostgreSQL) e é aplicada uma única vez,
+em ordem, registrando a versão na tabela schema_version.
+"""
+import timeutils
+from database import USE_POSTGRES, convert_query
+
+DIALECT = 'postgres' if USE_POSTGRES else 'sqlite'
+
+# Chave do advisory lock do PostgreSQL que serializa workers migrando ao mesmo tempo
+MIGRATION_LOCK_KEY = 727274001
+
+
+class Migration:
+    """
+    Uma versão do esquema.
+
+    `sqlite` e `postgres` são listas de comandos SQL; `apply` é uma função opcional
+    (cursor) -> None para passos que dependem do estado atual do banco.
+    """
+
+    def __init__(self, version, description, sqlite=(), postgres=(), apply=None):
+        self.version = version
+        self.description = description
+        self.scripts = {'sqlite': list(sqlite), 'postgres': list(postgres)}
+        self.apply = apply
+
+    def run(self, cursor):
+        for sql in self.scripts[DIALECT]:
+            cursor.execute(sql)
+        if self.apply is not None:
+            self.apply(cursor)
+
+
+# ==========================================
+# Helpers de introspecção
+# ==========================================
+
+def _execute(cursor, query, params=None):
+    if params:
+        cursor.execute(convert_query(query), params)
+    else:
+        cursor.execute(convert_query(query))
+    return cursor
+
+
+def table_columns(cursor, table):
+    """Retorna {coluna: tipo} da tabela (vazio se ela não existir)"""
+    if USE_POSTGRES:
+        rows = _execute(cursor, '''
+            SELECT column_name, data_type FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = ?
+        ''', (table,)).fetchall()
+        return {row[0]: row[1] for row in rows}
+    rows = _execute(cursor, f'PRAGMA table_info({table})').fetchall()
+    return {row[1]: (row[2] or '').lower() for row in rows}
+
+
+def _add_column(cursor, table, column, definition):
+    """ALTER TABLE ... ADD COLUMN se a coluna ainda não existir"""
+    if column not in table_columns(cursor, table):
+        _execute(cursor, f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+        return True
+    return False
+
+
+def _copy_legacy_column(cursor, table, legacy, column):
+    """Preenche a coluna nova com os dados da coluna antiga equivalente"""
+    if legacy in table_columns(cursor, table):
+        _execute(cursor, f'UPDATE {table} SET {column} = {legacy} WHERE {column} IS NULL')
+
+
+def _boolean_to_integer(cursor, table, column, default):
+    """No PostgreSQL, converte BOOLEAN para INTEGER (o app compara com 0/1)"""
+    if table_columns(cursor, table).get(column) == 'boolean':
+        _execute(cursor, f'''
+            ALTER TABLE {table}
+                ALTER COLUMN {column} DROP DEFAULT,
+                ALTER COLUMN {column} TYPE INTEGER USING {column}::integer,
+                ALTER COLUMN {column} SET DEFAULT {default}
+        ''')
+
+
+# ==========================================
+# 0001 - Esquema base (o mesmo usado por app.py e pelos blueprints)
+# ==========================================
+
+SCHEMA_SQLITE = [
+    '''
+    CREATE TABLE IF NOT EXISTS funcoes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nome TEXT NOT NULL UNIQUE,
+        nivel_acesso INTEGER NOT NULL DEFAULT 1,
+        descricao TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        email TEXT,
+        password_hash TEXT NOT NULL,
+        role TEXT NOT NULL DEFAULT 'user',
+        funcao_id INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        is_active INTEGER DEFAULT 1,
+        FOREIGN KEY (funcao_id) REFERENCES funcoes (id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS chamados (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        titulo TEXT NOT NULL,
+        descricao TEXT NOT NULL,
+        prioridade TEXT NOT NULL DEFAULT 'media',
+        status TEXT NOT NULL DEFAULT 'aberto',
+        categoria TEXT NOT NULL,
+        criado_por INTEGER NOT NULL,
+        atribuido_para INTEGER,
+        data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        data_resolucao TIMESTAMP,
+        solucao TEXT,
+        FOREIGN KEY (criado_por) REFERENCES users (id),
+        FOREIGN KEY (atribuido_para) REFERENCES users (id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS chat_mensagens (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        username TEXT NOT NULL,
+        mensagem TEXT NOT NULL,
+        data_envio TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        lida INTEGER DEFAULT 0,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS user_permissions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        permission_key TEXT NOT NULL,
+        enabled INTEGER DEFAULT 1,
+        UNIQUE(user_id, permission_key),
+        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS servidores (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nome TEXT NOT NULL UNIQUE,
+        descricao TEXT,
+        ip_endereco TEXT,
+        sistema_operacional TEXT,
+        observacoes TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS armazenamentos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        servidor_id INTEGER NOT NULL,
+        nome TEXT NOT NULL,
+        tipo TEXT NOT NULL,
+        capacidade_valor REAL NOT NULL,
+        capacidade_unidade TEXT NOT NULL,
+        usado_valor REAL NOT NULL,
+        usado_unidade TEXT NOT NULL,
+        observacoes TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (servidor_id) REFERENCES servidores (id) ON DELETE CASCADE
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS role_names (
+        role_key TEXT PRIMARY KEY,
+        label TEXT NOT NULL
+    )
+    ''',
+]
+
+SCHEMA_POSTGRES = [
+    '''
+    CREATE TABLE IF NOT EXISTS funcoes (
+        id SERIAL PRIMARY KEY,
+        nome VARCHAR(100) UNIQUE NOT NULL,
+        nivel_acesso INTEGER NOT NULL DEFAULT 1,
+        descricao TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        id SERIAL PRIMARY KEY,
+        username VARCHAR(100) UNIQUE NOT NULL,
+        email VARCHAR(150),
+        password_hash VARCHAR(255) NOT NULL,
+        role VARCHAR(20) NOT NULL DEFAULT 'user',
+        funcao_id INTEGER REFERENCES funcoes(id),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        is_active INTEGER DEFAULT 1
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS chamados (
+        id SERIAL PRIMARY KEY,
+        titulo VARCHAR(200) NOT NULL,
+        descricao TEXT NOT NULL,
+        prioridade VARCHAR(20) NOT NULL DEFAULT 'media',
+        status VARCHAR(20) NOT NULL DEFAULT 'aberto',
+        categoria VARCHAR(50) NOT NULL,
+        criado_por INTEGER NOT NULL REFERENCES users(id),
+        atribuido_para INTEGER REFERENCES users(id),
+        data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        data_resolucao TIMESTAMP,
+        solucao TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS chat_mensagens (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users(id),
+        username VARCHAR(100) NOT NULL,
+        mensagem TEXT NOT NULL,
+        data_envio TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        lida INTEGER DEFAULT 0
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS user_permissions (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        permission_key VARCHAR(100) NOT NULL,
+        enabled INTEGER DEFAULT 1,
+        UNIQUE(user_id, permission_key)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS servidores (
+        id SERIAL PRIMARY KEY,
+        nome VARCHAR(100) UNIQUE NOT NULL,
+        descricao TEXT,
+        ip_endereco VARCHAR(50),
+        sistema_operacional VARCHAR(100),
+        observacoes TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS armazenamentos (
+        id SERIAL PRIMARY KEY,
+        servidor_id INTEGER NOT NULL REFERENCES servidores(id) ON DELETE CASCADE,
+        nome VARCHAR(100) NOT NULL,
+        tipo VARCHAR(20) NOT NULL,
+        capacidade_valor DOUBLE PRECISION NOT NULL,
+        capacidade_unidade VARCHAR(10) NOT NULL,
+        usado_valor DOUBLE PRECISION NOT NULL,
+        usado_unidade VARCHAR(10) NOT NULL,
+        observacoes TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS role_names (
+        role_key VARCHAR(50) PRIMARY KEY,
+        label VARCHAR(100) NOT NULL
+    )
+    ''',
+]
+
+
+# ==========================================
+# 0002 - Unificar bancos criados pelo init_db antigo
+# ==========================================
+
+def _rebuild_sqlite_chamados(cursor):
+    """SQLite não aceita ADD COLUMN com DEFAULT CURRENT_TIMESTAMP: recria a tabela"""
+    legacy = table_columns(cursor, 'chamados')
+    cursor.execute(SCHEMA_SQLITE[2].replace('chamados (', 'chamados_unificado (', 1))
+    cursor.execute(f'''
+        INSERT INTO chamados_unificado
+            (id, titulo, descricao, prioridade, status, categoria, criado_por,
+             atribuido_para, data_criacao, data_atualizacao)
+        SELECT id, titulo, COALESCE(descricao, ''), COALESCE(prioridade, 'media'),
+               COALESCE(status, 'aberto'), 'outros', {'usuario_id' if 'usuario_id' in legacy else 'NULL'},
+               {'atribuido_id' if 'atribuido_id' in legacy else 'NULL'},
+               {'created_at' if 'created_at' in legacy else 'CURRENT_TIMESTAMP'},
+               {'updated_at' if 'updated_at' in legacy else 'CURRENT_TIMESTAMP'}
+        FROM chamados
+    ''')
+    cursor.execute('DROP TABLE chamados')
+    cursor.execute('ALTER TABLE chamados_unificado RENAME TO chamados')
+
+
+def _unify_columns(cursor):
+    timestamp = 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP' if USE_POSTGRES else 'TIMESTAMP'
+
+    # chamados: usuario_id/atribuido_id/created_at/updated_at -> nomes usados pelo app
+    if 'criado_por' not in table_columns(cursor, 'chamados'):
+        if USE_POSTGRES:
+            _add_column(cursor, 'chamados', 'criado_por', 'INTEGER REFERENCES users(id)')
+            _add_column(cursor, 'chamados', 'atribuido_para', 'INTEGER REFERENCES users(id)')
+            _add_column(cursor, 'chamados', 'categoria', "VARCHAR(50) DEFAULT 'outros'")
+            _add_column(cursor, 'chamados', 'data_criacao', timestamp)
+            _add_column(cursor, 'chamados', 'data_atualizacao', timestamp)
+            _copy_legacy_column(cursor, 'chamados', 'usuario_id', 'criado_por')
+            _copy_legacy_column(cursor, 'chamados', 'atribuido_id', 'atribuido_para')
+            _copy_legacy_column(cursor, 'chamados', 'created_at', 'data_criacao')
+            _copy_legacy_column(cursor, 'chamados', 'updated_at', 'data_atualizacao')
+        else:
+            _rebuild_sqlite_chamados(cursor)
+    _add_column(cursor, 'chamados', 'data_resolucao', 'TIMESTAMP')
+    _add_column(cursor, 'chamados', 'solucao', 'TEXT')
+
+    # users
+    _add_column(cursor, 'users', 'is_active', 'INTEGER DEFAULT 1')
+    _add_column(cursor, 'users', 'funcao_id', 'INTEGER')
+    _add_column(cursor, 'users', 'email', 'TEXT')
+
+    # funcoes
+    _add_column(cursor, 'funcoes', 'nivel_acesso', 'INTEGER NOT NULL DEFAULT 1')
+    _add_column(cursor, 'funcoes', 'updated_at', timestamp)
+
+    # servidores / armazenamentos
+    if _add_column(cursor, 'servidores', 'ip_endereco', 'TEXT'):
+        _copy_legacy_column(cursor, 'servidores', 'ip_address', 'ip_endereco')
+    _add_column(cursor, 'servidores', 'sistema_operacional', 'TEXT')
+    _add_column(cursor, 'servidores', 'observacoes', 'TEXT')
+    _add_column(cursor, 'servidores', 'updated_at', timestamp)
+    _add_column(cursor, 'armazenamentos', 'servidor_id', 'INTEGER REFERENCES servidores(id)')
+    _add_column(cursor, 'armazenamentos', 'capacidade_valor', 'REAL')
+    _add_column(cursor, 'armazenamentos', 'capacidade_unidade', "TEXT DEFAULT 'GB'")
+    _add_column(cursor, 'armazenamentos', 'usado_valor', 'REAL')
+    _add_column(cursor, 'armazenamentos', 'usado_unidade', "TEXT DEFAULT 'GB'")
+    _add_column(cursor, 'armazenamentos', 'observacoes', 'TEXT')
+    _add_column(cursor, 'armazenamentos', 'updated_at', timestamp)
+
+    # role_names: o app lê `label`; o init_db antigo criava `display_name NOT NULL`
+    if _add_column(cursor, 'role_names', 'label', 'TEXT'):
+        _copy_legacy_column(cursor, 'role_names', 'display_name', 'label')
+    if USE_POSTGRES and 'display_name' in table_columns(cursor, 'role_names'):
+        cursor.execute('ALTER TABLE role_names ALTER COLUMN display_name DROP NOT NULL')
+
+    if USE_POSTGRES:
+        _boolean_to_integer(cursor, 'users', 'is_active', 1)
+        _boolean_to_integer(cursor, 'user_permissions', 'enabled', 1)
+        _boolean_to_integer(cursor, 'chat_mensagens', 'lida', 0)
+
+    # Rótulos padrão das roles
+    columns = table_columns(cursor, 'role_names')
+    defaults = {
+        'admin': 'Administrador',
+        'diretor': 'Diretor',
+        'supervisor': 'Supervisor',
+        'tech': 'Técnico',
+        'administrativo': 'Administrativo',
+        'user': 'Usuário',
+    }
+    for role_key, label in defaults.items():
+        if 'display_name' in columns:
+            _execute(cursor, '''
+                INSERT INTO role_names (role_key, label, display_name)
+                SELECT ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM role_names WHERE role_key = ?)
+            ''', (role_key, label, label, role_key))
+        else:
+            _execute(cursor, '''
+                INSERT INTO role_names (role_key, label)
+                SELECT ?, ? WHERE NOT EXISTS (SELECT 1 FROM role_names WHERE role_key = ?)
+            ''', (role_key, label, role_key))
+
+
+# ==========================================
+# 0003 - Índices das consultas quentes
+# ==========================================
+
+HOT_QUERY_INDEXES = [
+    # /chamados e dashboard: ORDER BY data_criacao DESC com filtros opcionais
+    'CREATE INDEX IF NOT EXISTS idx_chamados_data_criacao ON chamados (data_criacao, id)',
+    'CREATE INDEX IF NOT EXISTS idx_chamados_criado_por_data ON chamados (criado_por, data_criacao)',
+    'CREATE INDEX IF NOT EXISTS idx_chamados_status_data ON chamados (status, data_criacao)',
+    'CREATE INDEX IF NOT EXISTS idx_chamados_prioridade_data ON chamados (prioridade, data_criacao)',
+    'CREATE INDEX IF NOT EXISTS idx_chamados_categoria_data ON chamados (categoria, data_criacao)',
+    'CREATE INDEX IF NOT EXISTS idx_chamados_atribuido_para ON chamados (atribuido_para)',
+    # Chat: últimas 100 mensagens
+    'CREATE INDEX IF NOT EXISTS idx_chat_mensagens_data_envio ON chat_mensagens (data_envio)',
+    # has_permission / get_user_permissions (índice cobre o filtro por enabled)
+    'CREATE INDEX IF NOT EXISTS idx_user_permissions_lookup ON user_permissions (user_id, permission_key, enabled)',
+    # Armazenamentos de cada servidor
+    'CREATE INDEX IF NOT EXISTS idx_armazenamentos_servidor ON armazenamentos (servidor_id, nome)',
+    'CREATE INDEX IF NOT EXISTS idx_users_funcao ON users (funcao_id)',
+]
+
+
+# ==========================================
+# 0004 - Máscara de permissões materializada (services/permissoes.py)
+# ==========================================
+
+def _add_permission_mask(cursor):
+    # NULL = ainda não calculada; rebuild_permission_masks() preenche
+    _add_column(cursor, 'users', 'permission_mask', 'INTEGER')
+
+
+# ==========================================
+# 0005 - Versão das claims de sessão (services/sessao.py)
+# ==========================================
+
+def _add_auth_version(cursor):
+    _add_column(cursor, 'users', 'auth_version', 'INTEGER NOT NULL DEFAULT 1')
+
+
+# ==========================================
+# 0006 - Busca textual nos chamados (services/busca.py)
+# ==========================================
+
+FTS_SQLITE = [
+    # External content: o índice guarda só os tokens, o texto continua em chamados
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS chamados_fts USING fts5(
+        titulo, descricao, solucao,
+        content='chamados', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS chamados_fts_ai AFTER INSERT ON chamados BEGIN
+        INSERT INTO chamados_fts (rowid, titulo, descricao, solucao)
+        VALUES (new.id, new.titulo, new.descricao, new.solucao);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS chamados_fts_ad AFTER DELETE ON chamados BEGIN
+        INSERT INTO chamados_fts (chamados_fts, rowid, titulo, descricao, solucao)
+        VALUES ('delete', old.id, old.titulo, old.descricao, old.solucao);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS chamados_fts_au AFTER UPDATE OF titulo, descricao, solucao ON chamados BEGIN
+        INSERT INTO chamados_fts (chamados_fts, rowid, titulo, descricao, solucao)
+        VALUES ('delete', old.id, old.titulo, old.descricao, old.solucao);
+        INSERT INTO chamados_fts (rowid, titulo, descricao, solucao)
+        VALUES (new.id, new.titulo, new.descricao, new.solucao);
+    END
+    ''',
+    "INSERT INTO chamados_fts (chamados_fts) VALUES ('rebuild')",
+]
+
+
+# Remoção de acentos sem depender da extensão unaccent (a consulta é normalizada igual
+# em services/busca.py antes de chegar ao to_tsquery)
+ACCENTED = 'áàâãäéèêëíìîïóòôõöúùûüç'
+UNACCENTED = 'aaaaaeeeeiiiiooooouuuuc'
+
+
+def _add_full_text_search(cursor):
+    if not USE_POSTGRES:
+        return  # SQLite: FTS_SQLITE
+
+    cursor.execute("SELECT 1 FROM pg_ts_config WHERE cfgname = 'chamados_pt'")
+    if cursor.fetchone() is None:
+        cursor.execute('CREATE TEXT SEARCH CONFIGURATION chamados_pt (COPY = portuguese)')
+    cursor.execute(f'''
+        CREATE OR REPLACE FUNCTION chamados_busca_texto(texto TEXT) RETURNS TEXT AS $$
+            SELECT translate(lower(coalesce(texto, '')), '{ACCENTED}', '{UNACCENTED}')
+        $$ LANGUAGE sql IMMUTABLE
+    ''')
+    _add_column(cursor, 'chamados', 'busca', 'TSVECTOR')
+    cursor.execute('''
+        CREATE OR REPLACE FUNCTION chamados_busca_atualizar() RETURNS trigger AS $$
+        BEGIN
+            NEW.busca :=
+                setweight(to_tsvector('chamados_pt', chamados_busca_texto(NEW.titulo)), 'A') ||
+                setweight(to_tsvector('chamados_pt', chamados_busca_texto(NEW.descricao)), 'B') ||
+                setweight(to_tsvector('chamados_pt', chamados_busca_texto(NEW.solucao)), 'C');
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    ''')
+    cursor.execute('DROP TRIGGER IF EXISTS chamados_busca_trigger ON chamados')
+    cursor.execute('''
+        CREATE TRIGGER chamados_busca_trigger
+            BEFORE INSERT OR UPDATE OF titulo, descricao, solucao ON chamados
+            FOR EACH ROW EXECUTE FUNCTION chamados_busca_atualizar()
+    ''')
+    # Preenche as linhas existentes pelo próprio trigger
+    cursor.execute('UPDATE chamados SET titulo = titulo')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_chamados_busca ON chamados USING GIN (busca)')
+
+
+# ==========================================
+# 0007 - Contadores de chamados (services/contadores.py)
+# ==========================================
+
+COUNTERS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS chamado_contadores (
+        user_id INTEGER NOT NULL,
+        dimensao TEXT NOT NULL,
+        valor TEXT NOT NULL,
+        total INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, dimensao, valor)
+    )
+'''
+
+# Carga inicial: total geral (user_id = 0) e por criador, no total e por dimensão
+COUNTERS_SEED = ['''
+    INSERT INTO chamado_contadores (user_id, dimensao, valor, total)
+    SELECT 0, 'total', '', COUNT(*) FROM chamados
+''', '''
+    INSERT INTO chamado_contadores (user_id, dimensao, valor, total)
+    SELECT criado_por, 'total', '', COUNT(*) FROM chamados
+    WHERE criado_por IS NOT NULL GROUP BY criado_por
+'''] + [f'''
+    INSERT INTO chamado_contadores (user_id, dimensao, valor, total)
+    SELECT 0, '{dimensao}', COALESCE({dimensao}, ''), COUNT(*) FROM chamados
+    GROUP BY COALESCE({dimensao}, '')
+''' for dimensao in ('status', 'prioridade', 'categoria')] + [f'''
+    INSERT INTO chamado_contadores (user_id, dimensao, valor, total)
+    SELECT criado_por, '{dimensao}', COALESCE({dimensao}, ''), COUNT(*) FROM chamados
+    WHERE criado_por IS NOT NULL GROUP BY criado_por, COALESCE({dimensao}, '')
+''' for dimensao in ('status', 'prioridade', 'categoria')]
+
+
+# ==========================================
+# 0008 - Datas em formato canônico (UTC, ver timeutils.py)
+# ==========================================
+
+TIMESTAMP_COLUMNS = {
+    'chamados': ('data_criacao', 'data_atualizacao', 'data_resolucao'),
+    'chat_mensagens': ('data_envio',),
+    'users': ('created_at',),
+    'funcoes': ('created_at', 'updated_at'),
+    'servidores': ('created_at', 'updated_at'),
+    'armazenamentos': ('created_at', 'updated_at'),
+}
+
+CANONICAL_GLOB = '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9] [0-9][0-9]:[0-9][0-9]:[0-9][0-9]'
+
+
+def _canonical_timestamps(cursor):
+    for table, columns in TIMESTAMP_COLUMNS.items():
+        existing = table_columns(cursor, table)
+        for column in columns:
+            if column not in existing:
+                continue
+            if USE_POSTGRES:
+                _timestamp_column_postgres(cursor, table, column, existing[column])
+            else:
+                _canonical_text_sqlite(cursor, table, column)
+
+
+def _timestamp_column_postgres(cursor, table, column, data_type):
+    # O esquema já usa TIMESTAMP; bancos antigos podem ter texto ou timestamptz
+    if data_type in ('text', 'character varying'):
+        _execute(cursor, f'''
+            ALTER TABLE {table} ALTER COLUMN {column} TYPE TIMESTAMP
+            USING NULLIF({column}, '')::timestamptz AT TIME ZONE 'UTC'
+        ''')
+    elif data_type == 'timestamp with time zone':
+        _execute(cursor, f'''
+            ALTER TABLE {table} ALTER COLUMN {column} TYPE TIMESTAMP
+            USING {column} AT TIME ZONE 'UTC'
+        ''')
+
+
+def _canonical_text_sqlite(cursor, table, column):
+    # Só as linhas fora do formato 'YYYY-MM-DD HH:MM:SS' (frações, 'T', fuso, dd/mm/aaaa...)
+    rows = _execute(cursor, f'''
+        SELECT id, CAST({column} AS TEXT) FROM {table}
+        WHERE {column} IS NOT NULL AND {column} NOT GLOB '{CANONICAL_GLOB}'
+    ''').fetchall()
+    skipped = 0
+    for row_id, value in rows:
+        parsed = timeutils.parse_datetime(value)
+        if parsed is None:
+            skipped += 1
+            continue
+        _execute(cursor, f'UPDATE {table} SET {column} = ? WHERE id = ?',
+                 (parsed.strftime(timeutils.DB_FORMAT), row_id))
+    if skipped:
+        print(f"⚠️ {table}.{column}: {skipped} data(s) não reconhecida(s) mantida(s) como estavam")
+
+
+
+# ==========================================
+# 0009 - Versão dos chamados (concorrência otimista, ver app.atualizar_chamado)
+# ==========================================
+
+def _add_chamado_version(cursor):
+    _add_column(cursor, 'chamados', 'versao', 'INTEGER NOT NULL DEFAULT 1')
+
+
+# ==========================================
+# 0010 - Histórico de eventos dos chamados (services/eventos.py)
+# ==========================================
+
+EVENTS_SQLITE = [
+    '''
+    CREATE TABLE IF NOT EXISTS chamado_eventos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chamado_id INTEGER NOT NULL,
+        user_id INTEGER,
+        acao TEXT NOT NULL,
+        campo TEXT NOT NULL,
+        valor_anterior TEXT,
+        valor_novo TEXT,
+        versao INTEGER NOT NULL,
+        criado_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    # Somente inserção: o histórico não pode ser reescrito
+    '''
+    CREATE TRIGGER IF NOT EXISTS chamado_eventos_sem_update BEFORE UPDATE ON chamado_eventos
+    BEGIN SELECT RAISE(ABORT, 'chamado_eventos é somente inserção'); END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS chamado_eventos_sem_delete BEFORE DELETE ON chamado_eventos
+    BEGIN SELECT RAISE(ABORT, 'chamado_eventos é somente inserção'); END
+    ''',
+]
+
+EVENTS_POSTGRES = [
+    '''
+    CREATE TABLE IF NOT EXISTS chamado_eventos (
+        id BIGSERIAL PRIMARY KEY,
+        chamado_id INTEGER NOT NULL,
+        user_id INTEGER,
+        acao VARCHAR(20) NOT NULL,
+        campo VARCHAR(30) NOT NULL,
+        valor_anterior TEXT,
+        valor_novo TEXT,
+        versao INTEGER NOT NULL,
+        criado_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE OR REPLACE FUNCTION chamado_eventos_somente_insercao() RETURNS trigger AS $$
+    BEGIN
+        RAISE EXCEPTION 'chamado_eventos é somente inserção';
+    END
+    $$ LANGUAGE plpgsql
+    ''',
+    'DROP TRIGGER IF EXISTS chamado_eventos_somente_insercao ON chamado_eventos',
+    '''
+    CREATE TRIGGER chamado_eventos_somente_insercao BEFORE UPDATE OR DELETE ON chamado_eventos
+        FOR EACH ROW EXECUTE FUNCTION chamado_eventos_somente_insercao()
+    ''',
+]
+
+# Sem chave estrangeira para chamados: o histórico sobrevive à exclusão do chamado.
+# Índices: linha do tempo de um chamado e varreduras por campo e período (relatórios).
+# versao é a do chamado depois da mudança (agrupa as linhas de uma mesma edição).
+# A carga inicial registra o status atual de cada chamado como 'importado'.
+EVENTS_COMMON = [
+    'CREATE INDEX IF NOT EXISTS idx_eventos_chamado ON chamado_eventos (chamado_id, id)',
+    'CREATE INDEX IF NOT EXISTS idx_eventos_campo_data ON chamado_eventos (campo, criado_em)',
+    '''
+    INSERT INTO chamado_eventos (chamado_id, user_id, acao, campo, valor_novo, versao, criado_em)
+    SELECT id, NULL, 'importado', 'status', status, versao, COALESCE(data_atualizacao, data_criacao, CURRENT_TIMESTAMP)
+    FROM chamados ORDER BY id
+    ''',
+]
+
+
+# ==========================================
+# 0011 - Prazos de SLA dos chamados (services/sla.py)
+# ==========================================
+
+def _add_sla(cursor):
+    # Prazos NULL são preenchidos pelo agendador ao subir (as metas vêm do ambiente)
+    _add_column(cursor, 'chamados', 'sla_resposta_em', 'TIMESTAMP')
+    _add_column(cursor, 'chamados', 'sla_resolucao_em', 'TIMESTAMP')
+    _add_column(cursor, 'chamados', 'sla_estado', "VARCHAR(20) NOT NULL DEFAULT 'no_prazo'")
+    _execute(cursor, "UPDATE chamados SET sla_estado = 'cumprido' WHERE status IN ('resolvido', 'fechado')")
+    # Filtro de /chamados (na ordem da listagem) e carga do agendador
+    _execute(cursor, 'CREATE INDEX IF NOT EXISTS idx_chamados_sla_data ON chamados (sla_estado, data_criacao, id)')
+    # Nova dimensão dos contadores (services/contadores.py)
+    _execute(cursor, '''
+        INSERT INTO chamado_contadores (user_id, dimensao, valor, total)
+        SELECT 0, 'sla_estado', sla_estado, COUNT(*) FROM chamados GROUP BY sla_estado
+    ''')
+    _execute(cursor, '''
+        INSERT INTO chamado_contadores (user_id, dimensao, valor, total)
+        SELECT criado_por, 'sla_estado', sla_estado, COUNT(*) FROM chamados
+        WHERE criado_por IS NOT NULL GROUP BY criado_por, sla_estado
+    ''')
+
+
+# ==========================================
+# 0012 - Máscaras recalculadas só com permissões granulares
+# ==========================================
+
+# Máscaras antigas aceitavam área/perfil vindos de user_permissions: NULL faz o app
+# recalcular (ver services/permissoes._load_mask) e o auth_version recarrega as sessões
+RESET_PERMISSION_MASKS = [
+    'UPDATE users SET permission_mask = NULL, auth_version = auth_version + 1',
+]
+
+MIGRATIONS = [
+    Migration(1, 'Esquema base', sqlite=SCHEMA_SQLITE, postgres=SCHEMA_POSTGRES),
+    Migration(2, 'Unificar colunas com as usadas pelo app', apply=_unify_columns),
+    Migration(3, 'Índices das consultas quentes', sqlite=HOT_QUERY_INDEXES, postgres=HOT_QUERY_INDEXES),
+    Migration(4, 'Máscara de permissões dos usuários', apply=_add_permission_mask),
+    Migration(5, 'Versão das claims de sessão', apply=_add_auth_version),
+    Migration(6, 'Busca textual nos chamados', sqlite=FTS_SQLITE, apply=_add_full_text_search),
+    Migration(7, 'Contadores de chamados', sqlite=[COUNTERS_TABLE] + COUNTERS_SEED,
+              postgres=[COUNTERS_TABLE] + COUNTERS_SEED),
+    Migration(8, 'Datas em formato canônico (UTC)', apply=_canonical_timestamps),
+    Migration(9, 'Versão dos chamados', apply=_add_chamado_version),
+    Migration(10, 'Histórico de eventos dos chamados',
+              sqlite=EVENTS_SQLITE + EVENTS_COMMON, postgres=EVENTS_POSTGRES + EVENTS_COMMON),
+    Migration(11, 'Prazos de SLA dos chamados', apply=_add_sla),
+    Migration(12, 'Recalcular máscaras de permissões', sqlite=RESET_PERMISSION_MASKS,
+              postgres=RESET_PERMISSION_MASKS),
+]
+
+CURRENT_VERSION = MIGRATIONS[-1].version
+
+
+# ==========================================
+# Runner
+# ==========================================
+
+def _ensure_version_table(conn):
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            descricao TEXT,
+            aplicado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+
+
+def schema_version(conn):
+    """Versão atual do esquema (0 se nenhuma migração foi aplicada)"""
+    cursor = conn.cursor()
+    cursor.execute('SELECT MAX(version) FROM schema_version')
+    row = cursor.fetchone()
+    return (row[0] if row else None) or 0
+
+
+def run_migrations(conn):
+    """Aplica, em ordem, as migrações pendentes; cada uma na sua própria transação"""
+    _ensure_version_table(conn)
+    applied = []
+    for migration in MIGRATIONS:
+        cursor = conn.cursor()
+        # Lock antes de reler a versão: outro worker pode ter migrado enquanto isso
+        if USE_POSTGRES:
+            cursor.execute(f'SELECT pg_advisory_xact_lock({MIGRATION_LOCK_KEY})')
+        else:
+            cursor.execute('BEGIN IMMEDIATE')
+        if schema_version(conn) >= migration.version:
+            conn.rollback()
+            continue
+        try:
+            migration.run(cursor)
+            _execute(cursor, 'INSERT INTO schema_version (version, descricao) VALUES (?, ?)',
+                     (migration.version, migration.description))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"🧱 Migração {migration.version:04d} aplicada: {migration.description}")
+        applied.append(migration.version)
+    return applied
@@ -1,5 +1,13 @@
-from .user import User, db
-from .chamado import Chamado
-
+# Os modelos SQLAlchemy só são importados quando usados: o app acessa o banco via
+# database.py, e carregar flask_sqlalchemy em todo worker custa ~350 ms de cold start.
 __all__ = ['User', 'Chamado', 'db']
 
+
+def __getattr__(name):
+    if name in ('User', 'db'):
+        from . import user
+        return getattr(user, name)
+    if name == 'Chamado':
+        from .chamado import Chamado
+        return Chamado
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
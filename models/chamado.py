@@ -1,9 +1,11 @@
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime, timedelta
+from datetime import datetime
+
+from .chamado_view import ChamadoMixin
 
 db = SQLAlchemy()
 
-class Chamado(db.Model):
+class Chamado(ChamadoMixin, db.Model):
     __tablename__ = 'chamados'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -18,64 +20,10 @@ class Chamado(db.Model):
     data_atualizacao = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     data_resolucao = db.Column(db.DateTime, nullable=True)
     solucao = db.Column(db.Text, nullable=True)
+    versao = db.Column(db.Integer, nullable=False, default=1)  # concorrência otimista (migração 0009)
+    sla_resposta_em = db.Column(db.DateTime, nullable=True)
+    sla_resolucao_em = db.Column(db.DateTime, nullable=True)
+    sla_estado = db.Column(db.String(20), nullable=False, default='no_prazo')  # no_prazo, em_risco, violado, cumprido
     
     def __repr__(self):
         return f'<Chamado {self.id}: {self.titulo}>'
-    
-    @property
-    def tempo_aberto(self):
-        """Return a timedelta representing how long the ticket was open.
-
-        Be tolerant: data_criacao and data_resolucao may be datetime objects or
-        strings (coming from sqlite rows). Parse strings when necessary to
-        avoid TypeError when subtracting.
-        """
-        def _to_dt(value):
-            if value is None:
-                return None
-            if isinstance(value, datetime):
-                return value
-            if isinstance(value, str):
-                # Try common formats
-                for fmt in ("%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
-                    try:
-                        return datetime.strptime(value, fmt)
-                    except ValueError:
-                        continue
-                try:
-                    return datetime.fromisoformat(value)
-                except Exception:
-                    return None
-            return None
-
-        start = _to_dt(self.data_criacao)
-        end = _to_dt(self.data_resolucao)
-
-        if start is None:
-            # Unknown start: return zero timedelta to be safe
-            return timedelta(0)
-
-        if end:
-            return end - start
-        return datetime.utcnow() - start
-    
-    @property
-    def prioridade_class(self):
-        classes = {
-            'baixa': 'success',
-            'media': 'warning', 
-            'alta': 'danger',
-            'critica': 'dark'
-        }
-        return classes.get(self.prioridade, 'secondary')
-    
-    @property
-    def status_class(self):
-        classes = {
-            'aberto': 'primary',
-            'em_andamento': 'warning',
-            'resolvido': 'success',
-            'fechado': 'secondary'
-        }
-        return classes.get(self.status, 'secondary')
-
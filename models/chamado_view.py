@@ -0,0 +1,100 @@
+"""
+View model dos chamados lidos via database.py (listas, dashboard e detalhes)
+
+ChamadoView embrulha a linha do banco sem copiar as colunas: os atributos são lidos
+direto da Row. As propriedades de exibição (classes CSS, tempo_aberto) ficam em
+ChamadoMixin, compartilhado com o modelo SQLAlchemy models.chamado.Chamado. Este módulo
+não importa flask_sqlalchemy (ver models/__init__.py).
+"""
+from datetime import timedelta
+
+from timeutils import parse_datetime, utcnow
+
+PRIORIDADE_CLASSES = {
+    'baixa': 'success',
+    'media': 'warning',
+    'alta': 'danger',
+    'critica': 'dark',
+}
+
+STATUS_CLASSES = {
+    'aberto': 'primary',
+    'em_andamento': 'warning',
+    'resolvido': 'success',
+    'fechado': 'secondary',
+}
+
+SLA_CLASSES = {
+    'no_prazo': 'success',
+    'em_risco': 'warning',
+    'violado': 'danger',
+    'cumprido': 'secondary',
+}
+
+
+class ChamadoMixin:
+    """Propriedades de exibição comuns a Chamado e ChamadoView"""
+    __slots__ = ()
+
+    @property
+    def prioridade_class(self):
+        return PRIORIDADE_CLASSES.get(self.prioridade, 'secondary')
+
+    @property
+    def status_class(self):
+        return STATUS_CLASSES.get(self.status, 'secondary')
+
+    @property
+    def sla_class(self):
+        return SLA_CLASSES.get(self.sla_estado, 'secondary')
+
+    def _timestamps(self):
+        return parse_datetime(self.data_criacao), parse_datetime(self.data_resolucao)
+
+    @property
+    def tempo_aberto(self):
+        """Tempo em aberto: até a resolução, ou até agora se ainda não foi resolvido"""
+        start, end = self._timestamps()
+        if start is None:
+            return timedelta(0)
+        if end:
+            return end - start
+        return utcnow() - start
+
+
+class UsuarioResumo:
+    """Criador/técnico do chamado como os templates esperam (chamado.criador.username)"""
+    __slots__ = ('username',)
+
+    def __init__(self, username):
+        self.username = username
+
+
+class ChamadoView(ChamadoMixin):
+    """Chamado de uma linha do banco (SELECT c.*, criador_nome, tecnico_nome)"""
+    __slots__ = ('_row', '_datas', 'criador', 'tecnico')
+
+    def __init__(self, row):
+        self._row = row
+        self._datas = None
+        self.criador = UsuarioResumo(row['criador_nome'] if 'criador_nome' in row else '')
+        tecnico = row['tecnico_nome'] if 'tecnico_nome' in row else None
+        self.tecnico = UsuarioResumo(tecnico) if tecnico else None
+
+    def __getattr__(self, name):
+        # Só chamado para o que não é slot: as colunas da linha
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self._row[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def _timestamps(self):
+        # No SQLite as colunas TIMESTAMP já chegam como datetime (conversor em database.py)
+        if self._datas is None:
+            self._datas = ChamadoMixin._timestamps(self)
+        return self._datas
+
+    def __repr__(self):
+        return f'<ChamadoView {self.id}: {self.titulo}>'
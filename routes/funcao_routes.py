@@ -1,16 +1,12 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
-import sqlite3
 from functools import wraps
 from models.funcao import Funcao
-import datetime
+from database import get_db
+from services.permissoes import current_user_can, refresh_permission_mask
+from services.sessao import bump_auth_version
 
 funcao_bp = Blueprint('funcao', __name__, url_prefix='/funcoes')
 
-def get_db_connection():
-    conn = sqlite3.connect('chamados_ti.db')
-    conn.row_factory = sqlite3.Row
-    return conn
-
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -27,12 +23,8 @@ def admin_required(f):
             flash('Por favor, faça login para acessar esta página.', 'warning')
             return redirect(url_for('login'))
         
-        conn = get_db_connection()
-        user = conn.execute('SELECT * FROM users WHERE id = ?', (session['user_id'],)).fetchone()
-        conn.close()
-        
-        # Verificar se o usuário é administrador ou tem função de Diretor
-        if not (user['role'] == 'admin' or user['funcao_id'] == 1):  # 1 = Diretor (nível mais alto)
+        # Administrador ou função de nível máximo (bit area_funcoes da máscara)
+        if not current_user_can('area_funcoes'):
             flash('Você não tem permissão para acessar esta página.', 'danger')
             return redirect(url_for('dashboard'))
             
@@ -44,7 +36,7 @@ def admin_required(f):
 @admin_required
 def listar_funcoes():
     """Lista todas as funções cadastradas."""
-    conn = get_db_connection()
+    conn = get_db()
     funcoes_rows = conn.execute('SELECT * FROM funcoes ORDER BY nivel_acesso DESC').fetchall()
     conn.close()
     
@@ -70,7 +62,7 @@ def adicionar_funcao():
             flash('O nível de acesso deve ser um número entre 1 e 5.', 'danger')
             return redirect(url_for('funcao.adicionar_funcao'))
         
-        conn = get_db_connection()
+        conn = get_db()
         
         # Verificar se já existe uma função com o mesmo nome
         funcao_existente = conn.execute('SELECT * FROM funcoes WHERE nome = ?', (nome,)).fetchone()
@@ -97,7 +89,7 @@ def adicionar_funcao():
 @admin_required
 def editar_funcao(id):
     """Edita uma função existente."""
-    conn = get_db_connection()
+    conn = get_db()
     funcao_row = conn.execute('SELECT * FROM funcoes WHERE id = ?', (id,)).fetchone()
     
     if not funcao_row:
@@ -130,9 +122,15 @@ def editar_funcao(id):
         
         conn.execute('''
             UPDATE funcoes
-            SET nome = ?, nivel_acesso = ?, descricao = ?, updated_at = ?
+            SET nome = ?, nivel_acesso = ?, descricao = ?, updated_at = CURRENT_TIMESTAMP
             WHERE id = ?
-        ''', (nome, nivel_acesso, descricao, datetime.datetime.now(), id))
+        ''', (nome, nivel_acesso, descricao, id))
+        
+        # O nível da função entra na máscara de permissões de quem a ocupa
+        if nivel_acesso != funcao.nivel_acesso:
+            for usuario in conn.execute('SELECT id FROM users WHERE funcao_id = ?', (id,)).fetchall():
+                refresh_permission_mask(conn, usuario['id'])
+                bump_auth_version(conn, usuario['id'])
         
         conn.commit()
         conn.close()
@@ -148,7 +146,7 @@ def editar_funcao(id):
 @admin_required
 def excluir_funcao(id):
     """Exclui uma função."""
-    conn = get_db_connection()
+    conn = get_db()
     
     # Verificar se a função existe
     funcao = conn.execute('SELECT * FROM funcoes WHERE id = ?', (id,)).fetchone()
@@ -1,16 +1,10 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
-import sqlite3
 from datetime import datetime
+from database import get_db
+from services.permissoes import current_user_can
 
 servidor_bp = Blueprint('servidor', __name__, url_prefix='/storage')
 
-DATABASE = 'chamados_ti.db'
-
-def get_db_connection():
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
-
 def login_required(f):
     from functools import wraps
     @wraps(f)
@@ -22,10 +16,7 @@ def login_required(f):
     return decorated_function
 
 def can_access_storage():
-    if 'user_id' not in session:
-        return False
-    role = session.get('role')
-    return role in ['admin', 'diretor', 'supervisor', 'tech']
+    return current_user_can('area_storage')
 
 
 @servidor_bp.route('/')
@@ -36,7 +27,7 @@ def listar_servidores():
         flash('Acesso negado! Você não tem permissão para acessar o armazenamento de servidores.', 'danger')
         return redirect(url_for('dashboard'))
 
-    conn = get_db_connection()
+    conn = get_db()
     
     # Buscar servidores
     servidores_raw = conn.execute('''
@@ -44,19 +35,20 @@ def listar_servidores():
         ORDER BY nome
     ''').fetchall()
     
+    # Armazenamentos de todos os servidores numa única query (evita N+1)
+    armazenamentos_por_servidor = {}
+    for arm_row in conn.execute('''
+        SELECT * FROM armazenamentos
+        ORDER BY servidor_id, nome
+    '''):
+        armazenamentos_por_servidor.setdefault(arm_row['servidor_id'], []).append(arm_row)
+    
     servidores = []
     for servidor_row in servidores_raw:
         servidor = dict(servidor_row)
         
-        # Buscar armazenamentos do servidor
-        armazenamentos_raw = conn.execute('''
-            SELECT * FROM armazenamentos
-            WHERE servidor_id = ?
-            ORDER BY nome
-        ''', (servidor['id'],)).fetchall()
-        
         armazenamentos = []
-        for arm_row in armazenamentos_raw:
+        for arm_row in armazenamentos_por_servidor.get(servidor['id'], []):
             armazenamento = dict(arm_row)
             
             # Adicionar propriedades calculadas
@@ -128,7 +120,7 @@ def novo_servidor():
         sistema_operacional = request.form.get('sistema_operacional', '')
         observacoes = request.form.get('observacoes', '')
 
-        conn = get_db_connection()
+        conn = get_db()
         conn.execute('''
             INSERT INTO servidores (nome, descricao, ip_endereco, sistema_operacional, observacoes)
             VALUES (?, ?, ?, ?, ?)
@@ -150,7 +142,7 @@ def novo_armazenamento(servidor_id):
         flash('Acesso negado! Você não tem permissão para acessar o armazenamento de servidores.', 'danger')
         return redirect(url_for('dashboard'))
 
-    conn = get_db_connection()
+    conn = get_db()
     servidor = conn.execute('SELECT * FROM servidores WHERE id = ?', (servidor_id,)).fetchone()
     
     if not servidor:
@@ -189,7 +181,7 @@ def editar_armazenamento(armazenamento_id):
         flash('Acesso negado! Você não tem permissão para acessar o armazenamento de servidores.', 'danger')
         return redirect(url_for('dashboard'))
     
-    conn = get_db_connection()
+    conn = get_db()
     armazenamento = conn.execute('''
         SELECT a.*, s.nome as servidor_nome 
         FROM armazenamentos a 
@@ -233,11 +225,11 @@ def editar_armazenamento(armazenamento_id):
 @login_required
 def deletar_armazenamento(armazenamento_id):
     """Deleta um armazenamento"""
-    if session.get('role') != 'admin':
+    if not current_user_can('perfil_admin'):
         flash('Acesso negado! Apenas administradores podem deletar.', 'danger')
         return redirect(url_for('servidor.listar_servidores'))
 
-    conn = get_db_connection()
+    conn = get_db()
     armazenamento = conn.execute('''
         SELECT a.nome, s.nome as servidor_nome 
         FROM armazenamentos a 
@@ -262,11 +254,11 @@ def deletar_armazenamento(armazenamento_id):
 @login_required
 def deletar_servidor(servidor_id):
     """Deleta um servidor e todos seus armazenamentos"""
-    if session.get('role') != 'admin':
+    if not current_user_can('perfil_admin'):
         flash('Acesso negado! Apenas administradores podem deletar.', 'danger')
         return redirect(url_for('servidor.listar_servidores'))
 
-    conn = get_db_connection()
+    conn = get_db()
     servidor = conn.execute('SELECT nome FROM servidores WHERE id = ?', (servidor_id,)).fetchone()
 
     if not servidor:
@@ -0,0 +1,82 @@
+"""
+Benchmark da conversão das linhas de chamados para os templates (convert_chamado_row)
+
+Semeia N chamados (padrão 100) num SQLite temporário, lê a mesma consulta da listagem e
+mede, dentro de um contexto de requisição de administrador:
+  - convert_chamado_row em todas as linhas + tempo_aberto (parse das datas);
+  - a conversão + render de chamados.html.
+
+Para comparar com outra versão do app, rode o mesmo script numa cópia da árvore naquela
+versão (git worktree add /tmp/antes <commit> && cp -r scripts /tmp/antes/).
+
+Uso: python scripts/bench_chamado_view.py [--linhas 100] [--repeticoes 300]
+"""
+import argparse
+import sqlite3
+
+from bench_comum import admin_id, cronometrar, preparar_app, resumo
+
+LISTAGEM_QUERY = '''
+    SELECT c.*, u.username as criador_nome, u2.username as tecnico_nome
+    FROM chamados c
+    JOIN users u ON c.criado_por = u.id
+    LEFT JOIN users u2 ON c.atribuido_para = u2.id
+    ORDER BY c.id DESC
+    LIMIT ?
+'''
+
+
+def semear(caminho, linhas, usuario):
+    """Chamados com e sem técnico e data de resolução, em todas as prioridades"""
+    conn = sqlite3.connect(caminho)
+    conn.executemany('''
+        INSERT INTO chamados (titulo, descricao, prioridade, categoria, criado_por, atribuido_para,
+                              data_criacao, data_resolucao)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [(f'Chamado {i}', 'descrição', ('baixa', 'media', 'alta', 'critica')[i % 4], 'rede', usuario,
+           usuario if i % 2 else None, '2024-05-%02d 10:%02d:00' % (1 + i % 28, i % 60),
+           '2024-06-01 12:00:00' if i % 3 == 0 else None) for i in range(linhas)])
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--linhas', type=int, default=100)
+    parser.add_argument('--repeticoes', type=int, default=300)
+    args = parser.parse_args()
+
+    app_module, caminho = preparar_app()
+    usuario = admin_id(caminho)
+    semear(caminho, args.linhas, usuario)
+
+    from flask import render_template, session
+    from database import get_db
+
+    app = app_module.app
+    with app.test_request_context('/chamados'):
+        session['user_id'] = usuario
+        session['role'] = 'admin'
+        app.preprocess_request()
+        rows = get_db().execute(LISTAGEM_QUERY, (args.linhas,)).fetchall()
+
+        def converter():
+            return [app_module.convert_chamado_row(row) for row in rows]
+
+        def converter_e_tempo_aberto():
+            return [chamado.tempo_aberto for chamado in converter()]
+
+        def renderizar():
+            chamados = converter()
+            sum((chamado.tempo_aberto for chamado in chamados), app_module.timedelta())
+            return render_template('chamados.html', chamados=app_module.Pagination(chamados, 1, len(rows), len(rows)),
+                                   categorias=['rede'], status_filter='', prioridade_filter='',
+                                   categoria_filter='', busca='')
+
+        for nome, fn in (('convert + tempo_aberto', converter_e_tempo_aberto),
+                         ('convert + render chamados.html', renderizar)):
+            print(f'📊 {nome} ({len(rows)} linhas): {resumo(cronometrar(fn, args.repeticoes))}')
+
+
+if __name__ == '__main__':
+    main()
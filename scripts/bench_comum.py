@@ -0,0 +1,77 @@
+"""
+Apoio comum dos benchmarks em scripts/ (python scripts/bench_*.py na raiz do projeto)
+
+Cada benchmark roda num arquivo SQLite temporário: database.DATABASE é trocado antes de
+o app ser importado, então o chamados_ti.db versionado nunca é tocado.
+"""
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Sem threads de fundo nem PostgreSQL durante as medições
+os.environ.setdefault('SLA_AGENDADOR', '0')
+os.environ.setdefault('CONTADORES_RECONCILE_SECONDS', '0')
+os.environ.pop('DATABASE_URL', None)
+
+ADMIN = 'bench_admin'
+SENHA = 'bench1234'
+
+
+def preparar_app():
+    """Importa o app sobre um banco temporário migrado com um administrador; retorna (módulo app, caminho)"""
+    import atexit
+    import database
+
+    pasta = tempfile.mkdtemp(prefix='bench_')
+    atexit.register(shutil.rmtree, pasta, True)
+    database.DATABASE = os.path.join(pasta, 'bench.db')
+
+    import app as app_module
+    from werkzeug.security import generate_password_hash
+
+    app_module.init_db()
+    conn = sqlite3.connect(database.DATABASE)
+    conn.execute('INSERT INTO users (username, email, password_hash, role, is_active) VALUES (?, ?, ?, ?, 1)',
+                 (ADMIN, 'bench@teste.local', generate_password_hash(SENHA, 'pbkdf2:sha256:1000'), 'admin'))
+    conn.commit()
+    conn.close()
+    return app_module, database.DATABASE
+
+
+def admin_id(caminho):
+    conn = sqlite3.connect(caminho)
+    try:
+        return conn.execute('SELECT id FROM users WHERE username = ?', (ADMIN,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def cliente_logado(app_module):
+    client = app_module.app.test_client()
+    response = client.post('/login', data={'username': ADMIN, 'password': SENHA})
+    assert response.status_code == 302, response.data[-300:]
+    return client
+
+
+def cronometrar(fn, repeticoes):
+    """Executa fn uma vez para aquecer e depois `repeticoes` vezes; retorna os tempos em ms"""
+    fn()
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        fn()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return tempos
+
+
+def resumo(tempos):
+    """'melhor / mediana / p95' em ms"""
+    ordenados = sorted(tempos)
+    p95 = ordenados[min(len(ordenados) - 1, int(len(ordenados) * .95))]
+    return f'melhor {ordenados[0]:.2f} ms, mediana {statistics.median(ordenados):.2f} ms, p95 {p95:.2f} ms'
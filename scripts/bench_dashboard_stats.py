@@ -0,0 +1,60 @@
+"""
+Benchmark do polling do dashboard: /dashboard inteiro x /dashboard/api/stats (200 e 304)
+
+Semeia N chamados (padrão 100.000) num SQLite temporário e mede, por requisição, o tempo
+e o número de queries da página completa, do JSON com o snapshot expirado, do JSON
+servido do snapshot em memória e da revalidação com If-None-Match (304 sem corpo).
+
+Uso: python scripts/bench_dashboard_stats.py [--linhas 100000] [--repeticoes 200]
+"""
+import argparse
+import time
+
+from bench_comum import admin_id, cliente_logado, cronometrar, preparar_app, resumo
+from bench_paginacao import semear
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--linhas', type=int, default=100_000)
+    parser.add_argument('--repeticoes', type=int, default=200)
+    args = parser.parse_args()
+
+    app_module, caminho = preparar_app()
+    inicio = time.perf_counter()
+    semear(caminho, args.linhas, admin_id(caminho))
+    print(f'🌱 {args.linhas} chamados semeados em {time.perf_counter() - inicio:.1f} s')
+
+    from database import request_query_stats
+    from services import contadores
+
+    client = cliente_logado(app_module)
+    etag = client.get('/dashboard/api/stats').headers['ETag']
+
+    def expirar():
+        contadores._snapshot = None
+
+    casos = (
+        ('/dashboard (página)', '/dashboard', {}, 200, None),
+        ('api/stats, snapshot expirado', '/dashboard/api/stats', {}, 200, expirar),
+        ('api/stats, snapshot em memória', '/dashboard/api/stats', {}, 200, None),
+        ('api/stats, If-None-Match', '/dashboard/api/stats', {'If-None-Match': etag}, 304, None),
+    )
+    for nome, url, headers, esperado, antes in casos:
+        def requisitar():
+            if antes:
+                antes()
+            response = client.get(url, headers=headers)
+            assert response.status_code == esperado, (url, response.status_code)
+            return response
+
+        with client:
+            response = requisitar()
+            stats = request_query_stats()
+            queries = stats.count if stats else 0
+        tempos = cronometrar(requisitar, args.repeticoes)
+        print(f'📊 {nome}: {queries} queries, {len(response.data)} bytes, {resumo(tempos)}')
+
+
+if __name__ == '__main__':
+    main()
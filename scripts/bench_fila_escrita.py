@@ -0,0 +1,92 @@
+"""
+Benchmark da fila de escrita do SQLite: N threads enviando mensagens de chat
+
+Cada thread tem o seu cliente logado e faz POST /api/chat/enviar em sequência. A mesma
+carga roda com a fila desligada (cada requisição faz o seu COMMIT) e ligada (a thread
+escritora agrupa as unidades em transações), no perfil production (WAL). Reporta
+mensagens/s e quantas transações chegaram ao COMMIT no arquivo.
+
+Uso: python scripts/bench_fila_escrita.py [--threads 16] [--mensagens 60] [--synchronous NORMAL]
+"""
+import argparse
+import contextlib
+import os
+import threading
+import time
+
+from bench_comum import cliente_logado, preparar_app
+
+os.environ.setdefault('SQLITE_PROFILE', 'production')
+os.environ['SQLITE_WRITE_QUEUE'] = '0'  # ligada e desligada aqui, trocando database._write_queue
+
+
+def contar_commits(database, commits):
+    """_connect que conta os COMMITs executados em cada conexão física"""
+    connect = database._connect
+
+    def rastrear(sql):
+        if sql.strip().upper() == 'COMMIT':
+            with commits['lock']:
+                commits['total'] += 1
+
+    def _connect():
+        conn = connect()
+        conn.set_trace_callback(rastrear)
+        return conn
+    return _connect
+
+
+def rodar(clientes, mensagens):
+    erros = []
+
+    def enviar(client):
+        for i in range(mensagens):
+            response = client.post('/api/chat/enviar', json={'mensagem': f'mensagem {i}'})
+            if response.status_code != 200:
+                erros.append(response.status_code)
+
+    workers = [threading.Thread(target=enviar, args=(client,)) for client in clientes]
+    inicio = time.perf_counter()
+    with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):  # a rota loga cada mensagem
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    decorrido = time.perf_counter() - inicio
+    assert not erros, erros[:5]
+    return decorrido
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--mensagens', type=int, default=60, help='mensagens por thread')
+    parser.add_argument('--synchronous', help='sobrescreve o PRAGMA synchronous do perfil (ex.: FULL)')
+    args = parser.parse_args()
+
+    app_module, _ = preparar_app()
+    import database
+
+    if args.synchronous:
+        database.SQLITE_PRAGMAS['synchronous'] = args.synchronous
+    commits = {'lock': threading.Lock(), 'total': 0}
+    connect = contar_commits(database, commits)
+    total = args.threads * args.mensagens
+    print(f'⚙️ perfil {database.SQLITE_PROFILE}, synchronous={database.SQLITE_PRAGMAS.get("synchronous")}, '
+          f'{args.threads} threads x {args.mensagens} mensagens')
+
+    for nome, fila in (('fila desligada', None), ('fila ligada', database.WriteQueue(connect))):
+        database._pool = database.ConnectionPool(connect)
+        database._write_queue = fila
+        clientes = [cliente_logado(app_module) for _ in range(args.threads)]
+        commits['total'] = 0  # só as transações das mensagens, sem as dos logins
+        decorrido = rodar(clientes, args.mensagens)
+        linha = f'📊 {nome}: {total / decorrido:.0f} mensagens/s, {commits["total"]} transações com COMMIT'
+        if fila:
+            stats = fila.stats()
+            linha += f' ({stats["batches"]} lotes, maior lote {stats["largest_batch"]})'
+        print(linha)
+
+
+if __name__ == '__main__':
+    main()
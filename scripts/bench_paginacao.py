@@ -0,0 +1,80 @@
+"""
+Benchmark da listagem de chamados: paginação por OFFSET (?page=N) x por cursor (?after=)
+
+Semeia N chamados (padrão 1.000.000) num SQLite temporário e mede a requisição inteira
+em /chamados e /api/chamados na primeira página e numa página profunda. Com cursor o
+custo não deve depender da profundidade; com OFFSET ele cresce linearmente.
+
+Uso: python scripts/bench_paginacao.py [--linhas 1000000] [--pagina 5000] [--repeticoes 5]
+"""
+import argparse
+import random
+import sqlite3
+import time
+
+from bench_comum import admin_id, cliente_logado, cronometrar, preparar_app, resumo
+
+LOTE = 50_000
+PER_PAGE = 10  # fixo na rota /chamados
+
+
+def semear(caminho, linhas, criado_por):
+    """Insere os chamados em lotes, com empates de data_criacao para exercitar o desempate por id"""
+    rnd = random.Random(16)
+    conn = sqlite3.connect(caminho)
+    for inicio in range(0, linhas, LOTE):
+        lote = []
+        for i in range(inicio, min(inicio + LOTE, linhas)):
+            data = ('2020-01-01 00:00:00' if i % 7 == 0 else
+                    '2021-%02d-%02d %02d:%02d:%02d' % (1 + i % 12, 1 + i % 28, i % 24, i % 60, (i // 60) % 60))
+            lote.append((f'Chamado {i}', 'descrição', rnd.choice(('aberto', 'em_andamento', 'fechado')),
+                         rnd.choice(('baixa', 'media', 'alta')), rnd.choice(('Rede', 'Hardware', 'Software')),
+                         criado_por, data))
+        conn.executemany('''
+            INSERT INTO chamados (titulo, descricao, status, prioridade, categoria, criado_por, data_criacao)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', lote)
+        conn.commit()
+    conn.execute('ANALYZE')
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--linhas', type=int, default=1_000_000)
+    parser.add_argument('--pagina', type=int, default=5000, help='página profunda (10 por página em /chamados)')
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    app_module, caminho = preparar_app()
+    inicio = time.perf_counter()
+    semear(caminho, args.linhas, admin_id(caminho))
+    print(f'🌱 {args.linhas} chamados semeados em {time.perf_counter() - inicio:.1f} s')
+
+    client = cliente_logado(app_module)
+    # Cursor da última linha da página anterior à profunda, na mesma ordem da listagem
+    conn = sqlite3.connect(caminho)
+    borda = conn.execute('''
+        SELECT data_criacao, id FROM chamados ORDER BY data_criacao DESC, id DESC LIMIT 1 OFFSET ?
+    ''', ((args.pagina - 1) * PER_PAGE - 1,)).fetchone()
+    conn.close()
+    cursor = app_module.encode_cursor({'data_criacao': borda[0], 'id': borda[1]})
+
+    casos = (
+        ('página 1, OFFSET', '/chamados?page=1'),
+        ('página 1, cursor', '/chamados'),
+        (f'página {args.pagina}, OFFSET', f'/chamados?page={args.pagina}'),
+        (f'página {args.pagina}, cursor', f'/chamados?after={cursor}'),
+        (f'página {args.pagina}, cursor, JSON', f'/api/chamados?per_page={PER_PAGE}&after={cursor}'),
+        (f'página {args.pagina}, cursor, status=aberto', f'/chamados?status=aberto&after={cursor}'),
+    )
+    for nome, url in casos:
+        def requisitar():
+            response = client.get(url)
+            assert response.status_code == 200, (url, response.status_code)
+        print(f'📊 {nome}: {resumo(cronometrar(requisitar, args.repeticoes))}')
+
+
+if __name__ == '__main__':
+    main()
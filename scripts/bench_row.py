@@ -0,0 +1,105 @@
+"""
+Benchmark das linhas de resultado: Row (slots) com fetchall() e stream() x wrapper antigo
+
+Cria uma tabela com N linhas (padrão 200.000) x 5 colunas num SQLite temporário, lê
+tudo acessando uma coluna por nome e reporta linhas/s e o pico de memória (tracemalloc)
+de cada forma de leitura:
+  - sqlite3.Row com fetchall() (referência do driver);
+  - o wrapper antigo do PostgreSQL: classe PostgresRow criada a cada fetchall sobre dicts
+    (o RealDictCursor), como era o CursorWrapper antes do Row compartilhado;
+  - Row com fetchall();
+  - Row com stream(), em lotes de STREAM_BATCH_SIZE.
+
+Uso: python scripts/bench_row.py [--linhas 200000] [--repeticoes 3]
+"""
+import argparse
+import sqlite3
+import tracemalloc
+
+from bench_comum import cronometrar, preparar_app
+
+CRIAR_TABELA = '''
+    CREATE TABLE bench_linhas (
+        id INTEGER PRIMARY KEY, titulo TEXT, status TEXT, prioridade TEXT, data_criacao TEXT
+    )
+'''
+CONSULTA = 'SELECT * FROM bench_linhas'
+
+
+def wrapper_antigo(caminho):
+    """Leitura como no CursorWrapper antigo: dicts do cursor envolvidos numa classe por chamada"""
+    raw = sqlite3.connect(caminho)
+    raw.row_factory = lambda cursor, row: dict(zip([col[0] for col in cursor.description], row))
+    results = raw.execute(CONSULTA).fetchall()
+
+    class PostgresRow:
+        def __init__(self, data):
+            self._data = data
+
+        def __getitem__(self, key):
+            return self._data[key]
+
+        def keys(self):
+            return self._data.keys()
+
+        def __contains__(self, key):
+            return key in self._data
+
+    rows = [PostgresRow(row) for row in results]
+    raw.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--linhas', type=int, default=200_000)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    _, caminho = preparar_app()
+    import database
+
+    raw = sqlite3.connect(caminho)
+    raw.execute(CRIAR_TABELA)
+    raw.executemany('INSERT INTO bench_linhas VALUES (?, ?, ?, ?, ?)',
+                    ((i, f'Chamado {i}', 'aberto', 'media', '2025-01-01 00:00:00') for i in range(args.linhas)))
+    raw.commit()
+    raw.close()
+
+    conn = database.get_db_connection()
+
+    def driver_fetchall():
+        raw = sqlite3.connect(caminho)
+        raw.row_factory = sqlite3.Row
+        rows = raw.execute(CONSULTA).fetchall()
+        raw.close()
+        return sum(row['id'] for row in rows)
+
+    def antigo_fetchall():
+        return sum(row['id'] for row in wrapper_antigo(caminho))
+
+    def row_fetchall():
+        return sum(row['id'] for row in conn.execute(CONSULTA).fetchall())
+
+    def row_stream():
+        return sum(row['id'] for row in conn.stream(CONSULTA))
+
+    casos = (
+        ('sqlite3.Row, fetchall()', driver_fetchall),
+        ('wrapper antigo (PostgresRow)', antigo_fetchall),
+        ('Row, fetchall()', row_fetchall),
+        (f'Row, stream() (lotes de {database.STREAM_BATCH_SIZE})', row_stream),
+    )
+    esperado = sum(range(args.linhas))
+    for nome, fn in casos:
+        tracemalloc.start()
+        assert fn() == esperado
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        melhor = min(cronometrar(fn, args.repeticoes))
+        print(f'📊 {nome}: {args.linhas / melhor * 1000:,.0f} linhas/s, pico {pico / 1e6:.1f} MB')
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+# Serviços compartilhados entre app.py e os blueprints
@@ -0,0 +1,56 @@
+"""
+Busca textual nos chamados (título, descrição e solução)
+
+O índice é mantido pelo próprio banco (migração 0006), por triggers na mesma transação
+do INSERT/UPDATE: FTS5 (chamados_fts) no SQLite e a coluna tsvector chamados.busca
+com índice GIN no PostgreSQL. Cada palavra digitada vira um prefixo e todas precisam
+aparecer; o resultado vem ordenado por relevância (bm25 / ts_rank).
+"""
+import re
+import unicodedata
+
+from database import USE_POSTGRES
+
+MAX_TERMS = 8
+
+# Configuração de busca criada na migração (cópia da 'portuguese', com stemming)
+PG_TS_CONFIG = 'chamados_pt'
+
+# Peso de cada coluna no bm25 do SQLite: título > descrição > solução
+FTS_WEIGHTS = (10.0, 4.0, 2.0)
+
+
+def fold_accents(text):
+    """Minúsculas sem acentos, como o índice do PostgreSQL guarda (chamados_busca_texto)"""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def search_terms(text):
+    """Palavras da busca, sem operadores nem pontuação"""
+    return re.findall(r'\w+', fold_accents(text or ''))[:MAX_TERMS]
+
+
+def search_query(terms):
+    """Expressão MATCH (FTS5) ou tsquery (PostgreSQL) com prefixo em cada termo"""
+    if USE_POSTGRES:
+        return ' & '.join(f'{term}:*' for term in terms)
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search_clause(text):
+    """Partes SQL da busca: (join, condição, parâmetros, ordenação, parâmetros da ordenação).
+
+    Retorna None se o texto não tiver nenhuma palavra.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return None
+    query = search_query(terms)
+    if USE_POSTGRES:
+        tsquery = f"to_tsquery('{PG_TS_CONFIG}', ?)"
+        return ('', f'c.busca @@ {tsquery}', [query],
+                f'ts_rank(c.busca, {tsquery}) DESC, c.id DESC', [query])
+    weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+    return (' JOIN chamados_fts ON chamados_fts.rowid = c.id', 'chamados_fts MATCH ?', [query],
+            f'bm25(chamados_fts, {weights}), c.id DESC', [])
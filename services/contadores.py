@@ -0,0 +1,212 @@
+"""
+Contadores de chamados mantidos incrementalmente (dashboard e perfil)
+
+A tabela chamado_contadores guarda, para o total geral (user_id = 0) e para cada
+criador, o número de chamados no total e por status, prioridade, categoria e estado do
+SLA. Quem cria, altera ou exclui um chamado chama record_change() na mesma transação,
+que aplica só os deltas (upsert). reconcile_counters() recalcula tudo a partir de chamados e corrige
+divergências; roda numa thread a cada CONTADORES_RECONCILE_SECONDS e pela CLI
+(flask reconciliar-contadores).
+
+dashboard_snapshot() serve os números do dashboard em JSON com cache de
+DASHBOARD_STATS_TTL segundos e ETag, para o polling de /dashboard/api/stats.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+from database import USE_POSTGRES, convert_query, get_db, get_db_connection
+
+RECONCILE_INTERVAL = float(os.environ.get('CONTADORES_RECONCILE_SECONDS', '3600'))
+STATS_TTL = float(os.environ.get('DASHBOARD_STATS_TTL', '5'))
+
+GLOBAL = 0  # user_id das linhas do total geral
+DIMENSIONS = ('status', 'prioridade', 'categoria', 'sla_estado')
+
+UPSERT_DELTA = '''
+    INSERT INTO chamado_contadores (user_id, dimensao, valor, total) VALUES {values}
+    ON CONFLICT (user_id, dimensao, valor) DO UPDATE SET total = chamado_contadores.total + excluded.total
+'''
+UPSERT_VALUE = '''
+    INSERT INTO chamado_contadores (user_id, dimensao, valor, total) VALUES (?, ?, ?, ?)
+    ON CONFLICT (user_id, dimensao, valor) DO UPDATE SET total = excluded.total
+'''
+
+
+def _keys(chamado):
+    """Linhas de contador em que um chamado entra (valor NULL vira '')"""
+    keys = []
+    for user_id in (GLOBAL, chamado['criado_por']):
+        if user_id is None:
+            continue
+        keys.append((user_id, 'total', ''))
+        for dimension in DIMENSIONS:
+            keys.append((user_id, dimension, chamado[dimension] or ''))
+    return keys
+
+
+def record_change(conn, before=None, after=None):
+    """Aplica os deltas de um chamado criado (before=None), alterado ou excluído (after=None).
+
+    before/after são mapeamentos com criado_por e as DIMENSIONS.
+    Roda na transação de quem chamou: o commit do chamado grava os contadores junto.
+    """
+    deltas = Counter()
+    if before is not None:
+        deltas.subtract(_keys(before))
+    if after is not None:
+        deltas.update(_keys(after))
+    params = []
+    for (user_id, dimension, value), delta in sorted(deltas.items()):
+        if delta:
+            params.extend((user_id, dimension, value, delta))
+    if params:
+        # Um único upsert com todas as linhas (criar um chamado mexe em 8)
+        values = ', '.join(['(?, ?, ?, ?)'] * (len(params) // 4))
+        conn.execute(UPSERT_DELTA.format(values=values), params, prepared=True)
+
+
+def get_counters(conn, user_id=GLOBAL):
+    """{'total': n, 'status': {...}, 'prioridade': {...}, 'categoria': {...}} numa única query"""
+    counters = {'total': 0}
+    for dimension in DIMENSIONS:
+        counters[dimension] = {}
+    rows = conn.execute(
+        'SELECT dimensao, valor, total FROM chamado_contadores WHERE user_id = ? AND total <> 0',
+        (user_id,), prepared=True
+    ).fetchall()
+    for row in rows:
+        if row['dimensao'] == 'total':
+            counters['total'] = row['total']
+        elif row['dimensao'] in counters:
+            counters[row['dimensao']][row['valor'] or None] = row['total']
+    return counters
+
+
+def dashboard_stats(counters):
+    """Números exibidos no dashboard a partir dos contadores gerais"""
+    def grouped(dimension):
+        items = sorted(counters[dimension].items(), key=lambda item: item[0] or '')
+        return [{dimension: value, 'count': total} for value, total in items]
+
+    return {
+        'total_chamados': counters['total'],
+        'chamados_abertos': counters['status'].get('aberto', 0),
+        'chamados_em_andamento': counters['status'].get('em_andamento', 0),
+        'chamados_resolvidos': counters['status'].get('resolvido', 0),
+        'chamados_sla_em_risco': counters['sla_estado'].get('em_risco', 0),
+        'chamados_sla_violados': counters['sla_estado'].get('violado', 0),
+        'chamados_por_prioridade': grouped('prioridade'),
+        'chamados_por_categoria': grouped('categoria'),
+    }
+
+
+_snapshot = None  # (expira_em, corpo JSON, etag), o mesmo para todos os usuários
+_snapshot_lock = threading.Lock()
+
+
+def dashboard_snapshot():
+    """(corpo JSON, etag) dos números do dashboard; o banco só é lido quando o TTL expira"""
+    global _snapshot
+    now = time.monotonic()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot[0] > now:
+        return snapshot[1], snapshot[2]
+    body = json.dumps(dashboard_stats(get_counters(get_db())), sort_keys=True, separators=(',', ':'))
+    # ETag forte derivado do conteúdo: continua igual enquanto os números não mudarem
+    etag = hashlib.sha1(body.encode()).hexdigest()[:20]
+    with _snapshot_lock:
+        _snapshot = (now + STATS_TTL, body, etag)
+    return body, etag
+
+
+# ==========================================
+# Reconciliação
+# ==========================================
+
+def _source_sql():
+    """Contagens reais a partir de chamados, no formato de chamado_contadores"""
+    parts = [f"SELECT {GLOBAL}, 'total', '', COUNT(*) FROM chamados"]
+    for dimension in DIMENSIONS:
+        value = f"COALESCE({dimension}, '')"
+        parts.append(f"SELECT {GLOBAL}, '{dimension}', {value}, COUNT(*) FROM chamados GROUP BY {value}")
+    parts.append("SELECT criado_por, 'total', '', COUNT(*) FROM chamados "
+                 "WHERE criado_por IS NOT NULL GROUP BY criado_por")
+    for dimension in DIMENSIONS:
+        value = f"COALESCE({dimension}, '')"
+        parts.append(f"SELECT criado_por, '{dimension}', {value}, COUNT(*) FROM chamados "
+                     f"WHERE criado_por IS NOT NULL GROUP BY criado_por, {value}")
+    return ' UNION ALL '.join(parts)
+
+
+SOURCE_SQL = _source_sql()
+
+
+def reconcile_counters(conn=None):
+    """Recalcula os contadores e corrige as linhas divergentes; retorna quantas mudaram"""
+    own = conn is None
+    if own:
+        conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        # Bloqueia os deltas concorrentes: quem já alterou chamados mas ainda não gravou o
+        # contador espera e aplica o delta depois, sobre o valor recalculado
+        if USE_POSTGRES:
+            cursor.execute('LOCK TABLE chamado_contadores IN EXCLUSIVE MODE')
+        else:
+            cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute(SOURCE_SQL)
+        expected = {(row[0], row[1], row[2]): row[3] for row in cursor.fetchall()}
+        cursor.execute('SELECT user_id, dimensao, valor, total FROM chamado_contadores')
+        current = {(row[0], row[1], row[2]): row[3] for row in cursor.fetchall()}
+
+        fixed = 0
+        for key, total in expected.items():
+            if current.get(key) != total:
+                cursor.execute(convert_query(UPSERT_VALUE), key + (total,))
+                fixed += 1
+        for key, total in current.items():
+            if key not in expected:
+                cursor.execute(convert_query(
+                    'DELETE FROM chamado_contadores WHERE user_id = ? AND dimensao = ? AND valor = ?'
+                ), key)
+                if total:
+                    fixed += 1
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if own:
+            conn.close()
+    if fixed:
+        print(f"🔧 Contadores de chamados: {fixed} divergência(s) corrigida(s)")
+    return fixed
+
+
+_reconciler_pid = None
+_reconciler_lock = threading.Lock()
+
+
+def _reconcile_loop():
+    while True:
+        time.sleep(RECONCILE_INTERVAL)
+        try:
+            reconcile_counters()
+        except Exception as e:
+            print(f"⚠️ Erro ao reconciliar contadores de chamados: {e}")
+
+
+def start_reconciler():
+    """before_request: inicia a thread de reconciliação deste worker (uma vez por processo)"""
+    global _reconciler_pid
+    if RECONCILE_INTERVAL <= 0 or _reconciler_pid == os.getpid():
+        return
+    with _reconciler_lock:
+        if _reconciler_pid == os.getpid():
+            return
+        _reconciler_pid = os.getpid()
+        threading.Thread(target=_reconcile_loop, name='contadores', daemon=True).start()
@@ -0,0 +1,169 @@
+"""
+Histórico de alterações dos chamados (tabela chamado_eventos, somente inserção)
+
+Cada mudança de status, prioridade, categoria, técnico ou estado do SLA vira uma linha
+(campo, valor anterior, valor novo, quem, quando e a versão do chamado que ela gerou).
+record_events() é chamado por quem cria, altera ou exclui um chamado, na mesma transação,
+e grava todas as linhas num único INSERT. Triggers da migração 0010 recusam UPDATE/DELETE
+na tabela.
+
+Os relatórios (tempo em um status, reaberturas) leem só chamado_eventos, pelos índices
+(chamado_id, id) e (campo, criado_em).
+"""
+from database import USE_POSTGRES
+
+CAMPOS = ('status', 'prioridade', 'categoria', 'atribuido_para', 'sla_estado')
+
+# Status em que o chamado é considerado encerrado (sair deles é uma reabertura)
+ENCERRADOS = ('resolvido', 'fechado')
+
+# Id do chamado recém-inserido na mesma transação. No SQLite a escrita é exclusiva até o
+# commit, então o MAX(id) é o nosso; no PostgreSQL currval() é da própria sessão.
+NOVO_CHAMADO_ID = (
+    "currval(pg_get_serial_sequence('chamados', 'id'))" if USE_POSTGRES
+    else '(SELECT MAX(id) FROM chamados)'
+)
+
+INSERT_EVENTOS = '''
+    INSERT INTO chamado_eventos (chamado_id, user_id, acao, campo, valor_anterior, valor_novo, versao)
+    VALUES {values}
+'''
+
+# Segundos entre duas colunas TIMESTAMP (o fim aberto vale agora, em UTC)
+if USE_POSTGRES:
+    DURACAO = 'EXTRACT(EPOCH FROM COALESCE(saiu_em, LOCALTIMESTAMP) - entrou_em)'
+else:
+    DURACAO = "(julianday(COALESCE(saiu_em, CURRENT_TIMESTAMP)) - julianday(entrou_em)) * 86400"
+
+ACOES = {
+    'criado': 'Chamado criado',
+    'alterado': 'Chamado alterado',
+    'excluido': 'Chamado excluído',
+    'importado': 'Situação no início do histórico',
+    'sla': 'Prazo de SLA',
+}
+
+ROTULOS = {
+    'status': 'Status',
+    'prioridade': 'Prioridade',
+    'categoria': 'Categoria',
+    'atribuido_para': 'Técnico',
+    'sla_estado': 'SLA',
+}
+
+
+def _texto(value):
+    return None if value is None or value == '' else str(value)
+
+
+def record_events(conn, user_id, before=None, after=None, chamado_id=None, acao=None):
+    """Registra as mudanças de um chamado criado (before=None), alterado ou excluído (after=None).
+
+    before/after são mapeamentos com os CAMPOS; before é a linha lida do chamado (id e
+    versao). Na criação, chame logo depois do INSERT (o id sai de NOVO_CHAMADO_ID).
+    acao substitui a ação deduzida (ex.: 'sla' nas mudanças feitas pelo agendador).
+    """
+    if before is None:
+        padrao, versao = 'criado', 1
+    elif after is None:
+        padrao, versao = 'excluido', before['versao']
+    else:
+        padrao, versao = 'alterado', before['versao'] + 1
+    acao = acao or padrao
+    if chamado_id is None and before is not None:
+        chamado_id = before['id']
+    rows = []
+    params = []
+    for campo in CAMPOS:
+        anterior = _texto(before[campo]) if before is not None else None
+        novo = _texto(after.get(campo)) if after is not None else None
+        if anterior == novo:
+            continue
+        rows.append(f'({NOVO_CHAMADO_ID}, ?, ?, ?, ?, ?, ?)' if chamado_id is None else '(?, ?, ?, ?, ?, ?, ?)')
+        if chamado_id is not None:
+            params.append(chamado_id)
+        params.extend((user_id, acao, campo, anterior, novo, versao))
+    if rows:
+        conn.execute(INSERT_EVENTOS.format(values=', '.join(rows)), params, prepared=True)
+
+
+def timeline(conn, chamado_id):
+    """Eventos do chamado agrupados por versão (uma entrada por edição), numa única query"""
+    rows = conn.execute('''
+        SELECT e.acao, e.campo, e.valor_anterior, e.valor_novo, e.versao, e.criado_em,
+               u.username AS autor, ta.username AS tecnico_anterior, tn.username AS tecnico_novo
+        FROM chamado_eventos e
+        LEFT JOIN users u ON u.id = e.user_id
+        LEFT JOIN users ta
+            ON ta.id = CASE WHEN e.campo = 'atribuido_para' THEN CAST(e.valor_anterior AS INTEGER) END
+        LEFT JOIN users tn
+            ON tn.id = CASE WHEN e.campo = 'atribuido_para' THEN CAST(e.valor_novo AS INTEGER) END
+        WHERE e.chamado_id = ?
+        ORDER BY e.id
+    ''', (chamado_id,), prepared=True).fetchall()
+
+    entries = []
+    for row in rows:
+        key = (row['acao'], row['versao'])
+        if not entries or entries[-1]['key'] != key:
+            entries.append({
+                'key': key,
+                'versao': row['versao'],
+                'titulo': ACOES.get(row['acao'], row['acao']),
+                'acao': row['acao'],
+                'quando': row['criado_em'],
+                'autor': row['autor'],
+                'mudancas': [],
+            })
+        if row['campo'] == 'atribuido_para':
+            anterior, novo = row['tecnico_anterior'], row['tecnico_novo']
+        else:
+            anterior, novo = row['valor_anterior'], row['valor_novo']
+        entries[-1]['mudancas'].append((ROTULOS.get(row['campo'], row['campo']), anterior, novo))
+    return entries
+
+
+# ==========================================
+# Relatórios
+# ==========================================
+
+def tempo_em_status(conn, status, inicio, fim):
+    """Tempo passado em `status` pelos períodos iniciados entre inicio e fim.
+
+    Cada entrada no status dura até o próximo evento de status do mesmo chamado (ou até
+    agora, se ainda estiver nele). Retorna intervalos, chamados, total e média em horas.
+    """
+    # Entradas no status pelo índice (campo, criado_em); a saída de cada uma, pelo
+    # índice (chamado_id, id)
+    row = conn.execute(f'''
+        SELECT COUNT(*) AS intervalos, COUNT(DISTINCT chamado_id) AS chamados,
+               COALESCE(SUM({DURACAO}), 0) AS segundos
+        FROM (
+            SELECT e.chamado_id, e.criado_em AS entrou_em, (
+                SELECT s.criado_em FROM chamado_eventos s
+                WHERE s.chamado_id = e.chamado_id AND s.id > e.id AND s.campo = 'status'
+                ORDER BY s.id LIMIT 1
+            ) AS saiu_em
+            FROM chamado_eventos e
+            WHERE e.campo = 'status' AND e.valor_novo = ? AND e.criado_em >= ? AND e.criado_em < ?
+        ) periodos
+    ''', (status, inicio, fim), prepared=True).fetchone()
+    segundos = float(row['segundos'])
+    return {
+        'status': status,
+        'intervalos': row['intervalos'],
+        'chamados': row['chamados'],
+        'total_horas': round(segundos / 3600, 2),
+        'media_horas': round(segundos / 3600 / row['intervalos'], 2) if row['intervalos'] else 0,
+    }
+
+
+def reaberturas(conn, inicio, fim):
+    """Quantas vezes chamados saíram de resolvido/fechado para um status em aberto"""
+    row = conn.execute('''
+        SELECT COUNT(*) AS total, COUNT(DISTINCT chamado_id) AS chamados
+        FROM chamado_eventos
+        WHERE campo = 'status' AND criado_em >= ? AND criado_em < ?
+          AND valor_anterior IN (?, ?) AND valor_novo IS NOT NULL AND valor_novo NOT IN (?, ?)
+    ''', (inicio, fim) + ENCERRADOS + ENCERRADOS, prepared=True).fetchone()
+    return {'total': row['total'], 'chamados': row['chamados']}
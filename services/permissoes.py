@@ -0,0 +1,208 @@
+"""
+Permissões dos usuários codificadas num bitmask
+
+Cada permissão tem um bit fixo (PERMISSION_BITS). A máscara de um usuário junta os bits
+padrão da role, os da função (funcoes.nivel_acesso) e as permissões granulares de
+user_permissions. Ela fica materializada em users.permission_mask, que é recalculada por
+refresh_permission_mask() sempre que role, função ou permissões do usuário mudam.
+
+A máscara é lida numa única query e guardada em flask.g durante a requisição e num cache
+do processo por PERMISSIONS_CACHE_TTL segundos. Quem altera esses dados deve chamar
+invalidate_permissions(user_id); outros workers enxergam a mudança quando o TTL expira.
+"""
+import os
+import threading
+import time
+
+from flask import g, has_app_context, session
+
+from database import get_db
+
+CACHE_TTL = float(os.environ.get('PERMISSIONS_CACHE_TTL', '60'))
+
+# Posições fixas: a máscara é persistida, então um bit nunca muda de significado
+PERMISSION_BITS = {
+    # Granulares (user_permissions, editadas em editar_usuario)
+    'view_chamados': 0,
+    'create_chamados': 1,
+    'edit_chamados': 2,
+    'delete_chamados': 3,
+    'assign_chamados': 4,
+    'manage_infrastructure': 5,
+    'manage_users': 6,
+    'access_chat': 7,
+    # Áreas do sistema (can_access_*)
+    'area_chamados': 16,
+    'area_storage': 17,
+    'area_funcoes': 18,
+    'area_configuracoes': 19,
+    'area_chat': 20,
+    # Perfis (is_admin / is_tech / is_administrativo)
+    'perfil_admin': 24,
+    'perfil_tech': 25,
+    'perfil_administrativo': 26,
+}
+
+GRANULAR_PERMISSIONS = [key for key, position in PERMISSION_BITS.items() if position < 16]
+
+
+def bit(*keys):
+    """Máscara com os bits das permissões informadas"""
+    mask = 0
+    for key in keys:
+        mask |= 1 << PERMISSION_BITS[key]
+    return mask
+
+
+ALL_PERMISSIONS = bit(*PERMISSION_BITS)
+
+_TECH = bit('area_chamados', 'area_storage', 'area_chat', 'perfil_tech')
+ROLE_MASKS = {
+    'admin': ALL_PERMISSIONS & ~bit('perfil_administrativo'),
+    'diretor': _TECH,
+    'supervisor': _TECH,
+    'tech': _TECH,
+    'administrativo': bit('area_chamados', 'area_chat', 'perfil_administrativo'),
+    'user': bit('area_chamados'),
+}
+
+# Bits concedidos pela função a partir deste nível de acesso (1-5)
+FUNCAO_LEVEL_MASKS = {
+    5: bit('area_funcoes'),  # Diretor/Administrador gerencia as funções
+}
+
+
+def compute_mask(role, nivel_acesso=None, permission_keys=()):
+    """Máscara de um usuário a partir da role, do nível da função e das permissões granulares"""
+    mask = ROLE_MASKS.get(role, 0)
+    if nivel_acesso:
+        for nivel, level_mask in FUNCAO_LEVEL_MASKS.items():
+            if nivel_acesso >= nivel:
+                mask |= level_mask
+    # Só as granulares: áreas e perfis vêm da role/função, nunca de uma linha de user_permissions
+    for key in permission_keys:
+        if key in GRANULAR_PERMISSIONS:
+            mask |= bit(key)
+    return mask
+
+
+def mask_permissions(mask):
+    """Permissões granulares contidas na máscara"""
+    return frozenset(key for key in GRANULAR_PERMISSIONS if mask & bit(key))
+
+
+# ==========================================
+# Leitura (com cache)
+# ==========================================
+
+_cache = {}  # user_id -> (expira_em, máscara)
+_lock = threading.Lock()
+
+
+def _compute_from_db(conn, user_id, user=None):
+    if user is None:
+        user = conn.execute('''
+            SELECT u.role, f.nivel_acesso
+            FROM users u LEFT JOIN funcoes f ON f.id = u.funcao_id
+            WHERE u.id = ?
+        ''', (user_id,)).fetchone()
+        if user is None:
+            return 0
+    rows = conn.execute(
+        'SELECT permission_key FROM user_permissions WHERE user_id = ? AND enabled = 1',
+        (user_id,)
+    ).fetchall()
+    return compute_mask(user['role'], user['nivel_acesso'], [row['permission_key'] for row in rows])
+
+
+def _load_mask(user_id):
+    conn = get_db()
+    user = conn.execute('''
+        SELECT u.permission_mask, u.role, f.nivel_acesso
+        FROM users u LEFT JOIN funcoes f ON f.id = u.funcao_id
+        WHERE u.id = ?
+    ''', (user_id,), prepared=True).fetchone()
+    if user is None:
+        return 0
+    if user['permission_mask'] is not None:
+        return user['permission_mask']
+    # Ainda não materializada (usuário criado fora do app): calcula sem gravar
+    return _compute_from_db(conn, user_id, user)
+
+
+def get_permission_mask(user_id):
+    """Máscara de permissões do usuário (no máximo uma query por requisição)"""
+    per_request = g.setdefault('_permissoes', {}) if has_app_context() else {}
+    mask = per_request.get(user_id)
+    if mask is not None:
+        return mask
+
+    now = time.monotonic()
+    cached = _cache.get(user_id)
+    if cached is not None and cached[0] > now:
+        mask = cached[1]
+    else:
+        mask = _load_mask(user_id)
+        if CACHE_TTL > 0:
+            with _lock:
+                _cache[user_id] = (now + CACHE_TTL, mask)
+    per_request[user_id] = mask
+    return mask
+
+
+def get_permissions(user_id):
+    """Conjunto de permissões granulares habilitadas do usuário"""
+    return mask_permissions(get_permission_mask(user_id))
+
+
+def current_user_can(key):
+    """Teste de um bit na máscara do usuário logado"""
+    user_id = session.get('user_id')
+    if user_id is None:
+        return False
+    # Claims já validadas por services.sessao.validate_session dispensam o banco
+    mask = session.get('permission_mask') if g.get('_claims_ok') else None
+    if mask is None:
+        mask = get_permission_mask(user_id)
+    return bool(mask & bit(key))
+
+
+# ==========================================
+# Escrita / sincronização
+# ==========================================
+
+def invalidate_permissions(user_id=None):
+    """Descarta a máscara em cache de um usuário (ou de todos)"""
+    with _lock:
+        if user_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(user_id, None)
+    if has_app_context():
+        per_request = g.get('_permissoes')
+        if per_request is not None:
+            if user_id is None:
+                per_request.clear()
+            else:
+                per_request.pop(user_id, None)
+
+
+def refresh_permission_mask(conn, user_id):
+    """Recalcula e grava users.permission_mask (na transação de quem chamou)"""
+    mask = _compute_from_db(conn, user_id)
+    conn.execute('UPDATE users SET permission_mask = ? WHERE id = ?', (mask, user_id))
+    invalidate_permissions(user_id)
+    return mask
+
+
+def rebuild_permission_masks(conn, only_missing=False):
+    """Recalcula a máscara de todos os usuários (ou só dos que ainda não têm)"""
+    query = 'SELECT id FROM users'
+    if only_missing:
+        query += ' WHERE permission_mask IS NULL'
+    user_ids = [row['id'] for row in conn.execute(query).fetchall()]
+    for user_id in user_ids:
+        refresh_permission_mask(conn, user_id)
+    conn.commit()
+    invalidate_permissions()
+    return len(user_ids)
@@ -0,0 +1,88 @@
+"""
+Rótulos das roles (tabela role_names)
+
+A tabela é minúscula e quase nunca muda: é lida inteira uma vez e mantida em memória,
+compartilhada entre as requisições. A rota editar_rotulo_role grava com set_role_label()
+e, depois do commit, incrementa a versão do cache com invalidate_role_labels(): o worker
+recarrega no próximo acesso e os outros após ROLE_LABELS_TTL segundos.
+"""
+import os
+import threading
+import time
+
+from database import get_db_connection
+
+CACHE_TTL = float(os.environ.get('ROLE_LABELS_TTL', '300'))
+
+# Valores padrão caso a role não exista na tabela
+DEFAULT_LABELS = {
+    'admin': 'Administrador',
+    'diretor': 'Diretor',
+    'supervisor': 'Supervisor',
+    'tech': 'Técnico',
+    'administrativo': 'Administrativo',
+    'user': 'Usuário',
+}
+
+_lock = threading.Lock()
+_version = 0
+_loaded = (-1, 0.0, {})  # (versão, expira_em, rótulos)
+
+
+def _load_labels():
+    """Lê role_names aceitando os dois esquemas (label ou o antigo display_name)"""
+    labels = dict(DEFAULT_LABELS)
+    conn = get_db_connection()
+    try:
+        rows = conn.execute('SELECT * FROM role_names').fetchall()
+    except Exception as e:
+        print(f"⚠️ role_names indisponível, usando rótulos padrão: {e}")
+        return labels
+    finally:
+        conn.close()
+    for row in rows:
+        label = row['label'] if 'label' in row else None
+        if not label and 'display_name' in row:
+            label = row['display_name']
+        if label:
+            labels[row['role_key']] = label
+    return labels
+
+
+def role_labels():
+    """Mapa role_key -> rótulo (recarregado após set_role_label ou TTL)"""
+    global _loaded
+    version, expires, labels = _loaded
+    now = time.monotonic()
+    if version == _version and expires > now:
+        return labels
+    with _lock:
+        version, expires, labels = _loaded
+        if version != _version or expires <= now:
+            current = _version
+            labels = _load_labels()
+            _loaded = (current, now + CACHE_TTL, labels)
+    return labels
+
+
+def role_label(role_key):
+    """Rótulo de exibição da role"""
+    return role_labels().get(role_key, role_key)
+
+
+def invalidate_role_labels():
+    """Força a recarga do cache no próximo acesso"""
+    global _version
+    with _lock:
+        _version += 1
+
+
+def set_role_label(conn, role_key, label):
+    """Grava o rótulo de uma role na transação de quem chamou.
+
+    Quem chamou deve chamar invalidate_role_labels() depois do commit: antes dele, uma
+    recarga concorrente leria o rótulo antigo e o guardaria com a versão nova até o TTL.
+    """
+    updated = conn.execute('UPDATE role_names SET label = ? WHERE role_key = ?', (label, role_key))
+    if not updated.rowcount:
+        conn.execute('INSERT INTO role_names (role_key, label) VALUES (?, ?)', (role_key, label))
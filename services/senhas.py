@@ -0,0 +1,199 @@
+"""
+Hash de senhas fora da thread da requisição e limite de tentativas de login
+
+O hash (scrypt/pbkdf2) é caro de propósito. Ele roda num executor com poucas threads
+(PASSWORD_HASH_WORKERS) e fila limitada (PASSWORD_HASH_QUEUE_MAX): numa rajada de logins
+o excesso é recusado com HashingBusyError em vez de ocupar todo o worker, e as rotas
+de chamados/chat continuam respondendo.
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', str(min(2, os.cpu_count() or 1))))
+HASH_QUEUE_MAX = int(os.environ.get('PASSWORD_HASH_QUEUE_MAX', '16'))  # em execução + aguardando
+HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', '10'))
+
+# Tentativas de login com falha permitidas por janela (por IP e por nome de usuário)
+LOGIN_WINDOW = float(os.environ.get('LOGIN_WINDOW_SECONDS', '300'))
+LOGIN_MAX_FAILURES_IP = int(os.environ.get('LOGIN_MAX_FAILURES_IP', '20'))
+LOGIN_MAX_FAILURES_USER = int(os.environ.get('LOGIN_MAX_FAILURES_USER', '5'))
+# Atrás de um proxy (Render) o IP do cliente vem do X-Forwarded-For
+TRUST_PROXY = os.environ.get(
+    'LOGIN_TRUST_PROXY', '1' if os.environ.get('FLASK_ENV') == 'production' else '0'
+) == '1'
+# Quantos proxies confiáveis acrescentam entradas ao X-Forwarded-For (contadas do fim)
+PROXY_HOPS = max(1, int(os.environ.get('LOGIN_PROXY_HOPS', '1')))
+
+
+class HashingBusyError(Exception):
+    """Fila de hashing cheia: a requisição deve ser recusada (503)"""
+
+
+class HashExecutor:
+    """Executor limitado para hash/verificação de senhas, com métricas de fila"""
+
+    def __init__(self, workers=HASH_WORKERS, queue_max=HASH_QUEUE_MAX, timeout=HASH_TIMEOUT):
+        self.workers = max(1, workers)
+        self.queue_max = max(self.workers, queue_max)
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pid = None
+        self._executor = None
+        self._depth = 0
+        self._stats = {'submitted': 0, 'rejected': 0, 'timeouts': 0, 'max_depth': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+
+    def _get_executor(self):
+        # Criado no primeiro uso (e de novo após o fork do gunicorn)
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._depth = 0
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='senhas')
+        return self._executor
+
+    def run(self, fn, *args):
+        with self._lock:
+            executor = self._get_executor()
+            if self._depth >= self.queue_max:
+                self._stats['rejected'] += 1
+                raise HashingBusyError('Muitas verificações de senha em andamento')
+            self._depth += 1
+            self._stats['submitted'] += 1
+            self._stats['max_depth'] = max(self._stats['max_depth'], self._depth)
+        started = time.perf_counter()
+        try:
+            future = executor.submit(fn, *args)
+        except BaseException:
+            self._release(started)
+            raise
+        # A vaga na fila só é liberada quando o hash termina na thread do executor,
+        # mesmo que a requisição tenha desistido de esperar
+        future.add_done_callback(lambda _: self._release(started))
+        try:
+            return future.result(self.timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self._stats['timeouts'] += 1
+            raise HashingBusyError('Verificação de senha demorou demais') from None
+
+    def _release(self, started):
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._depth -= 1
+            self._stats['total_ms'] += elapsed
+            self._stats['max_ms'] = max(self._stats['max_ms'], elapsed)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, depth=self._depth, workers=self.workers, queue_max=self.queue_max)
+        stats['avg_ms'] = stats['total_ms'] / stats['submitted'] if stats['submitted'] else 0.0
+        return stats
+
+
+_executor = HashExecutor()
+
+
+def hash_password(password):
+    """generate_password_hash no executor limitado"""
+    return _executor.run(generate_password_hash, password, HASH_METHOD)
+
+
+def verify_password(pwhash, password):
+    """check_password_hash no executor limitado"""
+    return _executor.run(check_password_hash, pwhash, password)
+
+
+def method_prefix(method):
+    """Prefixo que generate_password_hash grava para `method`, com os parâmetros padrão
+    completados como o Werkzeug faz (ex.: scrypt -> scrypt:32768:8:1), sem calcular hash"""
+    name, *args = method.split(':')
+    if name == 'scrypt' and not args:
+        args = ['32768', '8', '1']
+    elif name == 'pbkdf2':
+        args = (args or ['sha256'])[:2]
+        if len(args) == 1:
+            args.append(str(DEFAULT_PBKDF2_ITERATIONS))
+    return ':'.join([name] + args)
+
+
+# Calculado no import: needs_rehash roda no caminho do login e não pode ocupar o executor
+_current_method = method_prefix(HASH_METHOD)
+
+
+def needs_rehash(pwhash):
+    """O hash foi gerado com parâmetros diferentes dos atuais (PASSWORD_HASH_METHOD)?"""
+    return pwhash.split('$', 1)[0] != _current_method
+
+
+def hashing_stats():
+    """Métricas do executor de hashing deste worker"""
+    return _executor.stats()
+
+
+class LoginLimiter:
+    """Janela deslizante de falhas de login por IP e por nome de usuário (por worker)"""
+
+    def __init__(self, window=LOGIN_WINDOW, max_ip=LOGIN_MAX_FAILURES_IP, max_user=LOGIN_MAX_FAILURES_USER):
+        self.window = window
+        self.limits = {'ip': max_ip, 'user': max_user}
+        self._failures = {}  # (tipo, chave) -> deque de timestamps
+        self._lock = threading.Lock()
+
+    def _keys(self, ip, username):
+        return (('ip', ip), ('user', (username or '').strip().lower()))
+
+    def retry_after(self, ip, username):
+        """Segundos até poder tentar de novo (0 = liberado)"""
+        now = time.monotonic()
+        wait = 0.0
+        with self._lock:
+            for key in self._keys(ip, username):
+                failures = self._failures.get(key)
+                if not failures:
+                    continue
+                while failures and failures[0] <= now - self.window:
+                    failures.popleft()
+                if len(failures) >= self.limits[key[0]]:
+                    wait = max(wait, failures[0] + self.window - now)
+                elif not failures:
+                    del self._failures[key]
+        return int(wait) + 1 if wait else 0
+
+    def failure(self, ip, username):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._failures) > 10000:
+                self._prune(now)
+            for key in self._keys(ip, username):
+                self._failures.setdefault(key, deque()).append(now)
+
+    def _prune(self, now):
+        # Credential stuffing gera muitas chaves distintas: descarta as que já expiraram
+        for key, failures in list(self._failures.items()):
+            if not failures or failures[-1] <= now - self.window:
+                del self._failures[key]
+
+    def success(self, ip, username):
+        with self._lock:
+            self._failures.pop(('user', (username or '').strip().lower()), None)
+
+
+login_limiter = LoginLimiter()
+
+
+def client_ip(request):
+    """IP usado pelo limitador de login.
+
+    O início do X-Forwarded-For é escrito pelo cliente e pode ser trocado a cada tentativa:
+    vale a entrada que o proxy confiável acrescentou, a PROXY_HOPS-ésima a partir do fim.
+    """
+    if TRUST_PROXY:
+        route = request.access_route
+        if 'X-Forwarded-For' in request.headers and len(route) >= PROXY_HOPS:
+            return route[-PROXY_HOPS]
+    return request.remote_addr
@@ -0,0 +1,77 @@
+"""
+Claims do usuário guardadas na sessão (cookie assinado pelo Flask)
+
+No login a sessão recebe role, funcao_id, a máscara de permissões e o auth_version do
+usuário. A cada requisição validate_session() compara esse auth_version com o do banco,
+consultado no máximo uma vez a cada AUTH_VERSION_TTL segundos por usuário e worker;
+se mudou (role, função, permissões ou status alterados por um admin), as claims são
+recarregadas. As verificações de acesso leem só a sessão, sem tocar no banco.
+"""
+import os
+import threading
+import time
+
+from flask import g, session
+
+from database import get_db
+from services.permissoes import get_permission_mask, invalidate_permissions
+
+AUTH_VERSION_TTL = float(os.environ.get('AUTH_VERSION_TTL', '10'))
+
+_versions = {}  # user_id -> (expira_em, auth_version; None = inativo/removido)
+_lock = threading.Lock()
+
+
+def _current_version(user_id):
+    now = time.monotonic()
+    cached = _versions.get(user_id)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    row = get_db().execute(
+        'SELECT auth_version, is_active FROM users WHERE id = ?', (user_id,), prepared=True
+    ).fetchone()
+    version = row['auth_version'] if row is not None and row['is_active'] else None
+    if AUTH_VERSION_TTL > 0:
+        with _lock:
+            _versions[user_id] = (now + AUTH_VERSION_TTL, version)
+    return version
+
+
+def issue_claims(user):
+    """Grava na sessão as claims da linha de users (login ou recarga)"""
+    session['user_id'] = user['id']
+    session['username'] = user['username']
+    session['role'] = user['role']
+    session['funcao_id'] = user['funcao_id']
+    session['auth_version'] = user['auth_version']
+    invalidate_permissions(user['id'])
+    session['permission_mask'] = get_permission_mask(user['id'])
+
+
+def _refresh_claims(user_id):
+    user = get_db().execute(
+        'SELECT id, username, role, funcao_id, auth_version FROM users WHERE id = ?', (user_id,)
+    ).fetchone()
+    issue_claims(user)
+
+
+def validate_session():
+    """before_request: confere o auth_version da sessão e recarrega as claims se mudou"""
+    user_id = session.get('user_id')
+    if user_id is None:
+        return
+    version = _current_version(user_id)
+    if version is None:
+        # Usuário desativado ou removido: a sessão deixa de valer
+        session.clear()
+        return
+    if session.get('auth_version') != version or 'permission_mask' not in session:
+        _refresh_claims(user_id)
+    g._claims_ok = True
+
+
+def bump_auth_version(conn, user_id):
+    """Invalida as claims das sessões do usuário (na transação de quem chamou)"""
+    conn.execute('UPDATE users SET auth_version = auth_version + 1 WHERE id = ?', (user_id,))
+    with _lock:
+        _versions.pop(user_id, None)
@@ -0,0 +1,250 @@
+"""
+Prazos de SLA dos chamados e o agendador que marca os atrasados
+
+Cada chamado tem um prazo de resposta (sair de 'aberto' sem técnico) e um de resolução,
+contados da criação com as metas da prioridade/categoria (SLA_METAS). Os prazos são
+gravados na criação e recalculados quando a prioridade ou a categoria mudam; a coluna
+sla_estado guarda no_prazo, em_risco (SLA_RISCO do prazo já passou), violado ou cumprido.
+
+O agendador é uma thread por worker com um heap dos próximos instantes em que algum
+chamado muda de estado. Ele é montado no início a partir dos chamados pendentes (índice
+em sla_estado) e depois só lê os chamados que vencem e os criados desde a última busca
+(id > último visto, a cada SLA_NOVOS_SECONDS); a tabela inteira não é varrida.
+As edições avisam o agendador do próprio worker com agendar(); os outros workers
+corrigem o próprio heap quando o instante antigo vence e o chamado é relido.
+"""
+import heapq
+import json
+import os
+import threading
+import time
+from datetime import timedelta
+
+from database import get_db_connection
+from services.contadores import record_change
+from services.eventos import ENCERRADOS, record_events
+from timeutils import parse_datetime, utcnow
+
+# Metas em horas por prioridade; 'prioridade:categoria' sobrepõe para uma categoria.
+# Ex.: SLA_METAS='{"alta": {"resposta": 2, "resolucao": 8}, "critica:rede": {"resposta": 0.5, "resolucao": 2}}'
+METAS_PADRAO = {
+    'critica': {'resposta': 1, 'resolucao': 4},
+    'alta': {'resposta': 4, 'resolucao': 24},
+    'media': {'resposta': 8, 'resolucao': 72},
+    'baixa': {'resposta': 24, 'resolucao': 120},
+}
+METAS = dict(METAS_PADRAO, **json.loads(os.environ.get('SLA_METAS') or '{}'))
+RISCO = float(os.environ.get('SLA_RISCO', '0.8'))  # fração do prazo a partir da qual está em risco
+NOVOS_INTERVAL = float(os.environ.get('SLA_NOVOS_SECONDS', '30'))
+AGENDADOR_ATIVO = os.environ.get('SLA_AGENDADOR', '1') == '1'
+LOTE = 500  # chamados por transação do agendador
+
+ESTADOS = ('no_prazo', 'em_risco', 'violado', 'cumprido')
+PENDENTES = ('no_prazo', 'em_risco')
+
+COLUNAS = '''id, versao, criado_por, status, prioridade, categoria, atribuido_para, data_criacao,
+             data_resolucao, sla_resposta_em, sla_resolucao_em, sla_estado'''
+
+
+def meta(prioridade, categoria):
+    """(horas para resposta, horas para resolução) da prioridade/categoria"""
+    valores = METAS.get(f'{prioridade}:{categoria}') or METAS.get(prioridade) or METAS['media']
+    return valores['resposta'], valores['resolucao']
+
+
+def calcular_prazos(prioridade, categoria, criado_em):
+    """Colunas sla_resposta_em e sla_resolucao_em de um chamado criado em criado_em"""
+    criado_em = parse_datetime(criado_em) or utcnow()
+    resposta, resolucao = meta(prioridade, categoria)
+    return {
+        'sla_resposta_em': criado_em + timedelta(hours=resposta),
+        'sla_resolucao_em': criado_em + timedelta(hours=resolucao),
+    }
+
+
+def avaliar(chamado, agora=None, anterior=None):
+    """(sla_estado, próximo instante em que o estado pode mudar ou None).
+
+    anterior='violado' é mantido: um atraso não deixa de ter acontecido.
+    """
+    agora = agora or utcnow()
+    criado = parse_datetime(chamado['data_criacao']) or agora
+    resposta = parse_datetime(chamado['sla_resposta_em'])
+    resolucao = parse_datetime(chamado['sla_resolucao_em'])
+    violado = anterior == 'violado'
+
+    pendentes = []
+    if chamado['status'] in ENCERRADOS:
+        resolvido_em = parse_datetime(chamado['data_resolucao']) or agora
+        violado = violado or (resolucao is not None and resolvido_em > resolucao)
+    else:
+        if resolucao is not None:
+            pendentes.append(resolucao)
+        if resposta is not None and chamado['status'] == 'aberto' and not chamado['atribuido_para']:
+            pendentes.append(resposta)
+
+    if violado or any(prazo <= agora for prazo in pendentes):
+        return 'violado', None
+    if not pendentes:
+        return 'cumprido', None
+    riscos = [criado + (prazo - criado) * RISCO for prazo in pendentes]
+    if any(risco <= agora for risco in riscos):
+        return 'em_risco', min(pendentes)
+    return 'no_prazo', min(riscos)
+
+
+def alteracoes_sla(chamado, campos, agora=None):
+    """Colunas de SLA a gravar junto com a edição `campos` e o próximo instante a verificar"""
+    novo = dict(chamado)
+    novo.update(campos)
+    mudancas = {}
+    recalcular = novo['prioridade'] != chamado['prioridade'] or novo['categoria'] != chamado['categoria']
+    if recalcular or chamado['sla_resolucao_em'] is None:
+        mudancas.update(calcular_prazos(novo['prioridade'], novo['categoria'], chamado['data_criacao']))
+        novo.update(mudancas)
+    # Com prazos novos o estado é recalculado do zero (pode deixar de estar violado)
+    estado, proximo = avaliar(novo, agora, anterior=None if recalcular else chamado['sla_estado'])
+    if estado != chamado['sla_estado']:
+        mudancas['sla_estado'] = estado
+    return mudancas, proximo
+
+
+class AgendadorSLA:
+    """Heap (instante, chamado_id) dos próximos vencimentos, processado por uma thread"""
+
+    def __init__(self, novos_interval=NOVOS_INTERVAL):
+        self.novos_interval = novos_interval
+        self._cond = threading.Condition()
+        self._pid = None
+        self._heap = []
+        self._proximo = {}  # chamado_id -> instante válido (entradas antigas no heap são ignoradas)
+        self._ultimo_id = None  # None = heap ainda não montado
+
+    def iniciar(self):
+        """before_request: sobe a thread deste worker (uma vez por processo)"""
+        if not AGENDADOR_ATIVO or self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._heap, self._proximo, self._ultimo_id = [], {}, None
+            threading.Thread(target=self._run, name='sla', daemon=True).start()
+
+    def agendar(self, chamado_id, instante):
+        """Próxima verificação do chamado (None = nada pendente)"""
+        if self._pid != os.getpid():
+            return  # sem thread neste processo: ela lê o banco quando subir
+        with self._cond:
+            if instante is None:
+                self._proximo.pop(chamado_id, None)
+                return
+            self._proximo[chamado_id] = instante
+            heapq.heappush(self._heap, (instante, chamado_id))
+            self._cond.notify()
+
+    def _vencidos(self):
+        """Espera o próximo vencimento; devolve os ids vencidos ([] = hora de buscar novos)"""
+        limite = time.monotonic() + self.novos_interval
+        with self._cond:
+            while True:
+                agora = utcnow()
+                ids = []
+                while self._heap and self._heap[0][0] <= agora:
+                    instante, chamado_id = heapq.heappop(self._heap)
+                    if self._proximo.get(chamado_id) == instante:
+                        del self._proximo[chamado_id]
+                        ids.append(chamado_id)
+                if ids:
+                    return ids
+                espera = limite - time.monotonic()
+                if self._heap:
+                    espera = min(espera, (self._heap[0][0] - agora).total_seconds())
+                if espera <= 0:
+                    return []
+                self._cond.wait(espera)
+
+    def _run(self):
+        ids = []
+        while True:
+            try:
+                conn = get_db_connection()
+                try:
+                    if ids:
+                        self._verificar(conn, ids)
+                    else:
+                        self._carregar(conn)
+                finally:
+                    conn.close()
+            except Exception as e:
+                print(f"⚠️ Erro no agendador de SLA: {e}")
+                for chamado_id in ids:
+                    self.agendar(chamado_id, utcnow() + timedelta(seconds=self.novos_interval))
+            ids = self._vencidos()
+
+    def _carregar(self, conn):
+        """Na subida, os chamados pendentes; depois, só os criados desde a última busca"""
+        if self._ultimo_id is None:
+            topo = conn.execute('SELECT MAX(id) FROM chamados').fetchone()[0] or 0
+            rows = conn.execute(
+                f'SELECT {COLUNAS} FROM chamados WHERE sla_estado IN (?, ?) AND id <= ?',
+                PENDENTES + (topo,)
+            ).fetchall()
+            print(f"⏱️ Agendador de SLA: {len(rows)} chamado(s) pendente(s) carregado(s)")
+        else:
+            topo = self._ultimo_id
+            rows = conn.execute(f'SELECT {COLUNAS} FROM chamados WHERE id > ?',
+                                (self._ultimo_id,), prepared=True).fetchall()
+        agora = utcnow()
+        if rows:
+            topo = max(topo, max(row['id'] for row in rows))
+        self._aplicar_lote(conn, [row for row in rows if row['sla_estado'] in PENDENTES], agora)
+        self._ultimo_id = topo
+
+    def _verificar(self, conn, ids):
+        for inicio in range(0, len(ids), LOTE):
+            lote = ids[inicio:inicio + LOTE]
+            placeholders = ', '.join('?' * len(lote))
+            rows = conn.execute(f'SELECT {COLUNAS} FROM chamados WHERE id IN ({placeholders})', lote).fetchall()
+            self._aplicar_lote(conn, rows, utcnow())
+
+    def _aplicar_lote(self, conn, rows, agora):
+        # Commit a cada LOTE chamados: depois de muito tempo parado (muitos vencidos de uma
+        # vez) a escrita não segura o banco por segundos; agenda só o que foi gravado
+        for inicio in range(0, len(rows), LOTE):
+            proximos = [(row['id'], self._aplicar(conn, row, agora)) for row in rows[inicio:inicio + LOTE]]
+            conn.commit()
+            for chamado_id, instante in proximos:
+                self.agendar(chamado_id, instante)
+
+    def _aplicar(self, conn, row, agora):
+        """Grava o estado novo do chamado, se mudou (o commit é de quem chamou).
+
+        Retorna o próximo instante a verificar.
+        """
+        mudancas, proximo = alteracoes_sla(row, {}, agora)
+        if not mudancas:
+            return proximo
+        sets = [f'{campo} = ?' for campo in mudancas]
+        if 'sla_estado' in mudancas:
+            sets.append('versao = versao + 1')
+        cursor = conn.execute(
+            f'UPDATE chamados SET {", ".join(sets)} WHERE id = ? AND versao = ?',
+            list(mudancas.values()) + [row['id'], row['versao']]
+        )
+        if cursor.rowcount != 1:
+            return agora  # editado nesse meio tempo: relê na próxima volta
+        if 'sla_estado' in mudancas:
+            after = dict(row)
+            after.update(mudancas)
+            record_change(conn, before=row, after=after)
+            record_events(conn, None, before=row, after=after, acao='sla')
+        return proximo
+
+
+agendador_sla = AgendadorSLA()
+
+
+def iniciar_agendador():
+    """before_request: agendador de SLA deste worker"""
+    agendador_sla.iniciar()
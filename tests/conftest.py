@@ -0,0 +1,73 @@
+"""
+Configuração comum dos testes (python -m pytest na raiz do projeto)
+
+Os testes rodam em SQLite, num banco temporário: database.DATABASE é trocado antes de
+qualquer conexão ser aberta (o pool só conecta no primeiro uso), então o
+chamados_ti.db versionado nunca é tocado.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Sem threads de fundo durante os testes
+os.environ.setdefault('SLA_AGENDADOR', '0')
+os.environ.setdefault('CONTADORES_RECONCILE_SECONDS', '0')
+
+import database  # noqa: E402
+
+if database.USE_POSTGRES:
+    collect_ignore_glob = ['test_*.py']  # os testes usam um arquivo SQLite temporário
+
+
+@pytest.fixture
+def sqlite_path(tmp_path, monkeypatch):
+    """Arquivo SQLite temporário usado por database._connect() e por um pool novo"""
+    path = str(tmp_path / 'teste.db')
+    monkeypatch.setattr(database, 'DATABASE', path)
+    monkeypatch.setattr(database, '_pool', database.ConnectionPool(database._connect))
+    return path
+
+
+@pytest.fixture
+def app(sqlite_path):
+    """Aplicação sobre um banco novo, com as migrações aplicadas e os caches por worker zerados"""
+    import app as app_module
+    from services import permissoes, roles, sessao
+
+    app_module.init_db()
+    # Os caches são por processo e indexados por user_id, que se repete entre os bancos
+    permissoes.invalidate_permissions()
+    roles.invalidate_role_labels()
+    sessao._versions.clear()
+    app_module._contagens.clear()
+    app_module.app.config.update(TESTING=True)
+    return app_module.app
+
+
+def criar_usuario(username, role='user', senha='senha123', permissoes=()):
+    """Usuário ativo com as permissões granulares dadas; retorna o id"""
+    from werkzeug.security import generate_password_hash
+    from services.permissoes import refresh_permission_mask
+
+    conn = database.get_db_connection()
+    try:
+        user_id = conn.execute(
+            'INSERT INTO users (username, email, password_hash, role, is_active) VALUES (?, ?, ?, ?, 1)',
+            (username, f'{username}@teste.local', generate_password_hash(senha, 'pbkdf2:sha256:1000'), role)
+        ).lastrowid
+        for key in permissoes:
+            conn.execute('INSERT INTO user_permissions (user_id, permission_key, enabled) VALUES (?, ?, 1)',
+                         (user_id, key))
+        refresh_permission_mask(conn, user_id)
+        conn.commit()
+    finally:
+        conn.close()
+    return user_id
+
+
+def login(client, username, senha='senha123'):
+    response = client.post('/login', data={'username': username, 'password': senha})
+    assert response.status_code == 302, response.data[-300:]
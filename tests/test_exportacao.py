@@ -0,0 +1,98 @@
+"""
+Exportação de chamados em streaming (/chamados/exportar)
+
+O corpo sai em pedaços de até EXPORTAR_BLOCO conforme as linhas são lidas: a resposta
+nunca é montada inteira, e a memória usada durante o download não cresce com a tabela.
+"""
+import csv
+import io
+import json
+import sqlite3
+import tracemalloc
+
+import pytest
+
+from conftest import criar_usuario, login
+
+LINHAS = 5_000
+FOLGA_LINHA = 2048  # uma linha exportada cabe com folga nisso
+FOLGA_PICO = 512 * 1024  # variação aceita no pico de memória entre os dois tamanhos
+
+
+def semear(sqlite_path, inicio, fim):
+    """Chamados inicio..fim-1 (~500 bytes por linha no CSV); 1 em cada 100 é da maria"""
+    conn = sqlite3.connect(sqlite_path)
+    admin, maria = (conn.execute('SELECT id FROM users WHERE username = ?', (nome,)).fetchone()[0]
+                    for nome in ('admin', 'maria'))
+    conn.executemany('''
+        INSERT INTO chamados (titulo, descricao, status, prioridade, categoria, criado_por, data_criacao)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [(f'Chamado {i} ' + 'x' * 400, 'descrição', ('aberto', 'fechado')[i % 2], 'media', 'Rede',
+           maria if i % 100 == 0 else admin, '2024-01-01 00:00:00') for i in range(inicio, fim)])
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def client(app, sqlite_path):
+    criar_usuario('admin', role='admin')
+    criar_usuario('maria')
+    semear(sqlite_path, 0, LINHAS)
+    return app.test_client()
+
+
+def exportar(client):
+    """Lê /chamados/exportar pedaço a pedaço; retorna (linhas, bytes, pedaços, pico de memória)"""
+    from app import EXPORTAR_BLOCO
+
+    response = client.get('/chamados/exportar?formato=csv', buffered=False)
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.headers.get('Content-Length') is None
+
+    pedacos_iter = iter(response.response)
+    cabecalho = next(pedacos_iter)
+    assert cabecalho.startswith('\ufeffid,titulo'.encode())
+    tracemalloc.start()  # depois do cabeçalho: mede só a leitura das linhas
+    try:
+        total = pedacos = linhas = 0
+        for pedaco in pedacos_iter:
+            assert len(pedaco) <= EXPORTAR_BLOCO + FOLGA_LINHA  # linhas só com ASCII: 1 byte por caractere
+            total += len(pedaco)
+            pedacos += 1
+            linhas += pedaco.count(b'\r\n')
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        response.close()
+    assert pedacos >= total // (EXPORTAR_BLOCO + FOLGA_LINHA)
+    return linhas, total, pedacos, pico
+
+
+def test_exportacao_em_streaming_com_memoria_constante(client, sqlite_path):
+    login(client, 'admin')
+    linhas, total, _, pico = exportar(client)
+    assert linhas == LINHAS
+
+    semear(sqlite_path, LINHAS, 4 * LINHAS)
+    linhas_4x, total_4x, _, pico_4x = exportar(client)
+    assert linhas_4x == 4 * LINHAS
+    assert total_4x > 3.5 * total
+    # O pico é o de um lote de linhas e alguns pedaços: não acompanha o tamanho da tabela
+    assert pico_4x < pico + FOLGA_PICO, (pico, pico_4x)
+    assert pico_4x < total_4x / 8, (pico_4x, total_4x)
+
+
+def test_exportacao_respeita_filtros_e_visibilidade(client):
+    login(client, 'maria')
+    response = client.get('/chamados/exportar?formato=jsonl&status=aberto')
+    assert response.mimetype == 'application/x-ndjson'
+    registros = [json.loads(linha) for linha in response.get_data(as_text=True).splitlines()]
+    assert registros
+    assert all(r['criador'] == 'maria' and r['status'] == 'aberto' for r in registros)
+    assert len(registros) == len(range(0, LINHAS, 100))  # i % 100 == 0 é sempre par: aberto
+
+    response = client.get('/chamados/exportar?formato=csv&status=fechado')
+    assert list(csv.DictReader(io.StringIO(response.get_data(as_text=True).lstrip('\ufeff')))) == []
+
+    assert client.get('/chamados/exportar?formato=xml').status_code == 302
@@ -0,0 +1,123 @@
+"""
+Fila de escrita do SQLite (SQLITE_WRITE_QUEUE): transação de cada conexão
+
+Sem leitura no meio, as escritas até o commit vão juntas no group commit. Uma leitura (ou
+rowcount/lastrowid) depois de escrever abre a transação na thread escritora: a conexão
+lê o que escreveu, ninguém mais vê antes do commit e rollback() desfaz tudo.
+"""
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import database
+
+
+@pytest.fixture
+def fila(sqlite_path, monkeypatch):
+    monkeypatch.setattr(database, 'SQLITE_PRAGMAS', database.SQLITE_PROFILES['production'])
+    conn = database._connect()
+    conn.execute('CREATE TABLE itens (id INTEGER PRIMARY KEY, nome TEXT UNIQUE)')
+    conn.commit()
+    conn.close()
+    fila = database.WriteQueue(database._connect)
+    monkeypatch.setattr(database, '_write_queue', fila)
+    return fila
+
+
+def contar(sqlite_path):
+    """Linhas gravadas, vistas de fora (outra conexão, sem o pool)"""
+    conn = sqlite3.connect(sqlite_path)
+    try:
+        return conn.execute('SELECT COUNT(*) FROM itens').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_rollback_desfaz_escrita_lida_antes(fila, sqlite_path):
+    conn = database.get_db_connection()
+    conn.execute("INSERT INTO itens (nome) VALUES ('a')")
+    assert conn.execute('SELECT COUNT(*) FROM itens').fetchone()[0] == 1  # lê a própria escrita
+    assert contar(sqlite_path) == 0  # ainda sem commit
+    conn.rollback()
+    conn.close()
+    assert contar(sqlite_path) == 0
+
+
+def test_rowcount_nao_grava_antes_do_commit(fila, sqlite_path):
+    conn = database.get_db_connection()
+    cursor = conn.execute("INSERT INTO itens (nome) VALUES ('a')")
+    assert cursor.rowcount == 1 and cursor.lastrowid == 1
+    conn.execute("UPDATE itens SET nome = 'b' WHERE id = ?", (cursor.lastrowid,))
+    assert contar(sqlite_path) == 0
+    conn.rollback()
+    assert contar(sqlite_path) == 0
+
+    cursor = conn.execute("INSERT INTO itens (nome) VALUES ('c')")
+    assert cursor.rowcount == 1
+    conn.execute("INSERT INTO itens (nome) VALUES ('d')")
+    conn.commit()
+    conn.close()
+    assert contar(sqlite_path) == 2
+
+
+def test_erro_no_meio_nao_encerra_a_transacao(fila, sqlite_path):
+    conn = database.get_db_connection()
+    conn.execute("INSERT INTO itens (nome) VALUES ('a')")
+    conn.execute('SELECT 1').fetchone()
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO itens (nome) VALUES ('a')")
+    conn.execute("INSERT INTO itens (nome) VALUES ('b')")
+    conn.commit()
+    conn.close()
+    assert contar(sqlite_path) == 2
+
+
+def test_release_sem_commit_descarta_e_libera_a_fila(fila, sqlite_path):
+    conn = database.get_db_connection()
+    conn.execute("INSERT INTO itens (nome) VALUES ('a')")
+    conn.execute('SELECT 1').fetchone()
+    conn.release()
+
+    conn = database.get_db_connection()
+    conn.execute("INSERT INTO itens (nome) VALUES ('b')")
+    conn.commit()
+    conn.close()
+    assert contar(sqlite_path) == 1
+
+
+def test_escritas_sem_leitura_continuam_no_group_commit(fila, sqlite_path):
+    def escrever(i):
+        conn = database.get_db_connection()
+        conn.execute('INSERT INTO itens (nome) VALUES (?)', (f'item {i}',))
+        conn.commit()
+        conn.close()
+
+    threads = [threading.Thread(target=escrever, args=(i,)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert contar(sqlite_path) == 20
+    stats = fila.stats()
+    assert stats['units'] == 20 and stats['transactions'] == 0
+
+
+def test_transacao_ociosa_e_desfeita(fila, sqlite_path, monkeypatch):
+    monkeypatch.setattr(database, 'WRITE_QUEUE_IDLE_TIMEOUT', 0.2)
+    esquecida = database.get_db_connection()
+    esquecida.execute("INSERT INTO itens (nome) VALUES ('a')")
+    esquecida.execute('SELECT 1').fetchone()
+    time.sleep(0.5)
+
+    conn = database.get_db_connection()
+    conn.execute("INSERT INTO itens (nome) VALUES ('b')")
+    conn.commit()  # não fica preso atrás da transação esquecida
+    conn.close()
+    with pytest.raises(database.TransactionTimeoutError):
+        esquecida.execute('SELECT 1')
+    esquecida.rollback()
+    esquecida.close()
+    assert contar(sqlite_path) == 1
+    assert fila.stats()['expired_transactions'] == 1
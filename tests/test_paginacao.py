@@ -0,0 +1,71 @@
+"""
+Listagem por cursor: as páginas seguintes reaproveitam o total contado na primeira
+"""
+import sqlite3
+
+import pytest
+
+from conftest import criar_usuario, login
+from database import request_query_stats
+
+LINHAS = 120
+
+
+def contagens():
+    """COUNTs da listagem executados na última requisição"""
+    stats = request_query_stats()
+    assert stats is not None
+    return sum(count for sql, (count, _) in stats.shapes.items() if 'SELECT COUNT(*) FROM (SELECT 1' in sql)
+
+
+@pytest.fixture
+def client(app, sqlite_path):
+    admin = criar_usuario('admin', role='admin')
+    conn = sqlite3.connect(sqlite_path)
+    conn.executemany('''
+        INSERT INTO chamados (titulo, descricao, status, prioridade, categoria, criado_por, data_criacao)
+        VALUES (?, ?, ?, 'media', 'Rede', ?, ?)
+    ''', [(f'Chamado {i}', 'descrição', ('aberto', 'fechado')[i % 2], admin,
+           '2024-01-01 00:%02d:%02d' % (i // 60, i % 60)) for i in range(LINHAS)])
+    conn.commit()
+    conn.close()
+    client = app.test_client()
+    login(client, 'admin')
+    return client
+
+
+def pagina(client, url):
+    with client:
+        dados = client.get(url).get_json()
+        return dados, contagens()
+
+
+def test_paginas_por_cursor_nao_recontam(client, monkeypatch):
+    import app as app_module
+
+    primeira, n = pagina(client, '/api/chamados?per_page=20')
+    assert (primeira['total'], n) == (LINHAS, 1)
+
+    segunda, n = pagina(client, '/api/chamados?per_page=20&after=' + primeira['next_cursor'])
+    assert (segunda['total'], n) == (LINHAS, 0)
+    _, n = pagina(client, '/api/chamados?per_page=20&before=' + segunda['prev_cursor'])
+    assert n == 0
+
+    # Outro conjunto de filtros tem o seu próprio total
+    filtrada, n = pagina(client, '/api/chamados?per_page=20&status=aberto')
+    assert (filtrada['total'], n) == (LINHAS // 2, 1)
+    _, n = pagina(client, '/api/chamados?per_page=20&status=aberto&after=' + filtrada['next_cursor'])
+    assert n == 0
+
+    # Expirado o TTL, a página seguinte volta a contar
+    monkeypatch.setattr(app_module, 'CHAMADOS_COUNT_TTL', 0)
+    app_module._contagens.clear()
+    _, n = pagina(client, '/api/chamados?per_page=20&after=' + primeira['next_cursor'])
+    assert n == 1
+
+
+def test_primeira_pagina_sempre_conta(client):
+    _, n = pagina(client, '/api/chamados?per_page=20')
+    assert n == 1
+    _, n = pagina(client, '/api/chamados?per_page=20')
+    assert n == 1
@@ -0,0 +1,74 @@
+"""
+Permissões por requisição: no máximo uma query de permissões por página
+
+Uma página que renderiza base.html inteira (menu com can_access_* e is_*) não pode
+consultar as permissões do usuário mais de uma vez, nem com todos os caches frios.
+"""
+import pytest
+
+from conftest import criar_usuario, login
+from database import request_query_stats
+from services import permissoes, sessao
+
+
+def consultas_de_permissao():
+    """Queries da última requisição que leem permissões (user_permissions ou a máscara)"""
+    stats = request_query_stats()
+    assert stats is not None
+    return sum(count for sql, (count, _) in stats.shapes.items()
+               if 'user_permissions' in sql or 'permission_mask' in sql)
+
+
+def test_user_permissions_nao_concede_area_nem_perfil():
+    mask = permissoes.compute_mask('user', None, ['view_chamados', 'perfil_admin', 'area_funcoes', 'x'])
+    assert mask == permissoes.compute_mask('user', None, ['view_chamados'])
+    assert not mask & permissoes.bit('perfil_admin')
+    assert not mask & permissoes.bit('area_funcoes')
+
+
+@pytest.fixture
+def client(app):
+    criar_usuario('admin', role='admin')
+    criar_usuario('maria', permissoes=('view_chamados', 'create_chamados', 'access_chat'))
+    return app.test_client()
+
+
+@pytest.mark.parametrize('username', ['admin', 'maria'])
+def test_pagina_completa_faz_no_maximo_uma_query_de_permissoes(client, username):
+    login(client, username)
+    with client:
+        response = client.get('/dashboard')
+        assert response.status_code == 200
+        assert b'navbar' in response.data  # base.html renderizado
+        assert consultas_de_permissao() <= 1
+
+    # Caches frios (outro worker, TTL vencido): ainda uma query no máximo
+    permissoes.invalidate_permissions()
+    sessao._versions.clear()
+    with client:
+        with client.session_transaction() as s:
+            s.pop('permission_mask')
+        assert client.get('/dashboard').status_code == 200
+        assert consultas_de_permissao() <= 1
+
+
+def test_editar_usuario_invalida_as_permissoes(client):
+    joana = criar_usuario('joana', permissoes=('view_chamados',))
+    login(client, 'joana')
+    with client:
+        client.get('/dashboard')
+        assert not permissoes.current_user_can('access_chat')
+
+    admin = client.application.test_client()
+    login(admin, 'admin')
+    response = admin.post(f'/configuracoes/usuarios/{joana}/editar', data={
+        'username': 'joana', 'email': 'joana@teste.local', 'role': 'user',
+        'permission_view_chamados': '1', 'permission_access_chat': '1',
+    })
+    assert response.status_code == 302
+
+    sessao._versions.clear()  # o TTL do auth_version (AUTH_VERSION_TTL) venceria
+    with client:
+        client.get('/dashboard')
+        assert permissoes.current_user_can('access_chat')
+        assert consultas_de_permissao() <= 1
@@ -0,0 +1,56 @@
+"""
+Rótulos das roles: a edição pelo administrador aparece na próxima requisição do worker,
+sem esperar o ROLE_LABELS_TTL
+"""
+import pytest
+
+import database
+from conftest import criar_usuario, login
+from services import roles
+
+
+@pytest.fixture
+def client(app):
+    criar_usuario('admin', role='admin')
+    criar_usuario('maria')
+    return app.test_client()
+
+
+def test_editar_rotulo_recarrega_o_cache(client, monkeypatch):
+    monkeypatch.setattr(roles, 'CACHE_TTL', 3600)
+    login(client, 'admin')
+    assert 'Técnico' in client.get('/configuracoes/usuarios').get_data(as_text=True)
+
+    response = client.post('/configuracoes/roles/tech/rotulo', data={'label': 'Suporte N1'})
+    assert response.status_code == 302
+    assert roles.role_label('tech') == 'Suporte N1'
+    assert 'Suporte N1' in client.get('/configuracoes/usuarios').get_data(as_text=True)
+
+
+def test_editar_rotulo_exige_admin_e_role_valida(client):
+    login(client, 'maria')
+    client.post('/configuracoes/roles/tech/rotulo', data={'label': 'X'})
+    assert roles.role_label('tech') == 'Técnico'
+
+    client.get('/logout')
+    login(client, 'admin')
+    client.post('/configuracoes/roles/inexistente/rotulo', data={'label': 'X'})
+    client.post('/configuracoes/roles/tech/rotulo', data={'label': '   '})
+    assert 'inexistente' not in roles.role_labels()
+    assert roles.role_label('tech') == 'Técnico'
+
+
+
+def test_recarga_concorrente_antes_do_commit_nao_guarda_o_rotulo_antigo(client, monkeypatch):
+    monkeypatch.setattr(roles, 'CACHE_TTL', 3600)
+    commit = database.DatabaseConnection.commit
+
+    def commit_com_recarga(self):
+        # Outra requisição recarrega o cache entre a gravação e o commit
+        roles.role_labels()
+        commit(self)
+
+    login(client, 'admin')
+    monkeypatch.setattr(database.DatabaseConnection, 'commit', commit_com_recarga)
+    client.post('/configuracoes/roles/tech/rotulo', data={'label': 'Suporte N1'})
+    assert roles.role_label('tech') == 'Suporte N1'
@@ -0,0 +1,74 @@
+"""
+Senhas: executor de hashing limitado e limite de tentativas de login
+"""
+import threading
+import time
+
+import pytest
+from werkzeug.test import EnvironBuilder
+
+from services import senhas
+
+
+def requisicao(xff=None, remote='10.0.0.1'):
+    headers = {'X-Forwarded-For': xff} if xff else {}
+    return EnvironBuilder(headers=headers, environ_base={'REMOTE_ADDR': remote}).get_request()
+
+
+def test_client_ip_ignora_entradas_forjadas_no_x_forwarded_for(monkeypatch):
+    monkeypatch.setattr(senhas, 'TRUST_PROXY', True)
+    monkeypatch.setattr(senhas, 'PROXY_HOPS', 1)
+    # O cliente manda um IP falso diferente a cada tentativa; o proxy acrescenta o real
+    assert senhas.client_ip(requisicao('1.1.1.1, 203.0.113.7')) == '203.0.113.7'
+    assert senhas.client_ip(requisicao('2.2.2.2, 203.0.113.7')) == '203.0.113.7'
+    assert senhas.client_ip(requisicao('203.0.113.7')) == '203.0.113.7'
+    assert senhas.client_ip(requisicao()) == '10.0.0.1'
+
+    monkeypatch.setattr(senhas, 'PROXY_HOPS', 2)
+    assert senhas.client_ip(requisicao('1.1.1.1, 203.0.113.7, 10.1.1.1')) == '203.0.113.7'
+    assert senhas.client_ip(requisicao('203.0.113.7')) == '10.0.0.1'
+
+
+def test_client_ip_sem_proxy_usa_o_endereco_da_conexao(monkeypatch):
+    monkeypatch.setattr(senhas, 'TRUST_PROXY', False)
+    assert senhas.client_ip(requisicao('1.1.1.1')) == '10.0.0.1'
+
+
+def test_hash_lento_vira_hashing_busy_e_segura_a_vaga_ate_terminar():
+    executor = senhas.HashExecutor(workers=1, queue_max=1, timeout=0.1)
+    liberar = threading.Event()
+
+    with pytest.raises(senhas.HashingBusyError):
+        executor.run(liberar.wait, 5)
+    # A requisição desistiu, mas o hash continua na thread: a fila segue cheia
+    assert executor.stats()['depth'] == 1
+    with pytest.raises(senhas.HashingBusyError):
+        executor.run(time.sleep, 0)
+    assert executor.stats()['rejected'] == 1
+
+    liberar.set()
+    for _ in range(100):
+        if not executor.stats()['depth']:
+            break
+        time.sleep(0.01)
+    assert executor.run(sum, (1, 2)) == 3
+    stats = executor.stats()
+    assert (stats['depth'], stats['timeouts'], stats['submitted']) == (0, 1, 2)
+
+
+@pytest.mark.parametrize('method', ['scrypt', 'scrypt:16384:8:1', 'pbkdf2', 'pbkdf2:sha512', 'pbkdf2:sha256:1000'])
+def test_method_prefix_igual_ao_gravado_pelo_werkzeug(method):
+    from werkzeug.security import generate_password_hash
+
+    assert generate_password_hash('x', method).split('$', 1)[0] == senhas.method_prefix(method)
+
+
+def test_needs_rehash_nao_usa_o_executor(monkeypatch):
+    def proibido(*args):
+        raise AssertionError('needs_rehash não deve calcular hash')
+
+    monkeypatch.setattr(senhas._executor, 'run', proibido)
+    atual = senhas.method_prefix(senhas.HASH_METHOD)
+    assert not senhas.needs_rehash(atual + '$salt$hash')
+    antigo = 'pbkdf2:sha256:1000' if atual != 'pbkdf2:sha256:1000' else 'scrypt:32768:8:1'
+    assert senhas.needs_rehash(antigo + '$salt$hash')
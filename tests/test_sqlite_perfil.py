@@ -0,0 +1,102 @@
+"""
+Perfil SQLite de produção: WAL, pragmas e espera por lock
+
+Um escritor segura uma transação aberta enquanto leitores consultam a mesma tabela. No
+perfil production (WAL) as leituras respondem na hora, com o snapshot anterior ao
+commit; no perfil default (journal de rollback) o lock exclusivo do commit para os leitores.
+"""
+import threading
+import time
+
+import pytest
+
+import database
+
+SEGURA = 0.5  # segundos com a transação de escrita aberta
+
+
+def conectar(monkeypatch, perfil):
+    monkeypatch.setattr(database, 'SQLITE_PRAGMAS', database.SQLITE_PROFILES[perfil])
+    return database._connect()
+
+
+@pytest.fixture
+def tabela(sqlite_path, monkeypatch):
+    conn = conectar(monkeypatch, 'production')
+    conn.execute('CREATE TABLE itens (id INTEGER PRIMARY KEY, nome TEXT)')
+    conn.executemany('INSERT INTO itens (nome) VALUES (?)', [('a',), ('b',)])
+    conn.commit()
+    conn.close()
+
+
+def escrever_segurando(conn, pronto, inicio='BEGIN EXCLUSIVE'):
+    """Abre a transação, insere, avisa `pronto` e só faz o commit depois de SEGURA"""
+    conn.isolation_level = None
+    conn.execute(inicio)
+    conn.execute("INSERT INTO itens (nome) VALUES ('novo')")
+    pronto.set()
+    time.sleep(SEGURA)
+    conn.execute('COMMIT')
+
+
+def ler_durante_escrita(monkeypatch, perfil):
+    """(maior latência de leitura, contagens vistas) com o escritor segurando o lock"""
+    escritor = conectar(monkeypatch, perfil)
+    leitor = conectar(monkeypatch, perfil)
+    pronto = threading.Event()
+    thread = threading.Thread(target=escrever_segurando, args=(escritor, pronto))
+    thread.start()
+    pronto.wait()
+    latencias, contagens = [], set()
+    fim = time.monotonic() + SEGURA / 2
+    while time.monotonic() < fim:
+        inicio = time.monotonic()
+        contagens.add(leitor.execute('SELECT COUNT(*) FROM itens').fetchone()[0])
+        leitor.rollback()  # fecha a transação de leitura (novo snapshot a cada volta)
+        latencias.append(time.monotonic() - inicio)
+    thread.join()
+    escritor.close()
+    leitor.close()
+    return max(latencias), contagens
+
+
+def test_pragmas_do_perfil_production(sqlite_path, monkeypatch):
+    conn = conectar(monkeypatch, 'production')
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+    assert conn.execute('PRAGMA foreign_keys').fetchone()[0] == 1
+    assert conn.execute('PRAGMA busy_timeout').fetchone()[0] == 5000
+    conn.close()
+
+
+def test_leitores_nao_esperam_o_escritor_no_wal(tabela, monkeypatch):
+    maior, contagens = ler_durante_escrita(monkeypatch, 'production')
+    assert maior < SEGURA / 5
+    assert contagens == {2}  # snapshot de antes do commit
+
+
+def test_sem_wal_leitores_esperam_o_commit(tabela, monkeypatch):
+    monkeypatch.setattr(database, 'SQLITE_PRAGMAS', database.SQLITE_PROFILES['production'])
+    conn = database._connect()
+    conn.execute('PRAGMA journal_mode = DELETE')  # o banco volta ao journal de rollback
+    conn.close()
+    maior, contagens = ler_durante_escrita(monkeypatch, 'default')
+    assert maior >= SEGURA / 2
+    assert 3 in contagens  # a leitura só voltou depois do commit
+
+
+def test_segundo_escritor_espera_em_vez_de_falhar(tabela, monkeypatch):
+    primeiro = conectar(monkeypatch, 'production')
+    segundo = conectar(monkeypatch, 'production')
+    pronto = threading.Event()
+    thread = threading.Thread(target=escrever_segurando, args=(primeiro, pronto, 'BEGIN IMMEDIATE'))
+    thread.start()
+    pronto.wait()
+    inicio = time.monotonic()
+    segundo.execute("INSERT INTO itens (nome) VALUES ('segundo')")  # busy_timeout: espera o lock
+    segundo.commit()
+    assert time.monotonic() - inicio >= SEGURA / 2
+    thread.join()
+    assert segundo.execute('SELECT COUNT(*) FROM itens').fetchone()[0] == 4
+    primeiro.close()
+    segundo.close()
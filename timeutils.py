@@ -0,0 +1,82 @@
+"""
+Datas do banco: um único parser e o formato canônico de gravação
+
+Todas as datas são gravadas em UTC e sem fuso: TIMESTAMP no PostgreSQL (a sessão usa
+timezone=UTC) e texto 'YYYY-MM-DD HH:MM:SS' no SQLite, que o conversor registrado em
+database.py já devolve como datetime. parse_datetime() fica para valores que ainda
+chegam como texto (formulários, dados antigos); o resultado é memoizado por texto.
+"""
+from datetime import date, datetime, timezone
+from functools import lru_cache
+
+DB_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Formatos aceitos além de ISO 8601 (dados digitados/importados à mão)
+LEGACY_FORMATS = ('%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y')
+
+
+@lru_cache(maxsize=4096)
+def _parse_text(text):
+    text = text.strip()
+    if text.endswith('Z'):
+        text = text[:-1] + '+00:00'
+    try:
+        value = datetime.fromisoformat(text)
+    except ValueError:
+        for fmt in LEGACY_FORMATS:
+            try:
+                return datetime.strptime(text, fmt)
+            except ValueError:
+                continue
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def parse_datetime(value):
+    """datetime em UTC (sem fuso) de um valor do banco ou de texto; None se inválido"""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            return value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    if isinstance(value, bytes):
+        value = value.decode()
+    if isinstance(value, str) and value:
+        return _parse_text(value)
+    return None
+
+
+def utcnow():
+    """Agora em UTC, sem fuso (mesma convenção das colunas)"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def to_db_text(value):
+    """Texto canônico gravado no SQLite ('YYYY-MM-DD HH:MM:SS', UTC)"""
+    return parse_datetime(value).strftime(DB_FORMAT)
+
+
+def iso_utc(value):
+    """ISO 8601 com 'Z' para respostas JSON (o navegador converte para o fuso local)"""
+    parsed = parse_datetime(value)
+    return parsed.isoformat(timespec='seconds') + 'Z' if parsed is not None else None
+
+
+def format_datetime(value, fmt='%d/%m/%Y', default='N/A'):
+    """Data formatada para exibição; texto não reconhecido é devolvido como veio"""
+    if value is None:
+        return default
+    parsed = parse_datetime(value)
+    if parsed is None:
+        return str(value)
+    return parsed.strftime(fmt)
+
+
+def sqlite_timestamp(raw):
+    """Conversor das colunas TIMESTAMP do SQLite (bytes -> datetime)"""
+    text = raw.decode()
+    parsed = _parse_text(text)
+    return parsed if parsed is not None else text
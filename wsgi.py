@@ -1,8 +1,10 @@
 """
 WSGI Entry Point para servidores de produção
 """
-from app import app
+from app import app, init_db
+
+# Aplica migrações pendentes (no modo fast é só uma leitura de schema_version)
+init_db()
 
 if __name__ == "__main__":
     app.run()
-